@@ -7,6 +7,12 @@ when using AI-assisted code generation tools like GitHub Copilot.
 """
 
 from .citation_tracker import CitationTracker
+from .citation_async import AsyncCitationTracker
+from .citation_store import CitationStore, JsonStore, JournaledJsonStore, SqliteStore
+from .citation_snapshot import SnapshotReader, SnapshotStore
+from .citation_metrics import TrackerMetrics
+from .citation_policy import LicensePolicy, PolicyEvaluation
 
 __version__ = '0.1.0'
-__all__ = ['CitationTracker']
+__all__ = ['CitationTracker', 'AsyncCitationTracker', 'CitationStore', 'JsonStore', 'JournaledJsonStore', 'SqliteStore',
+           'SnapshotReader', 'SnapshotStore', 'TrackerMetrics', 'LicensePolicy', 'PolicyEvaluation']
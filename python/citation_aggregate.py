@@ -0,0 +1,379 @@
+"""
+Organisation-wide citation aggregation.
+
+Discovers the ``citations.json`` files of many projects under a common root,
+loads and normalizes them in parallel with a process pool and merges them
+into a single citations structure. Sources are merged by source ID and by
+URL; disagreements between projects about the same source are reported as
+conflicts instead of being silently overwritten.
+
+Usage:
+    python citation_aggregate.py ROOT [-o OUTPUT_DIR] [-j WORKERS]
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from .citation_files import DEFAULT_SKIP_DIRS, MIN_PARALLEL_PROJECTS, use_process_pool
+    from .citation_store import apply_op, read_citations_json, write_citations_json
+    from .citation_tracker import CitationTracker
+except ImportError:
+    from citation_files import DEFAULT_SKIP_DIRS, MIN_PARALLEL_PROJECTS, use_process_pool
+    from citation_store import apply_op, read_citations_json, write_citations_json
+    from citation_tracker import CitationTracker
+
+CITATIONS_FILE_NAME = "citations.json"
+JOURNAL_FILE_NAME = "citations.journal"
+
+# Source fields compared between projects when merging
+_CONFLICT_FIELDS = ("name", "url", "author", "license_type")
+
+
+def discover_citation_files(root: str, skip_dirs=DEFAULT_SKIP_DIRS,
+                            exclude: Iterable[str] = ()) -> List[str]:
+    """
+    Find every project citations file under a directory.
+
+    Args:
+        root: Directory to search
+        skip_dirs: Directory names that are not descended into
+        exclude: Directories (such as a previous report) that are not searched
+
+    Returns:
+        Sorted paths of ``citations.json`` files
+    """
+    excluded = {os.path.abspath(path) for path in exclude}
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if name not in skip_dirs
+                       and os.path.abspath(os.path.join(dirpath, name)) not in excluded]
+        if CITATIONS_FILE_NAME in filenames:
+            found.append(os.path.join(dirpath, CITATIONS_FILE_NAME))
+    return sorted(found)
+
+
+def normalize_url(url: Optional[str]) -> Optional[str]:
+    """
+    Canonical form of a source URL used to match sources across projects.
+
+    Args:
+        url: URL as recorded on a source
+
+    Returns:
+        Lower-cased URL without scheme, ``www.`` or trailing slash, or None
+    """
+    if not url:
+        return None
+    url = url.strip().lower()
+    for prefix in ("https://", "http://"):
+        if url.startswith(prefix):
+            url = url[len(prefix):]
+            break
+    if url.startswith("www."):
+        url = url[4:]
+    return url.rstrip("/") or None
+
+
+def read_project_citations(path: str) -> Optional[Dict]:
+    """
+    Read a project's citations without touching its directory.
+
+    Unlike ``JsonStore.load`` no lock file is taken and an unreadable
+    snapshot is not copied aside, so read-only checkouts can be aggregated.
+    Journaled records are replayed on top of the snapshot.
+
+    Args:
+        path: Path to the project's ``citations.json``
+
+    Returns:
+        The citations structure, or None if there is nothing readable
+    """
+    citations = read_citations_json(path)
+    journal_path = os.path.join(os.path.dirname(path), JOURNAL_FILE_NAME)
+    if not os.path.exists(journal_path):
+        return citations
+    if citations is None:
+        citations = {"project_info": {}, "sources": {}, "file_citations": {}}
+    with open(journal_path, 'rb') as f:
+        for line in f.read().decode('utf-8').splitlines():
+            try:
+                op = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn final record from an interrupted append
+                continue
+            apply_op(citations, op)
+    return citations
+
+
+def load_project_citations(path: str) -> Tuple[str, Optional[Dict]]:
+    """
+    Load and normalize one project's citations.
+
+    This is the process pool worker. Journaled records are replayed, file
+    paths use forward slashes and every source carries all standard fields.
+    Any error is reported for this project only, so one broken checkout does
+    not abort the whole run.
+
+    Args:
+        path: Path to the project's ``citations.json``
+
+    Returns:
+        (path, citations) tuple; citations is None if the file is unreadable
+    """
+    try:
+        return path, _normalize_citations(read_project_citations(path))
+    except Exception as e:
+        print(f"Warning: Skipping unreadable citations {path}: {e}")
+        return path, None
+
+
+def _normalize_citations(citations: Optional[Dict]) -> Optional[Dict]:
+    if not isinstance(citations, dict):
+        return None
+
+    sources = {}
+    for source_id, source in (citations.get("sources") or {}).items():
+        normalized = {field: source.get(field) for field in
+                      ("name", "url", "author", "license_type", "description", "added_at")}
+        normalized["name"] = normalized["name"] or source_id
+        sources[source_id] = normalized
+
+    file_citations: Dict[str, List[Dict]] = {}
+    for file_path, records in (citations.get("file_citations") or {}).items():
+        key = file_path.replace("\\", "/")
+        if key.startswith("./"):
+            key = key[2:]
+        file_citations.setdefault(key, []).extend(
+            record for record in records if record.get("source_ids"))
+
+    return {
+        "project_info": citations.get("project_info") or {},
+        "sources": sources,
+        "file_citations": file_citations,
+    }
+
+
+class AggregateResult:
+    """Combined citations of many projects and the conflicts found merging them."""
+
+    def __init__(self, root: str):
+        """
+        Initialize an empty result.
+
+        Args:
+            root: Directory the projects were discovered under
+        """
+        self.root = root
+        self.citations: Dict = {
+            "project_info": {
+                "name": os.path.basename(os.path.abspath(root)),
+                "created_at": datetime.now().isoformat(),
+                "projects": [],
+            },
+            "sources": {},
+            "file_citations": {},
+        }
+        # One entry per source field the projects disagree on
+        self.conflicts: List[Dict] = []
+        # (project, source_id) -> canonical source_id, for sources merged by URL
+        self.aliases: Dict[Tuple[str, str], str] = {}
+        # Citation files that could not be read
+        self.errors: List[str] = []
+        self._by_url: Dict[str, str] = {}
+        self._origin: Dict[str, str] = {}
+
+    @property
+    def projects(self) -> List[str]:
+        """Project directories included in the result, relative to the root."""
+        return self.citations["project_info"]["projects"]
+
+    def merge(self, project: str, citations: Dict) -> None:
+        """
+        Merge one project's normalized citations into the result.
+
+        Args:
+            project: Project directory relative to the root
+            citations: Normalized citations of the project
+        """
+        self.projects.append(project)
+        sources = self.citations["sources"]
+        mapping: Dict[str, str] = {}
+        for source_id, source in citations["sources"].items():
+            url_key = normalize_url(source.get("url"))
+            canonical = source_id
+            if source_id not in sources and url_key in self._by_url:
+                canonical = self._by_url[url_key]
+                self.aliases[(project, source_id)] = canonical
+            mapping[source_id] = canonical
+
+            existing = sources.get(canonical)
+            if existing is None:
+                sources[canonical] = dict(source)
+                self._origin[canonical] = project
+                if url_key and url_key not in self._by_url:
+                    self._by_url[url_key] = canonical
+                continue
+            self._check_conflicts(canonical, existing, project, source_id, source)
+
+        file_citations = self.citations["file_citations"]
+        prefix = "" if project == "." else project.replace(os.sep, "/") + "/"
+        for file_path, records in citations["file_citations"].items():
+            merged = file_citations.setdefault(prefix + file_path, [])
+            for record in records:
+                record = dict(record)
+                record["source_ids"] = [mapping.get(source_id, source_id)
+                                        for source_id in record["source_ids"]]
+                merged.append(record)
+
+    def _check_conflicts(self, canonical: str, existing: Dict, project: str,
+                         source_id: str, source: Dict) -> None:
+        for field in _CONFLICT_FIELDS:
+            ours, theirs = existing.get(field), source.get(field)
+            if field == "url":
+                ours, theirs = normalize_url(ours), normalize_url(theirs)
+            if theirs is None or ours == theirs:
+                continue
+            if ours is None:
+                existing[field] = source[field]
+                continue
+            self.conflicts.append({
+                "source_id": canonical,
+                "field": field,
+                "values": {
+                    self._origin[canonical]: existing.get(field),
+                    f"{project}:{source_id}": source.get(field),
+                },
+            })
+
+
+def _iter_loaded(paths: List[str], workers: Optional[int]) -> Iterator[Tuple[str, Optional[Dict]]]:
+    """Load project citation files, in a process pool when worthwhile."""
+    if not use_process_pool(len(paths), workers, MIN_PARALLEL_PROJECTS):
+        for path in paths:
+            yield load_project_citations(path)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() preserves input order, which keeps merging deterministic
+        yield from pool.map(load_project_citations, paths, chunksize=chunksize)
+
+
+def aggregate_citations(root: str, workers: Optional[int] = None,
+                        skip_dirs=DEFAULT_SKIP_DIRS, exclude: Iterable[str] = ()) -> AggregateResult:
+    """
+    Discover, load and merge the citations of every project under a root.
+
+    Args:
+        root: Directory containing the projects
+        workers: Number of worker processes (defaults to the CPU count;
+            1 loads everything in this process)
+        skip_dirs: Directory names that are not descended into
+        exclude: Directories (such as a previous report) that are not searched
+
+    Returns:
+        The merged result
+    """
+    result = AggregateResult(root)
+    paths = discover_citation_files(root, skip_dirs, exclude)
+    for path, citations in _iter_loaded(paths, workers):
+        if citations is None:
+            result.errors.append(path)
+            continue
+        project = os.path.relpath(os.path.dirname(path), root)
+        result.merge(project, citations)
+    return result
+
+
+def generate_license_report(result: AggregateResult) -> str:
+    """
+    Generate a Markdown summary of licenses across all projects.
+
+    Args:
+        result: Aggregated citations
+
+    Returns:
+        Markdown formatted license report
+    """
+    usage: Dict[str, Dict[str, set]] = {}
+    sources = result.citations["sources"]
+    for file_path, records in result.citations["file_citations"].items():
+        for record in records:
+            for source_id in record["source_ids"]:
+                license_type = (sources.get(source_id) or {}).get("license_type") or "Unknown"
+                entry = usage.setdefault(license_type, {"sources": set(), "files": set()})
+                entry["sources"].add(source_id)
+                entry["files"].add(file_path)
+
+    md = ["# License Report", "",
+          f"{len(result.projects)} projects, {len(sources)} sources.", "",
+          "| License | Sources | Files |", "| --- | --- | --- |"]
+    for license_type in sorted(usage):
+        entry = usage[license_type]
+        md.append(f"| {license_type} | {len(entry['sources'])} | {len(entry['files'])} |")
+
+    if result.conflicts:
+        md.extend(["", "## Conflicts", ""])
+        for conflict in result.conflicts:
+            values = "; ".join(f"{where}: {value}" for where, value in conflict["values"].items())
+            md.append(f"- `{conflict['source_id']}` {conflict['field']}: {values}")
+    md.append("")
+    return "\n".join(md)
+
+
+def write_aggregate(result: AggregateResult, output_dir: str) -> List[str]:
+    """
+    Write the combined citations, CITATIONS.md, license report and conflicts.
+
+    Args:
+        result: Aggregated citations
+        output_dir: Directory to write into
+
+    Returns:
+        Paths of the written files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    citations_path = os.path.join(output_dir, CITATIONS_FILE_NAME)
+    write_citations_json(result.citations, citations_path)
+    markdown_path = CitationTracker(output_dir).export_citations_markdown()
+
+    report_path = os.path.join(output_dir, "LICENSES.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(generate_license_report(result))
+
+    conflicts_path = os.path.join(output_dir, "conflicts.json")
+    with open(conflicts_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "conflicts": result.conflicts,
+            "aliases": [{"project": project, "source_id": source_id, "merged_into": canonical}
+                        for (project, source_id), canonical in result.aliases.items()],
+            "errors": result.errors,
+        }, f, indent=2)
+    return [citations_path, markdown_path, report_path, conflicts_path]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Aggregate citations across many projects.")
+    parser.add_argument("root", help="Directory containing the projects")
+    parser.add_argument("-o", "--output", default="citation-report",
+                        help="Directory for the combined report (default: citation-report)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    result = aggregate_citations(args.root, args.workers, exclude=[args.output])
+    for path in write_aggregate(result, args.output):
+        print(f"Wrote {path}")
+    print(f"{len(result.projects)} projects, {len(result.citations['sources'])} sources, "
+          f"{len(result.conflicts)} conflicts, {len(result.errors)} unreadable")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+asyncio interface to the Citation Tracker.
+
+``AsyncCitationTracker`` wraps a ``CitationTracker`` that writes through a
+background flusher (see ``flush_interval_ms``). Every call runs in an
+executor, since even recording a citation resolves the file path and waits
+for the tracker's lock, which queries building the index hold for as long
+as that takes. Recording only updates memory; mutations queued within one
+interval are written to the store together, and ``compact`` and
+``import_json`` write from a snapshot of the citations, so recording does
+not wait for them either.
+
+The storage format is the same as ``CitationTracker``'s, so both can be used
+on the same project.
+"""
+import asyncio
+import functools
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+try:
+    from .citation_tracker import CitationTracker
+except ImportError:
+    from citation_tracker import CitationTracker
+
+# Default interval (in milliseconds) between writes of queued mutations
+DEFAULT_FLUSH_INTERVAL_MS = 50
+
+
+class AsyncCitationTracker:
+    """Awaitable citation recording, queries and report export."""
+
+    def __init__(self, project_path: str = None,
+                 flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+                 executor: Optional[Executor] = None, **tracker_options: Any):
+        """
+        Initialize the tracker.
+
+        The existing citations are loaded here, synchronously; use ``open``
+        to load them without blocking the event loop.
+
+        Args:
+            project_path: Root directory of the project for storing citation data
+            flush_interval_ms: Interval between writes of queued mutations
+            executor: Executor for blocking work (defaults to the loop's
+                default executor)
+            **tracker_options: Other ``CitationTracker`` options, such as
+                ``journal`` or ``store``
+        """
+        self.tracker = CitationTracker(project_path, flush_interval_ms=flush_interval_ms,
+                                       **tracker_options)
+        self._executor = executor
+
+    @classmethod
+    async def open(cls, project_path: str = None, **options: Any) -> "AsyncCitationTracker":
+        """
+        Create a tracker, loading the existing citations in an executor.
+
+        Args:
+            project_path: Root directory of the project for storing citation data
+            **options: Options accepted by ``AsyncCitationTracker``
+
+        Returns:
+            The new tracker
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(options.get("executor"),
+                                          functools.partial(cls, project_path, **options))
+
+    async def __aenter__(self) -> "AsyncCitationTracker":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _run(self, method: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking tracker method in the executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+    @property
+    def citations(self) -> Dict:
+        """The citations structure of the wrapped tracker."""
+        return self.tracker.citations
+
+    async def add_source(self, source_id: str, name: str, url: Optional[str] = None,
+                         author: Optional[str] = None, license_type: Optional[str] = None,
+                         description: Optional[str] = None) -> None:
+        """
+        Add a new citation source.
+
+        Args:
+            source_id: Unique identifier for the source
+            name: Name of the source (e.g., library name, article title)
+            url: URL to the source
+            author: Author of the source
+            license_type: License type (e.g., MIT, Apache 2.0)
+            description: Brief description of the source
+        """
+        await self._run(self.tracker.add_source, source_id, name, url=url, author=author,
+                        license_type=license_type, description=description)
+
+    async def cite_in_file(self, file_path: str, source_ids: Union[str, List[str]],
+                           line_start: Optional[int] = None, line_end: Optional[int] = None,
+                           comment: Optional[str] = None) -> None:
+        """
+        Record that a file uses content from one or more sources.
+
+        Args:
+            file_path: Path to the file where the citation is used
+            source_ids: ID or list of IDs of the sources being cited
+            line_start: Starting line number of the cited content
+            line_end: Ending line number of the cited content
+            comment: Additional comment about the citation
+        """
+        await self._run(self.tracker.cite_in_file, file_path, source_ids, line_start=line_start,
+                        line_end=line_end, comment=comment)
+
+    async def add_sources(self, sources: Iterable[Dict]) -> None:
+        """
+        Add many citation sources at once.
+
+        Args:
+            sources: Dicts with the ``add_source`` keyword arguments
+
+        Raises:
+            ValueError: If an entry has unknown or missing fields
+        """
+        await self._run(self.tracker.add_sources, list(sources))
+
+    async def cite_many(self, citations: Iterable[Dict]) -> None:
+        """
+        Record many file citations at once.
+
+        Args:
+            citations: Dicts with the ``cite_in_file`` keyword arguments
+
+        Raises:
+            ValueError: If an entry has unknown or missing fields
+        """
+        await self._run(self.tracker.cite_many, list(citations))
+
+    async def files_citing(self, source_id: str) -> Dict[str, List[Tuple[Optional[int], Optional[int]]]]:
+        """See ``CitationTracker.files_citing``."""
+        return await self._run(self.tracker.files_citing, source_id)
+
+    async def files_with_license(self, license_type: Optional[str]) -> Set[str]:
+        """See ``CitationTracker.files_with_license``."""
+        return await self._run(self.tracker.files_with_license, license_type)
+
+    async def citations_at(self, file_path: str, line: int) -> List[Dict]:
+        """See ``CitationTracker.citations_at``."""
+        return await self._run(self.tracker.citations_at, file_path, line)
+
+    async def citations_overlapping(self, file_path: str, line_start: int,
+                                    line_end: int) -> List[Dict]:
+        """See ``CitationTracker.citations_overlapping``."""
+        return await self._run(self.tracker.citations_overlapping, file_path, line_start, line_end)
+
+    async def coalesced_ranges(self, file_path: str) -> Dict[str, List[Tuple[int, int]]]:
+        """See ``CitationTracker.coalesced_ranges``."""
+        return await self._run(self.tracker.coalesced_ranges, file_path)
+
+    async def generate_attribution_comment(self, source_id: str) -> str:
+        """See ``CitationTracker.generate_attribution_comment``."""
+        return await self._run(self.tracker.generate_attribution_comment, source_id)
+
+    async def insert_attribution_header(self, file_path: str) -> str:
+        """See ``CitationTracker.insert_attribution_header``."""
+        return await self._run(self.tracker.insert_attribution_header, file_path)
+
+    async def generate_citations_markdown(self) -> str:
+        """See ``CitationTracker.generate_citations_markdown``."""
+        return await self._run(self.tracker.generate_citations_markdown)
+
+    async def export_citations_markdown(self, output_path: Optional[str] = None) -> str:
+        """
+        Export citations to a markdown file.
+
+        Args:
+            output_path: Path for the markdown file (defaults to project_path/CITATIONS.md)
+
+        Returns:
+            Path to the created markdown file
+        """
+        return await self._run(self.tracker.export_citations_markdown, output_path)
+
+    async def export_json(self, output_path: str) -> str:
+        """See ``CitationTracker.export_json``."""
+        return await self._run(self.tracker.export_json, output_path)
+
+    async def export_snapshot(self, output_path: str) -> str:
+        """See ``CitationTracker.export_snapshot``."""
+        return await self._run(self.tracker.export_snapshot, output_path)
+
+    async def import_json(self, input_path: str) -> None:
+        """See ``CitationTracker.import_json``."""
+        await self._run(self.tracker.import_json, input_path)
+
+    async def compact(self) -> None:
+        """See ``CitationTracker.compact``."""
+        await self._run(self.tracker.compact)
+
+    async def flush(self) -> None:
+        """Write all queued mutations to the store now."""
+        await self._run(self.tracker.flush)
+
+    def flush_stats(self) -> Dict[str, float]:
+        """See ``CitationTracker.flush_stats``."""
+        return self.tracker.flush_stats()
+
+    def stats(self) -> Dict:
+        """See ``CitationTracker.stats``."""
+        return self.tracker.stats()
+
+    async def close(self) -> None:
+        """Write queued mutations and release the store."""
+        await self._run(self.tracker.close)
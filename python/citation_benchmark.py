@@ -0,0 +1,371 @@
+"""
+Benchmarks for tracker operations at scale.
+
+Generates a synthetic citations dataset of each requested size, stores it
+with the chosen backend and times the main tracker operations on it:
+
+- ``load``: opening a tracker on the dataset;
+- ``add_source`` and ``cite_in_file``: single mutations, each written to
+  the store, on top of the dataset;
+- ``insert_attribution_header``: headers for existing files;
+- ``generate_citations_markdown``: the full citations document.
+
+Every operation runs on a fresh copy of the dataset. Peak memory is measured
+with ``tracemalloc`` in a separate run, so it does not slow the timed one.
+Results are written as JSON. Pass ``--baseline`` with an earlier results
+file to list the operations that got slower or bigger.
+
+Usage:
+    python citation_benchmark.py [--sizes 1000 10000 100000] [--files N]
+        [--sources N] [--range-size N] [--store json|journal|sqlite]
+        [--ops N] [-o results.json] [--baseline old-results.json]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .citation_store import SqliteStore, write_citations_json
+    from .citation_tracker import CitationTracker
+except ImportError:
+    from citation_store import SqliteStore, write_citations_json
+    from citation_tracker import CitationTracker
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+OPERATIONS = ("load", "add_source", "cite_in_file", "insert_attribution_header",
+              "generate_citations_markdown")
+
+STORES = ("json", "journal", "sqlite")
+
+# Files a store may keep its data in, counted for the storage size
+_STORAGE_FILES = ("citations.json", "citations.journal", "citations.index.json",
+                  "citations.db", "citations.db-wal")
+
+_LICENSES = ("MIT", "Apache-2.0", "BSD-3-Clause", "GPL-3.0", "MPL-2.0", None)
+
+# Metrics compared against a baseline, and whether a larger value is better
+_COMPARED_METRICS = (("ops_per_sec", True), ("peak_memory_bytes", False), ("file_size_bytes", False))
+
+
+def generate_citations(count: int, files: Optional[int] = None, sources: Optional[int] = None,
+                       range_size: int = 20, seed: int = 0) -> Dict:
+    """
+    Generate a synthetic citations structure.
+
+    The result is the same for the same arguments.
+
+    Args:
+        count: Number of file citations
+        files: Number of cited files (defaults to one per 10 citations)
+        sources: Number of sources (defaults to one per 50 citations)
+        range_size: Mean number of lines per cited range
+        seed: Random seed
+
+    Returns:
+        Citations structure in the ``citations.json`` format
+    """
+    rng = random.Random(seed)
+    files = files or max(1, count // 10)
+    sources = sources or max(1, count // 50)
+    base = datetime(2024, 1, 1)
+
+    source_ids = [f"lib-{i}" for i in range(sources)]
+    citations: Dict = {
+        "project_info": {"name": "benchmark", "created_at": base.isoformat()},
+        "sources": {},
+        "file_citations": {},
+    }
+    for i, source_id in enumerate(source_ids):
+        citations["sources"][source_id] = {
+            "name": f"Library {i}",
+            "url": f"https://example.com/lib-{i}",
+            "author": f"Author {i % 97}",
+            "license_type": _LICENSES[i % len(_LICENSES)],
+            "description": f"Synthetic source {i}",
+            "added_at": (base + timedelta(seconds=i)).isoformat(),
+        }
+
+    file_paths = [f"src/pkg{i % 100}/module{i}.py" for i in range(files)]
+    file_citations = citations["file_citations"]
+    for i in range(count):
+        # Every file is cited at least once before files repeat
+        file_path = file_paths[i] if i < files else rng.choice(file_paths)
+        line_start = rng.randint(1, 5000)
+        record = {
+            "source_ids": rng.sample(source_ids, 2 if sources > 1 and rng.random() < 0.1 else 1),
+            "cited_at": (base + timedelta(seconds=i, microseconds=rng.randrange(1000000))).isoformat(),
+            "line_start": line_start,
+            "line_end": line_start + rng.randint(0, 2 * range_size),
+        }
+        if rng.random() < 0.2:
+            record["comment"] = f"Adapted from example {rng.randrange(1000)}"
+        file_citations.setdefault(file_path, []).append(record)
+    return citations
+
+
+def _open_tracker(project_path: str, store: str, **options) -> CitationTracker:
+    """Open a tracker on a project with the named storage backend."""
+    if store == "sqlite":
+        return CitationTracker(project_path, store=SqliteStore(os.path.join(project_path, "citations.db")),
+                               **options)
+    return CitationTracker(project_path, journal=store == "journal", **options)
+
+
+def _write_dataset(citations: Dict, project_path: str, store: str) -> None:
+    """Store a generated dataset in a project directory."""
+    if store == "sqlite":
+        sqlite_store = SqliteStore(os.path.join(project_path, "citations.db"))
+        sqlite_store.save(citations)
+        sqlite_store.close()
+    else:
+        write_citations_json(citations, os.path.join(project_path, "citations.json"))
+
+
+def _storage_size(project_path: str) -> int:
+    """Bytes used by the store files of a project."""
+    return sum(os.path.getsize(os.path.join(project_path, name)) for name in _STORAGE_FILES
+               if os.path.exists(os.path.join(project_path, name)))
+
+
+def _operation(name: str, citations: Dict, project_path: str, store: str, ops: int,
+               tracker_options: Dict) -> Tuple[int, Callable[[], None], Callable[[], None]]:
+    """
+    Prepare one operation on a fresh copy of the dataset.
+
+    Returns:
+        (number of operations, function running them, function closing the
+        tracker they use) tuple
+    """
+    if name == "load":
+        return 1, lambda: _open_tracker(project_path, store, **tracker_options).close(), lambda: None
+
+    tracker = _open_tracker(project_path, store, **tracker_options)
+    rng = random.Random(1)
+    source_ids = list(citations["sources"])
+    file_paths = [os.path.join(project_path, file_path) for file_path in citations["file_citations"]]
+
+    if name == "add_source":
+        def run():
+            for i in range(ops):
+                tracker.add_source(source_id=f"bench-{i}", name=f"Benchmark source {i}",
+                                   url=f"https://example.org/{i}", license_type="MIT")
+    elif name == "cite_in_file":
+        def run():
+            for _ in range(ops):
+                line_start = rng.randint(1, 5000)
+                tracker.cite_in_file(rng.choice(file_paths), rng.choice(source_ids),
+                                     line_start=line_start, line_end=line_start + 10)
+    elif name == "insert_attribution_header":
+        def run():
+            for i in range(ops):
+                tracker.insert_attribution_header(file_paths[i % len(file_paths)])
+    elif name == "generate_citations_markdown":
+        ops = 1
+
+        def run():
+            tracker.generate_citations_markdown()
+    else:
+        tracker.close()
+        raise ValueError(f"Unknown operation: {name}")
+    return ops, run, tracker.close
+
+
+def _measure(name: str, citations: Dict, dataset_dir: str, store: str, ops: int,
+             tracker_options: Dict, memory: bool) -> Tuple[int, float, Optional[int], int]:
+    """
+    Time an operation and, if requested, measure its peak memory in a second run.
+
+    Returns:
+        (operations, seconds, peak memory in bytes or None, storage size) tuple
+    """
+    peak = None
+    with tempfile.TemporaryDirectory() as work_dir:
+        project_path = os.path.join(work_dir, "timed")
+        shutil.copytree(dataset_dir, project_path)
+        count, run, close = _operation(name, citations, project_path, store, ops, tracker_options)
+        try:
+            gc.collect()
+            started = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - started
+        finally:
+            close()
+        file_size = _storage_size(project_path)
+
+        if memory:
+            project_path = os.path.join(work_dir, "traced")
+            shutil.copytree(dataset_dir, project_path)
+            count, run, close = _operation(name, citations, project_path, store, ops, tracker_options)
+            gc.collect()
+            tracemalloc.start()
+            try:
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+                close()
+    return count, seconds, peak, file_size
+
+
+def run_benchmarks(sizes: Iterable[int] = DEFAULT_SIZES, files: Optional[int] = None,
+                   sources: Optional[int] = None, range_size: int = 20, store: str = "json",
+                   ops: int = 100, operations: Iterable[str] = OPERATIONS, memory: bool = True,
+                   seed: int = 0, label: Optional[str] = None, **tracker_options) -> Dict:
+    """
+    Run the benchmarks on synthetic datasets.
+
+    Args:
+        sizes: Dataset sizes, in citations
+        files: Number of cited files (defaults to one per 10 citations)
+        sources: Number of sources (defaults to one per 50 citations)
+        range_size: Mean number of lines per cited range
+        store: Storage backend, one of ``STORES``
+        ops: Number of calls timed for the per-call operations
+        operations: Operations to run, from ``OPERATIONS``
+        memory: If True, peak memory of each operation is measured
+        seed: Random seed for the datasets
+        label: Free-form label stored with the results, such as a version
+        **tracker_options: Extra ``CitationTracker`` options, such as
+            ``lazy`` or ``compact_memory``
+
+    Returns:
+        Results document with the parameters and one result per size and operation
+    """
+    if store not in STORES:
+        raise ValueError(f"Unknown store: {store}")
+    operations = list(operations)
+    results: Dict = {
+        "label": label,
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "files": files, "sources": sources, "range_size": range_size, "store": store,
+            "ops": ops, "seed": seed, "tracker_options": tracker_options,
+        },
+        "results": [],
+    }
+    for size in sizes:
+        citations = generate_citations(size, files, sources, range_size, seed)
+        with tempfile.TemporaryDirectory() as dataset_dir:
+            _write_dataset(citations, dataset_dir, store)
+            for name in operations:
+                count, seconds, peak, file_size = _measure(
+                    name, citations, dataset_dir, store, ops, tracker_options, memory)
+                results["results"].append({
+                    "operation": name,
+                    "citations": size,
+                    "files": len(citations["file_citations"]),
+                    "sources": len(citations["sources"]),
+                    "ops": count,
+                    "seconds": seconds,
+                    "ops_per_sec": count / seconds if seconds else None,
+                    "peak_memory_bytes": peak,
+                    "file_size_bytes": file_size,
+                })
+        del citations
+    return results
+
+
+def compare_results(baseline: Dict, current: Dict, tolerance: float = 0.1) -> List[Dict]:
+    """
+    Find the results that got worse than a baseline.
+
+    Args:
+        baseline: Earlier results document
+        current: New results document
+        tolerance: Relative change that is not reported
+
+    Returns:
+        One entry per worse metric, with the operation, size, metric and both values
+    """
+    previous = {(result["operation"], result["citations"]): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get((result["operation"], result["citations"]))
+        if old is None:
+            continue
+        for metric, higher_is_better in _COMPARED_METRICS:
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({
+                    "operation": result["operation"],
+                    "citations": result["citations"],
+                    "metric": metric,
+                    "baseline": before,
+                    "current": after,
+                    "change": change,
+                })
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark citation tracker operations.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Dataset sizes in citations (default: 1000 10000 100000)")
+    parser.add_argument("--files", type=int, default=None,
+                        help="Number of cited files (default: one per 10 citations)")
+    parser.add_argument("--sources", type=int, default=None,
+                        help="Number of sources (default: one per 50 citations)")
+    parser.add_argument("--range-size", type=int, default=20,
+                        help="Mean lines per cited range (default: 20)")
+    parser.add_argument("--store", choices=STORES, default="json", help="Storage backend")
+    parser.add_argument("--ops", type=int, default=100,
+                        help="Calls timed for the per-call operations (default: 100)")
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--lazy", action="store_true", help="Open trackers with lazy=True")
+    parser.add_argument("--compact-memory", action="store_true",
+                        help="Open trackers with compact_memory=True")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", help="Label stored with the results, such as a version")
+    parser.add_argument("-o", "--output", help="File to write the results to (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative change not reported as a regression (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    tracker_options = {}
+    if args.lazy:
+        tracker_options["lazy"] = True
+    if args.compact_memory:
+        tracker_options["compact_memory"] = True
+    results = run_benchmarks(args.sizes, args.files, args.sources, args.range_size, args.store,
+                             args.ops, args.operations, not args.no_memory, args.seed,
+                             args.label, **tracker_options)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_results(json.load(f), results, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression['operation']} at {regression['citations']} citations, "
+                  f"{regression['metric']} {regression['baseline']:.6g} -> "
+                  f"{regression['current']:.6g} ({regression['change']:+.0%})", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
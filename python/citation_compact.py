@@ -0,0 +1,224 @@
+"""
+Memory-efficient storage for file citations.
+
+A citation record held as a dict, with a ``source_ids`` list and an ISO
+timestamp string, costs several hundred bytes. ``CompactFileCitations``
+keeps the records of all files in shared array columns instead:
+
+- line ranges and timestamps (epoch microseconds) in ``array('q')`` columns;
+- each distinct ``source_ids`` combination stored once as a tuple of
+  interned strings and referenced by number;
+- comments interned in a string table;
+- each distinct key order stored once, so records round-trip exactly.
+
+That is a few dozen bytes per citation. The class is a mapping from file
+path to a list of citation dicts, like the plain ``file_citations`` dict.
+The lists are built when a file is looked up and are copies. Changes go
+through item assignment, not through the returned list.
+"""
+import sys
+from array import array
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+try:
+    from .citation_snapshot import format_timestamp, timestamp_micros
+except ImportError:
+    from citation_snapshot import format_timestamp, timestamp_micros
+
+# Column value for a field the record does not have
+_MISSING = -2 ** 63
+
+# Layout index of records kept verbatim because a field does not fit a column
+_VERBATIM = 255
+
+_COLUMN_KEYS = frozenset({"source_ids", "cited_at", "line_start", "line_end", "comment"})
+
+# Rebuild the columns once at least this many rows are unreferenced
+_MIN_REPACK_ROWS = 4096
+
+
+def _fits_column(value: Any) -> bool:
+    return type(value) is int and _MISSING < value < 2 ** 63
+
+
+class CompactFileCitations(MutableMapping):
+    """Columnar ``file_citations`` mapping of file path to citation records."""
+
+    def __init__(self, file_citations: Optional[Mapping[str, List[Dict]]] = None):
+        """
+        Initialize the mapping.
+
+        Args:
+            file_citations: Optional ``file_citations`` contents to copy in
+        """
+        self._files: Dict[str, array] = {}
+        self._starts = array('q')
+        self._ends = array('q')
+        self._times = array('q')
+        self._sources = array('I')
+        self._comments = array('I')
+        self._layouts = array('B')
+        self._source_sets: List[Tuple[str, ...]] = []
+        self._source_set_ids: Dict[Tuple[str, ...], int] = {}
+        # Comment 0 is "no comment"
+        self._strings: List[Optional[str]] = [None]
+        self._string_ids: Dict[str, int] = {}
+        self._layout_keys: List[Tuple[str, ...]] = []
+        self._layout_ids: Dict[Tuple[str, ...], int] = {}
+        self._verbatim: Dict[int, Dict] = {}
+        self._garbage = 0
+        if file_citations:
+            for file_path, citations in file_citations.items():
+                self[file_path] = citations
+
+    def __getitem__(self, file_path: str) -> List[Dict]:
+        return [self._record(row) for row in self._files[file_path]]
+
+    def __setitem__(self, file_path: str, citations: List[Dict]) -> None:
+        rows = array('I', [self._add_row(citation) for citation in citations])
+        old = self._files.get(file_path)
+        self._files[sys.intern(file_path)] = rows
+        if old is not None:
+            self._release(old)
+
+    def __delitem__(self, file_path: str) -> None:
+        self._release(self._files.pop(file_path))
+
+    def __contains__(self, file_path: object) -> bool:
+        return file_path in self._files
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._files)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def append_citation(self, file_path: str, citation: Dict) -> None:
+        """
+        Add one citation to a file without rebuilding the file's rows.
+
+        Args:
+            file_path: Key of the file
+            citation: Citation record
+        """
+        rows = self._files.get(file_path)
+        if rows is None:
+            rows = self._files[sys.intern(file_path)] = array('I')
+        rows.append(self._add_row(citation))
+
+    def citation_count(self) -> int:
+        """Number of citations held, across all files."""
+        return len(self._layouts) - self._garbage
+
+    def _add_row(self, citation: Dict) -> int:
+        row = len(self._layouts)
+        keys = tuple(citation)
+        source_ids = citation.get("source_ids")
+        micros = timestamp_micros(citation["cited_at"]) if isinstance(citation.get("cited_at"), str) else None
+        fits = (
+            _COLUMN_KEYS.issuperset(keys)
+            and isinstance(source_ids, list) and all(isinstance(s, str) for s in source_ids)
+            and ("cited_at" not in citation or micros is not None)
+            and all(_fits_column(citation.get(key, 0)) for key in ("line_start", "line_end"))
+            and isinstance(citation.get("comment", ""), str)
+            and (keys in self._layout_ids or len(self._layout_keys) < _VERBATIM)
+        )
+        if not fits:
+            self._verbatim[row] = dict(citation)
+            self._append_columns(_VERBATIM, 0, _MISSING, _MISSING, _MISSING, 0)
+            return row
+
+        layout = self._layout_ids.get(keys)
+        if layout is None:
+            layout = self._layout_ids[keys] = len(self._layout_keys)
+            self._layout_keys.append(tuple(sys.intern(key) for key in keys))
+
+        source_set = tuple(sys.intern(source_id) for source_id in source_ids)
+        source_ref = self._source_set_ids.get(source_set)
+        if source_ref is None:
+            source_ref = self._source_set_ids[source_set] = len(self._source_sets)
+            self._source_sets.append(source_set)
+
+        comment_ref = 0
+        if "comment" in citation:
+            comment_ref = self._string_ids.get(citation["comment"])
+            if comment_ref is None:
+                comment_ref = self._string_ids[citation["comment"]] = len(self._strings)
+                self._strings.append(citation["comment"])
+
+        self._append_columns(layout, source_ref, citation.get("line_start", _MISSING),
+                             citation.get("line_end", _MISSING),
+                             _MISSING if micros is None else micros, comment_ref)
+        return row
+
+    def _append_columns(self, layout: int, source_ref: int, start: int, end: int,
+                        micros: int, comment_ref: int) -> None:
+        self._layouts.append(layout)
+        self._sources.append(source_ref)
+        self._starts.append(start)
+        self._ends.append(end)
+        self._times.append(micros)
+        self._comments.append(comment_ref)
+
+    def _record(self, row: int) -> Dict:
+        layout = self._layouts[row]
+        if layout == _VERBATIM:
+            return dict(self._verbatim[row])
+        record: Dict[str, Any] = {}
+        for key in self._layout_keys[layout]:
+            if key == "source_ids":
+                record[key] = list(self._source_sets[self._sources[row]])
+            elif key == "cited_at":
+                record[key] = format_timestamp(self._times[row])
+            elif key == "line_start":
+                record[key] = self._starts[row]
+            elif key == "line_end":
+                record[key] = self._ends[row]
+            else:
+                record[key] = self._strings[self._comments[row]]
+        return record
+
+    def _release(self, rows: array) -> None:
+        """Account for rows no file refers to any more."""
+        for row in rows:
+            self._verbatim.pop(row, None)
+        self._garbage += len(rows)
+        if self._garbage >= _MIN_REPACK_ROWS and self._garbage * 2 >= len(self._layouts):
+            self._repack()
+
+    def _repack(self) -> None:
+        """Rebuild the columns without unreferenced rows."""
+        columns = (self._layouts, self._sources, self._starts, self._ends, self._times, self._comments)
+        packed = [array(column.typecode) for column in columns]
+        verbatim: Dict[int, Dict] = {}
+        for file_path, rows in self._files.items():
+            new_rows = array('I')
+            for row in rows:
+                new_row = len(packed[0])
+                for column, new_column in zip(columns, packed):
+                    new_column.append(column[row])
+                if row in self._verbatim:
+                    verbatim[new_row] = self._verbatim[row]
+                new_rows.append(new_row)
+            self._files[file_path] = new_rows
+        (self._layouts, self._sources, self._starts, self._ends,
+         self._times, self._comments) = packed
+        self._verbatim = verbatim
+        self._garbage = 0
+
+
+def compact_citations(citations: Dict) -> Dict:
+    """
+    Switch a citations structure to compact file citation storage.
+
+    Args:
+        citations: Citations structure to update in place
+
+    Returns:
+        The same structure
+    """
+    file_citations = citations.get("file_citations")
+    if file_citations is not None and not isinstance(file_citations, CompactFileCitations):
+        citations["file_citations"] = CompactFileCitations(file_citations)
+    return citations
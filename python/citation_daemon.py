@@ -0,0 +1,443 @@
+"""
+Resident citation daemon that answers queries over a Unix socket.
+
+Editors and hooks otherwise build a new ``CitationTracker`` for every action,
+re-reading ``citations.json`` each time. The daemon loads the citations
+once, keeps the query index warm and serves queries and mutations over a
+Unix socket (``citations.sock`` in the project root by default).
+
+Protocol: one JSON object per line in each direction. A request is
+``{"id": ..., "method": "citations_at", "params": {...}}`` and its response
+is ``{"id": ..., "result": ...}`` or ``{"id": ..., "error": "..."}``. A
+connection may send any number of requests.
+
+Mutations are applied in memory and answered right away. The tracker's
+background flusher writes every mutation queued within ``flush_interval_ms``
+in one store write. Add ``"flush": true`` to a request to answer only once
+its mutation is on disk, or send ``flush``.
+
+A watcher thread polls every ``poll_interval`` seconds. It picks up changes
+other processes made to the store (see ``CitationTracker.refresh``) and
+stats the next ``watch_batch`` cited files, so ``status`` can report cited
+files that were modified or deleted since the daemon started. Each poll
+costs a bounded number of system calls however many files are cited; a
+change shows up once the rotation reaches the file. The standard library
+has no file change notifications, so polling is the only watch mode.
+
+Usage:
+    python citation_daemon.py serve [PROJECT] [--socket PATH] [--poll-interval SECONDS]
+    python citation_daemon.py call METHOD [PARAMS_JSON] [--project PROJECT] [--socket PATH]
+    python citation_daemon.py stop [--project PROJECT] [--socket PATH]
+"""
+import argparse
+import inspect
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+try:
+    from .citation_tracker import CitationTracker
+except ImportError:
+    from citation_tracker import CitationTracker
+
+# Socket file created in the project root
+DEFAULT_SOCKET_NAME = "citations.sock"
+
+# Seconds between polls of the store and the cited files
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Cited files checked per poll
+DEFAULT_WATCH_BATCH = 1000
+
+# Interval (in milliseconds) between writes of queued mutations
+DEFAULT_FLUSH_INTERVAL_MS = 50
+
+# Tracker methods served as-is
+QUERY_METHODS = (
+    "files_citing", "citations_at", "citations_overlapping", "coalesced_ranges",
+    "generate_attribution_comment", "generate_citations_markdown",
+)
+MUTATION_METHODS = ("add_source", "cite_in_file", "add_sources", "cite_many")
+
+
+def default_socket_path(project_path: Optional[str] = None) -> str:
+    """
+    Socket path of the daemon serving a project.
+
+    Args:
+        project_path: Project root (defaults to the current directory)
+
+    Returns:
+        Path of ``citations.sock`` in the project root
+    """
+    return os.path.join(project_path or os.getcwd(), DEFAULT_SOCKET_NAME)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Answers the newline-delimited JSON requests of one connection."""
+
+    def handle(self) -> None:
+        daemon = self.server.citation_daemon
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                request = None
+                response: Dict[str, Any] = {"id": None, "error": f"Invalid JSON: {error}"}
+            else:
+                response = daemon.handle_request(request)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            if isinstance(request, dict) and request.get("method") == "shutdown" \
+                    and "error" not in response:
+                # shutdown() waits for the serving thread, so call it from another one
+                threading.Thread(target=daemon.stop, daemon=True).start()
+                return
+
+
+class CitationDaemon:
+    """Keeps a project's citations in memory and serves them over a socket."""
+
+    def __init__(self, project_path: str = None, socket_path: Optional[str] = None,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+                 watch_batch: int = DEFAULT_WATCH_BATCH, **tracker_options: Any):
+        """
+        Load the citations and build the query index.
+
+        Args:
+            project_path: Root directory of the project for storing citation data
+            socket_path: Socket to listen on (defaults to ``citations.sock``
+                in the project root)
+            poll_interval: Seconds between polls of the store and the cited files
+            flush_interval_ms: Interval between writes of queued mutations
+            watch_batch: Number of cited files checked per poll
+            **tracker_options: Other ``CitationTracker`` options, such as
+                ``store`` (``journal`` defaults to True)
+        """
+        if "store" not in tracker_options:
+            # Appending to a journal keeps each batched write small
+            tracker_options.setdefault("journal", True)
+        self.tracker = CitationTracker(project_path, flush_interval_ms=flush_interval_ms,
+                                       **tracker_options)
+        self.project_path = self.tracker.project_path
+        self.socket_path = socket_path or default_socket_path(self.project_path)
+        self.poll_interval = poll_interval
+        self.watch_batch = watch_batch
+        self.started_at = time.time()
+        # Answer the first query from a warm index
+        self.tracker._get_index()
+
+        # Cited file -> modification time when first seen (None if missing)
+        self._file_states: Dict[str, Optional[int]] = {}
+        self._modified: Set[str] = set()
+        self._missing: Set[str] = set()
+        # Cited files in the order they are checked, and the next one to check
+        self._watch_order: List[str] = []
+        self._watch_cursor = 0
+        self._watch_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stop_lock = threading.Lock()
+        self._stopped = False
+        self._server: Optional[socketserver.BaseServer] = None
+        self._threads: List[threading.Thread] = []
+
+        self._handlers: Dict[str, Callable[..., Any]] = {
+            name: getattr(self.tracker, name) for name in QUERY_METHODS + MUTATION_METHODS}
+        self._handlers.update({
+            "ping": lambda: "pong",
+            "files_with_license": lambda license_type: sorted(
+                self.tracker.files_with_license(license_type)),
+            "source": self._source,
+            "file_citations": self._file_citations,
+            "status": self.status,
+            "flush": self.tracker.flush,
+            "refresh": self.poll,
+            "shutdown": lambda: None,
+        })
+        self._signatures = {name: inspect.signature(handler)
+                            for name, handler in self._handlers.items()}
+        self.poll()
+
+    def _source(self, source_id: str) -> Optional[Dict]:
+        return self.tracker.citations["sources"].get(source_id)
+
+    def _file_citations(self, file_path: str) -> List[Dict]:
+        key = self.tracker._relative_path(file_path)
+        return list(self.tracker.citations["file_citations"].get(key, ()))
+
+    def handle_request(self, request: Dict) -> Dict:
+        """
+        Answer one protocol request.
+
+        Args:
+            request: Dict with ``method``, optional ``params`` (a dict of
+                keyword arguments), ``id`` and ``flush``
+
+        Returns:
+            Dict with the request's ``id`` and either ``result`` or ``error``
+        """
+        request_id = request.get("id") if isinstance(request, dict) else None
+        if not isinstance(request, dict) or not isinstance(request.get("params", {}), dict):
+            return {"id": request_id, "error": "Requests must be objects with object params"}
+        method = request.get("method")
+        handler = self._handlers.get(method)
+        if handler is None:
+            return {"id": request_id, "error": f"Unknown method '{method}'"}
+        params = request.get("params", {})
+        try:
+            self._signatures[method].bind(**params)
+        except TypeError as error:
+            return {"id": request_id, "error": f"Invalid parameters for '{method}': {error}"}
+        try:
+            result = handler(**params)
+            if request.get("flush"):
+                self.tracker.flush()
+        except Exception as error:
+            return {"id": request_id, "error": str(error)}
+        return {"id": request_id, "result": result}
+
+    def poll(self) -> bool:
+        """
+        Pick up store changes from other processes and stat the next cited files.
+
+        Returns:
+            True if the citations changed
+        """
+        with self._watch_lock:
+            changed = self.tracker.refresh()
+            if self._watch_cursor >= len(self._watch_order):
+                # Start the next rotation with the files cited now
+                with self.tracker._lock:
+                    self._watch_order = list(self.tracker.citations["file_citations"])
+                self._watch_cursor = 0
+            batch = self._watch_order[self._watch_cursor:self._watch_cursor + self.watch_batch]
+            self._watch_cursor += len(batch)
+            for file_path in batch:
+                try:
+                    mtime: Optional[int] = os.stat(
+                        os.path.join(self.project_path, file_path)).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if file_path not in self._file_states:
+                    self._file_states[file_path] = mtime
+                elif mtime != self._file_states[file_path]:
+                    self._modified.add(file_path)
+                if mtime is None:
+                    self._missing.add(file_path)
+                else:
+                    self._missing.discard(file_path)
+            return changed
+
+    def status(self) -> Dict:
+        """
+        Summary of the daemon's state.
+
+        Returns:
+            Dict with the numbers of ``sources`` and ``files``, the cited
+            files ``modified`` or ``missing`` since the daemon started,
+            ``uptime`` in seconds and the tracker's ``flush`` statistics
+        """
+        with self._watch_lock:
+            modified = sorted(self._modified)
+            missing = sorted(self._missing)
+        return {
+            "project_path": self.project_path,
+            "sources": len(self.tracker.citations["sources"]),
+            "files": len(self.tracker.citations["file_citations"]),
+            "modified": modified,
+            "missing": missing,
+            "uptime": time.time() - self.started_at,
+            "flush": self.tracker.flush_stats(),
+        }
+
+    def _watch(self) -> None:
+        while not self._stopping.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as error:
+                print(f"Warning: Polling for changes failed: {error}")
+
+    def start(self) -> None:
+        """
+        Listen on the socket and start the watcher, both in background threads.
+
+        Raises:
+            RuntimeError: If Unix sockets are not available or another
+                daemon is already listening on the socket
+        """
+        server_class = getattr(socketserver, "ThreadingUnixStreamServer", None)
+        if server_class is None:
+            raise RuntimeError("Unix sockets are not available on this platform")
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                # Left behind by a daemon that did not shut down cleanly
+                os.remove(self.socket_path)
+            else:
+                raise RuntimeError(f"A citation daemon is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+
+        self._server = server_class(self.socket_path, _RequestHandler)
+        # Open connections must not keep the process alive
+        self._server.daemon_threads = True
+        self._server.citation_daemon = self
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, daemon=True,
+                             name="citation-daemon-server"),
+            threading.Thread(target=self._watch, daemon=True, name="citation-daemon-watcher"),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def serve_forever(self) -> None:
+        """Serve until a ``shutdown`` request or KeyboardInterrupt, then stop."""
+        self.start()
+        try:
+            while not self._stopping.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop serving, write queued mutations and remove the socket."""
+        self._stopping.set()
+        with self._stop_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            server, self._server = self._server, None
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+                try:
+                    os.remove(self.socket_path)
+                except FileNotFoundError:
+                    pass
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+            self.tracker.close()
+
+
+class DaemonClient:
+    """Connection to a running ``CitationDaemon``."""
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = 10.0):
+        """
+        Connect to the daemon.
+
+        Args:
+            socket_path: Socket of the daemon (defaults to ``citations.sock``
+                in the current directory)
+            timeout: Seconds to wait for a response
+
+        Raises:
+            OSError: If no daemon is listening
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(self.socket_path)
+        except OSError:
+            self._socket.close()
+            raise
+        self._reader = self._socket.makefile("rb")
+        self._next_id = 0
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def call(self, method: str, flush: bool = False, **params: Any) -> Any:
+        """
+        Send a request and wait for its response.
+
+        Args:
+            method: Method name, e.g. ``citations_at``
+            flush: Answer only once the mutation is written to the store
+            **params: Keyword arguments of the method
+
+        Returns:
+            The method's result
+
+        Raises:
+            RuntimeError: If the daemon reported an error
+            ConnectionError: If the daemon closed the connection
+        """
+        self._next_id += 1
+        request: Dict[str, Any] = {"id": self._next_id, "method": method, "params": params}
+        if flush:
+            request["flush"] = True
+        self._socket.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("The citation daemon closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response.get("result")
+
+    def close(self) -> None:
+        """Close the connection."""
+        self._reader.close()
+        self._socket.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Serve citation queries from memory over a Unix socket.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="Run the daemon in the foreground")
+    serve.add_argument("project", nargs="?", default=".", help="Project root")
+    serve.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                       help=f"Seconds between polls for changes (default: {DEFAULT_POLL_INTERVAL})")
+    serve.add_argument("--no-journal", action="store_true",
+                       help="Rewrite citations.json on every write instead of appending to a journal")
+    call = commands.add_parser("call", help="Send one request and print the result as JSON")
+    call.add_argument("method", help="Method name, e.g. citations_at")
+    call.add_argument("params", nargs="?", default="{}", help="Parameters as a JSON object")
+    call.add_argument("--project", default=".", help="Project root")
+    stop = commands.add_parser("stop", help="Ask a running daemon to shut down")
+    stop.add_argument("--project", default=".", help="Project root")
+    for command in (serve, call, stop):
+        command.add_argument("--socket", help="Socket path (default: PROJECT/citations.sock)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        daemon = CitationDaemon(args.project, socket_path=args.socket,
+                                poll_interval=args.poll_interval, journal=not args.no_journal)
+        print(f"Serving citations of {daemon.project_path} on {daemon.socket_path}")
+        daemon.serve_forever()
+        return 0
+
+    socket_path = args.socket or default_socket_path(os.path.abspath(args.project))
+    try:
+        with DaemonClient(socket_path) as client:
+            if args.command == "stop":
+                client.call("shutdown")
+                return 0
+            result = client.call(args.method, **json.loads(args.params))
+    except (OSError, RuntimeError, ValueError) as error:
+        print(f"Error: {error}")
+        return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+File helpers shared by the tools that walk source trees.
+
+The attribution scanner (``citation_scan``), the fingerprint matcher
+(``citation_match``) and the multi-project aggregator
+(``citation_aggregate``) skip the same directories, detect binary files the
+same way and only start a process pool when there is enough work for it.
+"""
+import os
+from typing import List, Optional, Sequence, Tuple
+
+# Directories that are never searched
+DEFAULT_SKIP_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".tox",
+    ".mypy_cache", ".pytest_cache", "build", "dist",
+})
+
+# Bytes inspected for NUL characters to detect binary files
+BINARY_SNIFF_BYTES = 8192
+
+# Below this many items a process pool costs more than it saves. Looking for
+# markers in a file is cheaper than fingerprinting it, and loading a whole
+# project costs more than either.
+MIN_PARALLEL_SCAN_FILES = 2000
+MIN_PARALLEL_MATCH_FILES = 500
+MIN_PARALLEL_PROJECTS = 8
+
+
+def looks_binary(data) -> bool:
+    """
+    Whether file contents look binary.
+
+    Args:
+        data: Contents as bytes or a memory map
+
+    Returns:
+        True if the first ``BINARY_SNIFF_BYTES`` contain a NUL byte
+    """
+    return data.find(b"\0", 0, BINARY_SNIFF_BYTES) != -1
+
+
+def read_text_file(path: str) -> Optional[bytes]:
+    """
+    Read a file, returning None for binary or unreadable files.
+
+    Args:
+        path: File to read
+
+    Returns:
+        Raw file contents, or None
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    return None if looks_binary(data) else data
+
+
+def use_process_pool(count: int, workers: Optional[int], minimum: int) -> bool:
+    """
+    Whether work on a number of items is worth a process pool.
+
+    Args:
+        count: Number of items
+        workers: Requested worker processes (1 means in this process)
+        minimum: Number of items below which the pool costs more than it saves
+
+    Returns:
+        True if the items should be spread over worker processes
+    """
+    return workers != 1 and count >= minimum
+
+
+def pool_batches(items: Sequence, workers: Optional[int],
+                 min_size: int) -> Tuple[int, List[Sequence]]:
+    """
+    Split items into batches for a process pool.
+
+    Each worker gets about eight batches, so a slow batch does not hold up
+    the others, and batches are at least ``min_size`` items long.
+
+    Args:
+        items: Items to split
+        workers: Requested worker processes (defaults to the CPU count)
+        min_size: Smallest batch worth sending to a worker
+
+    Returns:
+        (number of workers, batches) tuple
+    """
+    workers = workers or os.cpu_count() or 1
+    size = max(min_size, len(items) // (workers * 8))
+    return workers, [items[i:i + size] for i in range(0, len(items), size)]
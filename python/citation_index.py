@@ -0,0 +1,300 @@
+"""
+In-memory query indexes over a citations structure.
+
+``CitationTracker`` only stores the file -> citations direction. The index in
+this module maintains the reverse direction (source -> files) and a license ->
+files view so impact queries do not have to scan every citation, plus a
+per-file interval index for "what is cited at this line?" lookups.
+"""
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+# A cited line range; either bound may be None when it was not recorded
+LineRange = Tuple[Optional[int], Optional[int]]
+
+# Upper bound used for citations recorded without a line_end
+_LAST_LINE = sys.maxsize
+
+
+def citation_bounds(citation: Dict) -> Tuple[int, int]:
+    """
+    Closed line interval covered by a citation.
+
+    A citation without ``line_start`` starts at line 1 and one without
+    ``line_end`` runs to the end of the file, so file-level citations cover
+    every line.
+
+    Args:
+        citation: Citation record
+
+    Returns:
+        (first_line, last_line) tuple
+    """
+    start = citation.get("line_start")
+    end = citation.get("line_end")
+    return (1 if start is None else start, _LAST_LINE if end is None else end)
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Merge overlapping or adjacent closed line intervals.
+
+    Args:
+        ranges: (start, end) tuples in any order
+
+    Returns:
+        Sorted, non-overlapping (start, end) tuples
+    """
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class LineIntervalIndex:
+    """
+    Static interval tree over the citations of one file.
+
+    Intervals are sorted by start and laid out as an implicit balanced binary
+    search tree (the root of ``[lo, hi)`` is its midpoint), with each node
+    storing the largest end line in its subtree. Stabbing and overlap queries
+    run in O(log n + k) for k results.
+    """
+
+    def __init__(self, citations: List[Dict]):
+        """
+        Build the tree.
+
+        Args:
+            citations: Citation records of a single file
+        """
+        items = sorted(((citation_bounds(c), i) for i, c in enumerate(citations)),
+                       key=lambda item: item[0])
+        self._citations = [citations[i] for _, i in items]
+        self._starts = [bounds[0] for bounds, _ in items]
+        self._ends = [bounds[1] for bounds, _ in items]
+        self._max_end = list(self._ends)
+        self._fill_max_end(0, len(items))
+
+    def _fill_max_end(self, lo: int, hi: int) -> int:
+        if lo >= hi:
+            return 0
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(self._ends[mid],
+                                 self._fill_max_end(lo, mid),
+                                 self._fill_max_end(mid + 1, hi))
+        return self._max_end[mid]
+
+    def overlapping(self, start: int, end: int) -> List[Dict]:
+        """
+        Citations whose line range intersects ``[start, end]``.
+
+        Args:
+            start: First line of the query range
+            end: Last line of the query range
+
+        Returns:
+            Matching citation records ordered by their first line
+        """
+        found: List[Dict] = []
+        starts, ends, max_end = self._starts, self._ends, self._max_end
+        # In-order traversal that prunes subtrees ending before the query and
+        # right subtrees starting after it
+        stack: List[Tuple[int, int]] = []
+        lo, hi = 0, len(starts)
+        while True:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if max_end[mid] < start:
+                    break
+                stack.append((mid, hi))
+                hi = mid
+            if not stack:
+                return found
+            mid, hi = stack.pop()
+            if starts[mid] > end:
+                # Every remaining node in this subtree starts later still
+                lo = hi
+                continue
+            if ends[mid] >= start:
+                found.append(self._citations[mid])
+            lo = mid + 1
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+
+class CitationIndex:
+    """Reverse index from sources and licenses to the files that cite them."""
+
+    def __init__(self, citations: Dict):
+        """
+        Build the index from a citations structure.
+
+        Args:
+            citations: Citations structure as held by ``CitationTracker``
+        """
+        # source_id -> {file_path -> [line ranges]}
+        self.by_source: Dict[str, Dict[str, List[LineRange]]] = {}
+        # source_id -> license_type of the registered source (None if unknown)
+        self.source_license: Dict[str, Optional[str]] = {}
+        # license_type -> {file_path -> number of distinct sources with that license}
+        self.license_files: Dict[Optional[str], Dict[str, int]] = {}
+        # file_path -> source_ids cited anywhere in the file
+        self.file_sources: Dict[str, Set[str]] = {}
+        # file_path -> interval tree, built on first line query
+        self._file_citations = citations["file_citations"]
+        self._intervals: Dict[str, LineIntervalIndex] = {}
+
+        for source_id, source in citations["sources"].items():
+            self.add_source(source_id, source)
+        for file_path, file_citations in citations["file_citations"].items():
+            for citation in file_citations:
+                self.add_citation(file_path, citation)
+
+    def apply(self, op: Dict) -> None:
+        """
+        Keep the index in sync with a mutation record.
+
+        Args:
+            op: Mutation record as passed to ``citation_store.apply_op``
+        """
+        kind = op["op"]
+        if kind == "add_source":
+            self.add_source(op["source_id"], op["source"])
+        elif kind == "cite":
+            self.add_citation(op["file"], op["citation"])
+        elif kind == "set_file":
+            self.remove_file(op["file"])
+            for citation in op["citations"]:
+                self.add_citation(op["file"], citation)
+
+    def add_source(self, source_id: str, source: Dict) -> None:
+        """
+        Register or update a source, moving its files if the license changed.
+
+        Args:
+            source_id: Source identifier
+            source: Source record
+        """
+        new_license = source.get("license_type")
+        old_license = self.source_license.get(source_id)
+        self.source_license[source_id] = new_license
+        if old_license == new_license:
+            return
+
+        for file_path in self.by_source.get(source_id, ()):
+            self._unlink_license(old_license, file_path)
+            self._link_license(new_license, file_path)
+
+    def add_citation(self, file_path: str, citation: Dict) -> None:
+        """
+        Index a single citation.
+
+        Args:
+            file_path: Project-relative file the citation belongs to
+            citation: Citation record
+        """
+        line_range = (citation.get("line_start"), citation.get("line_end"))
+        self._intervals.pop(file_path, None)
+        self.file_sources.setdefault(file_path, set()).update(citation["source_ids"])
+        for source_id in citation["source_ids"]:
+            files = self.by_source.setdefault(source_id, {})
+            ranges = files.get(file_path)
+            if ranges is None:
+                files[file_path] = ranges = []
+                self._link_license(self.source_license.get(source_id), file_path)
+            ranges.append(line_range)
+
+    def remove_file(self, file_path: str) -> None:
+        """
+        Drop every citation of a file from the index.
+
+        Args:
+            file_path: Project-relative file path
+        """
+        self._intervals.pop(file_path, None)
+        for source_id in self.file_sources.pop(file_path, ()):
+            files = self.by_source[source_id]
+            del files[file_path]
+            if not files:
+                del self.by_source[source_id]
+            self._unlink_license(self.source_license.get(source_id), file_path)
+
+    def files_citing(self, source_id: str) -> Dict[str, List[LineRange]]:
+        """
+        Files that cite a source.
+
+        Args:
+            source_id: Source identifier
+
+        Returns:
+            Mapping of file path to the line ranges citing the source
+        """
+        return {file_path: list(ranges)
+                for file_path, ranges in self.by_source.get(source_id, {}).items()}
+
+    def files_with_license(self, license_type: Optional[str]) -> Set[str]:
+        """
+        Files that cite at least one source under a license.
+
+        Args:
+            license_type: License as recorded on the sources
+
+        Returns:
+            Set of file paths
+        """
+        return set(self.license_files.get(license_type, ()))
+
+    def citations_overlapping(self, file_path: str, start: int, end: int) -> List[Dict]:
+        """
+        Citations of a file whose line range intersects ``[start, end]``.
+
+        Args:
+            file_path: Project-relative file path
+            start: First line of the query range
+            end: Last line of the query range
+
+        Returns:
+            Matching citation records ordered by their first line
+        """
+        intervals = self._intervals.get(file_path)
+        if intervals is None:
+            file_citations = self._file_citations.get(file_path)
+            if not file_citations:
+                return []
+            intervals = self._intervals[file_path] = LineIntervalIndex(file_citations)
+        return intervals.overlapping(start, end)
+
+    def coalesced_ranges(self, file_path: str) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Merged line ranges of a file, per cited source.
+
+        Args:
+            file_path: Project-relative file path
+
+        Returns:
+            Mapping of source_id to sorted, non-overlapping (start, end) ranges
+        """
+        per_source: Dict[str, List[Tuple[int, int]]] = {}
+        for citation in self._file_citations.get(file_path, ()):
+            bounds = citation_bounds(citation)
+            for source_id in citation["source_ids"]:
+                per_source.setdefault(source_id, []).append(bounds)
+        return {source_id: merge_ranges(ranges) for source_id, ranges in per_source.items()}
+
+    def _link_license(self, license_type: Optional[str], file_path: str) -> None:
+        files = self.license_files.setdefault(license_type, {})
+        files[file_path] = files.get(file_path, 0) + 1
+
+    def _unlink_license(self, license_type: Optional[str], file_path: str) -> None:
+        files = self.license_files[license_type]
+        files[file_path] -= 1
+        if not files[file_path]:
+            del files[file_path]
+            if not files:
+                del self.license_files[license_type]
@@ -0,0 +1,554 @@
+"""
+Fingerprint index that finds code matching registered sources.
+
+Reference snippets or local files are attached to sources and reduced to
+winnowed fingerprints. Scanning a project fingerprints every file the same
+way and proposes ``cite_in_file`` entries, with line ranges, wherever the
+fingerprints of a source show up.
+
+Fingerprints are taken over normalized lines. Whitespace is removed and
+lines shorter than ``MIN_LINE_CHARS`` (braces, ``else:``) are skipped, so
+re-indented or re-wrapped copies still match. Every run of ``k`` consecutive
+normalized lines is hashed, and winnowing keeps the smallest hash of each
+window of ``window`` consecutive hashes. Any shared run of at least
+``k + window - 1`` normalized lines is guaranteed to share a fingerprint,
+while only about ``2 / (window + 1)`` of the hashes are stored.
+
+The index keeps fingerprints in sorted segments of typed arrays, 16 bytes
+per fingerprint, and looks them up by binary search. Attaching more
+references adds a segment instead of rebuilding the index. Segments are
+merged so their sizes grow geometrically, and into one when the index is
+saved.
+
+Usage:
+    python citation_match.py attach SOURCE_ID PATH... [--project PROJECT]
+    python citation_match.py scan [PROJECT] [--apply] [--json] [-j WORKERS]
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    from .citation_files import (DEFAULT_SKIP_DIRS, MIN_PARALLEL_MATCH_FILES, pool_batches,
+                                 read_text_file, use_process_pool)
+    from .citation_scan import list_project_files
+    from .citation_store import atomic_open
+    from .citation_tracker import CitationTracker
+except ImportError:
+    from citation_files import (DEFAULT_SKIP_DIRS, MIN_PARALLEL_MATCH_FILES, pool_batches,
+                                read_text_file, use_process_pool)
+    from citation_scan import list_project_files
+    from citation_store import atomic_open
+    from citation_tracker import CitationTracker
+
+# Index kept next to citations.json by the command-line entry point
+FINGERPRINT_INDEX_FILE_NAME = "citations.fingerprints"
+
+# Normalized lines per hashed k-gram
+DEFAULT_K = 3
+
+# k-grams per winnowing window
+DEFAULT_WINDOW = 4
+
+# Normalized lines shorter than this carry too little content to match on
+MIN_LINE_CHARS = 4
+
+# Fingerprints a match needs before it is proposed
+DEFAULT_MIN_FINGERPRINTS = 2
+
+INDEX_MAGIC = b"CITFP\0"
+INDEX_VERSION = 1
+
+# magic, version, length of the JSON metadata that follows
+_HEADER = struct.Struct("<6sHI")
+
+_MASK = (1 << 64) - 1
+_MULTIPLIER = 0x100000001B3
+
+
+def normalize_lines(data: bytes) -> Tuple[List[int], List[int]]:
+    """
+    Hash the lines of a file that carry content, ignoring whitespace.
+
+    Args:
+        data: Raw file contents
+
+    Returns:
+        (hashes, line numbers) of the lines with at least ``MIN_LINE_CHARS``
+        non-whitespace characters
+    """
+    hashes: List[int] = []
+    numbers: List[int] = []
+    for number, line in enumerate(data.split(b"\n"), 1):
+        text = b"".join(line.split())
+        if len(text) >= MIN_LINE_CHARS:
+            hashes.append(zlib.crc32(text))
+            numbers.append(number)
+    return hashes, numbers
+
+
+def fingerprint(data: bytes, k: int = DEFAULT_K,
+                window: int = DEFAULT_WINDOW) -> List[Tuple[int, int, int]]:
+    """
+    Winnowed fingerprints of a file.
+
+    Args:
+        data: Raw file contents
+        k: Normalized lines per k-gram
+        window: k-grams per winnowing window
+
+    Returns:
+        (hash, first line, last line) of each fingerprint, in file order
+    """
+    hashes, numbers = normalize_lines(data)
+    count = len(hashes) - k + 1
+    if count <= 0:
+        return []
+
+    grams = []
+    gram = 0
+    for value in hashes[:k]:
+        gram = (gram * _MULTIPLIER + value) & _MASK
+    grams.append(gram)
+    top = pow(_MULTIPLIER, k - 1, 1 << 64)
+    for i in range(1, count):
+        gram = ((gram - hashes[i - 1] * top) * _MULTIPLIER + hashes[i + k - 1]) & _MASK
+        grams.append(gram)
+
+    # Short inputs still get their smallest hash as a fingerprint
+    window = min(window, count)
+    selected = []
+    # Indices of candidate minimums, with increasing hashes
+    candidates: deque = deque()
+    last = -1
+    for i, gram in enumerate(grams):
+        while candidates and grams[candidates[-1]] >= gram:
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        if i >= window - 1 and candidates[0] != last:
+            last = candidates[0]
+            selected.append((grams[last], numbers[last], numbers[last + k - 1]))
+    return selected
+
+
+class FingerprintIndex:
+    """
+    Winnowed fingerprints of the reference snippets and files of sources.
+
+    Each attached snippet or file is a reference with a ``source_id``, an
+    ``origin`` (the file path, or a name for snippets) and a content digest.
+    Attaching changed content under the same origin replaces the reference.
+    """
+
+    def __init__(self, path: Optional[str] = None, k: int = DEFAULT_K,
+                 window: int = DEFAULT_WINDOW):
+        """
+        Initialize the index, loading it from disk if possible.
+
+        Args:
+            path: Optional file to persist the index in
+            k: Normalized lines per k-gram for a new index
+            window: k-grams per winnowing window for a new index; a loaded
+                index keeps the values it was built with
+        """
+        self.path = path
+        self.k = k
+        self.window = window
+        # Reference dicts by reference number; None once removed
+        self.references: List[Optional[Dict]] = []
+        self._origins: Dict[str, int] = {}
+        # (hashes, reference numbers, source lines) arrays, each sorted by hash
+        self._segments: List[Tuple[array, array, array]] = []
+        self._removed = 0
+        self._dirty = False
+        if path and os.path.exists(path):
+            try:
+                self._load(path)
+            except (OSError, ValueError, KeyError, struct.error):
+                print("Warning: Fingerprint index unreadable, starting a new one.")
+                self.references, self._origins, self._segments = [], {}, []
+
+    def __len__(self) -> int:
+        """Number of stored fingerprints, including those of removed references."""
+        return sum(len(hashes) for hashes, _, _ in self._segments)
+
+    def add_snippet(self, source_id: str, content: Union[str, bytes],
+                    origin: Optional[str] = None) -> int:
+        """
+        Attach reference content to a source.
+
+        Args:
+            source_id: Source the content belongs to
+            content: Snippet text or raw file contents
+            origin: Name of the reference (defaults to one derived from the
+                content); attaching again under the same origin replaces it
+
+        Returns:
+            Number of fingerprints added (0 if the reference was unchanged)
+        """
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        digest = hashlib.sha1(data).hexdigest()
+        origin = origin or f"snippet:{digest[:12]}"
+        previous = self._origins.get(origin)
+        if previous is not None:
+            reference = self.references[previous]
+            if reference["digest"] == digest and reference["source_id"] == source_id:
+                return 0
+            self.remove(origin)
+
+        prints = fingerprint(data, self.k, self.window)
+        number = len(self.references)
+        self.references.append({"source_id": source_id, "origin": origin, "digest": digest,
+                                "fingerprints": len(prints)})
+        self._origins[origin] = number
+        if prints:
+            entries = sorted((value, first) for value, first, _ in prints)
+            self._segments.append((array('Q', [value for value, _ in entries]),
+                                   array('I', [number]) * len(entries),
+                                   array('I', [first for _, first in entries])))
+            # Keep segment sizes growing geometrically, so there are few of them
+            while (len(self._segments) > 1
+                   and len(self._segments[-2][0]) <= 2 * len(self._segments[-1][0])):
+                self._segments[-2:] = self._merged(self._segments[-2:])
+        self._dirty = True
+        return len(prints)
+
+    def add_file(self, source_id: str, path: str) -> int:
+        """
+        Attach a local file to a source.
+
+        Args:
+            source_id: Source the file belongs to
+            path: Path to the file
+
+        Returns:
+            Number of fingerprints added (0 if unchanged, binary or unreadable)
+        """
+        data = read_text_file(path)
+        if data is None:
+            return 0
+        return self.add_snippet(source_id, data, origin=os.path.abspath(path))
+
+    def remove(self, origin: str) -> bool:
+        """
+        Detach a reference.
+
+        Args:
+            origin: Origin the reference was attached under
+
+        Returns:
+            True if a reference was removed
+        """
+        number = self._origins.pop(origin, None)
+        if number is None:
+            return False
+        self._removed += self.references[number]["fingerprints"]
+        self.references[number] = None
+        self._dirty = True
+        return True
+
+    def origins(self) -> List[str]:
+        """Origins of the attached references."""
+        return list(self._origins)
+
+    def _merged(self, segments: List[Tuple[array, array, array]]) -> List[Tuple[array, array, array]]:
+        """Merge segments into at most one, dropping removed references."""
+        entries = sorted(
+            (value, number, line)
+            for hashes, numbers, lines in segments
+            for value, number, line in zip(hashes, numbers, lines)
+            if self.references[number] is not None)
+        if not entries:
+            return []
+        return [(array('Q', [entry[0] for entry in entries]),
+                 array('I', [entry[1] for entry in entries]),
+                 array('I', [entry[2] for entry in entries]))]
+
+    def lookup(self, value: int) -> Iterator[Tuple[Dict, int]]:
+        """
+        Find the references containing a fingerprint.
+
+        Args:
+            value: Fingerprint hash
+
+        Yields:
+            (reference, first line in the reference) pairs
+        """
+        for hashes, numbers, lines in self._segments:
+            position = bisect.bisect_left(hashes, value)
+            while position < len(hashes) and hashes[position] == value:
+                reference = self.references[numbers[position]]
+                if reference is not None:
+                    yield reference, lines[position]
+                position += 1
+
+    def match(self, data: bytes, min_fingerprints: int = DEFAULT_MIN_FINGERPRINTS) -> List[Dict]:
+        """
+        Find the parts of a file that match attached references.
+
+        Matching fingerprints of the same source that lie close together are
+        merged into one line range.
+
+        Args:
+            data: Raw file contents
+            min_fingerprints: Fingerprints a range needs to be reported
+
+        Returns:
+            Dicts with ``source_id``, ``line_start``, ``line_end``, the number
+            of matched ``fingerprints`` and the matched ``origins``
+        """
+        hits: Dict[str, List[Tuple[int, int, str]]] = {}
+        for value, first, last in fingerprint(data, self.k, self.window):
+            for reference, _ in self.lookup(value):
+                hits.setdefault(reference["source_id"], []).append(
+                    (first, last, reference["origin"]))
+
+        # Fingerprints of one match are at most about a window apart
+        gap = self.k + self.window
+        matches = []
+        for source_id, spans in hits.items():
+            spans.sort()
+            current = None
+            for first, last, origin in spans:
+                if current is not None and first <= current["line_end"] + gap:
+                    current["line_end"] = max(current["line_end"], last)
+                    current["fingerprints"] += 1
+                    current["origins"].add(origin)
+                    continue
+                current = {"source_id": source_id, "line_start": first, "line_end": last,
+                           "fingerprints": 1, "origins": {origin}}
+                matches.append(current)
+        for match in matches:
+            match["origins"] = sorted(match["origins"])
+        matches = [match for match in matches if match["fingerprints"] >= min_fingerprints]
+        matches.sort(key=lambda match: (match["line_start"], match["source_id"]))
+        return matches
+
+    def _load(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, length = _HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"Not a fingerprint index: {path}")
+        offset = _HEADER.size
+        metadata = json.loads(data[offset:offset + length])
+        offset += length
+        self.k = metadata["k"]
+        self.window = metadata["window"]
+        self.references = metadata["references"]
+        self._origins = {reference["origin"]: number
+                         for number, reference in enumerate(self.references) if reference}
+        count = metadata["count"]
+        arrays = []
+        for typecode in ('Q', 'I', 'I'):
+            column = array(typecode)
+            end = offset + count * column.itemsize
+            column.frombytes(data[offset:end])
+            if metadata["byteorder"] != sys.byteorder:
+                column.byteswap()
+            arrays.append(column)
+            offset = end
+        if len(arrays[0]) != count or len(arrays[2]) != count:
+            raise ValueError(f"Truncated fingerprint index: {path}")
+        self._segments = [tuple(arrays)] if count else []
+
+    def save(self) -> None:
+        """Persist the index if it changed, merging its segments."""
+        if not self.path or not self._dirty:
+            return
+        if len(self._segments) > 1 or self._removed:
+            self._segments = self._merged(self._segments)
+            self._removed = 0
+        hashes, numbers, lines = self._segments[0] if self._segments else (
+            array('Q'), array('I'), array('I'))
+        metadata = json.dumps({
+            "k": self.k,
+            "window": self.window,
+            "byteorder": sys.byteorder,
+            "count": len(hashes),
+            "references": self.references,
+        }, separators=(',', ':')).encode("utf-8")
+        with atomic_open(self.path, 'wb') as f:
+            f.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(metadata)))
+            f.write(metadata)
+            for column in (hashes, numbers, lines):
+                f.write(column.tobytes())
+        self._dirty = False
+
+
+# Index used by process pool workers, set once per worker
+_worker_index: Optional[FingerprintIndex] = None
+
+
+def _init_worker(index: FingerprintIndex) -> None:
+    global _worker_index
+    _worker_index = index
+
+
+def _match_chunk(args: Tuple[str, List[str], int]) -> List[Tuple[str, List[Dict]]]:
+    """Process pool worker: match a batch of project files."""
+    root, paths, min_fingerprints = args
+    results = []
+    for path in paths:
+        data = read_text_file(os.path.join(root, path))
+        if data:
+            found = _worker_index.match(data, min_fingerprints)
+            if found:
+                results.append((path, found))
+    return results
+
+
+def find_matches(project_path: str, index: FingerprintIndex, paths: Optional[List[str]] = None,
+                 workers: Optional[int] = None,
+                 min_fingerprints: int = DEFAULT_MIN_FINGERPRINTS) -> Dict[str, List[Dict]]:
+    """
+    Match the files of a project against the index.
+
+    Files attached to the index as references are not matched.
+
+    Args:
+        project_path: Project root
+        index: Fingerprint index of the sources
+        paths: Project-relative files to match (defaults to
+            ``list_project_files(project_path)``)
+        workers: Worker processes (defaults to the CPU count; 1 matches in
+            this process)
+        min_fingerprints: Fingerprints a range needs to be reported
+
+    Returns:
+        Matches, as returned by ``FingerprintIndex.match``, per file
+    """
+    if paths is None:
+        paths = list_project_files(project_path)
+    origins = set(index.origins())
+    paths = [path for path in paths if os.path.abspath(os.path.join(project_path, path)) not in origins]
+    if not len(index):
+        return {}
+
+    if not use_process_pool(len(paths), workers, MIN_PARALLEL_MATCH_FILES):
+        _init_worker(index)
+        try:
+            return dict(_match_chunk((project_path, paths, min_fingerprints)))
+        finally:
+            _init_worker(None)
+
+    workers, batches = pool_batches(paths, workers, 32)
+    chunks = [(project_path, batch, min_fingerprints) for batch in batches]
+    matches: Dict[str, List[Dict]] = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(index,)) as pool:
+        for results in pool.map(_match_chunk, chunks):
+            matches.update(results)
+    return matches
+
+
+def propose_citations(tracker: CitationTracker, index: FingerprintIndex,
+                      paths: Optional[List[str]] = None, workers: Optional[int] = None,
+                      min_fingerprints: int = DEFAULT_MIN_FINGERPRINTS) -> List[Dict]:
+    """
+    Propose citations for the code of a project that matches its sources.
+
+    Matches already covered by a citation of the same source are left out.
+
+    Args:
+        tracker: Citation tracker of the project
+        index: Fingerprint index of the sources
+        paths: Project-relative files to match (defaults to every project file)
+        workers: Worker processes (defaults to the CPU count)
+        min_fingerprints: Fingerprints a range needs to be proposed
+
+    Returns:
+        ``cite_in_file`` keyword arguments, ready for ``tracker.cite_many``
+    """
+    proposals = []
+    matches = find_matches(tracker.project_path, index, paths, workers, min_fingerprints)
+    for path in sorted(matches):
+        for match in matches[path]:
+            existing = tracker.citations_overlapping(path, match["line_start"], match["line_end"])
+            if any(match["source_id"] in citation["source_ids"] for citation in existing):
+                continue
+            origins = ", ".join(origin if origin.startswith("snippet:") else os.path.basename(origin)
+                                for origin in match["origins"])
+            proposals.append({
+                "file_path": path,
+                "source_ids": [match["source_id"]],
+                "line_start": match["line_start"],
+                "line_end": match["line_end"],
+                "comment": f"Matches {match['fingerprints']} fingerprints of {origins}",
+            })
+    return proposals
+
+
+def _iter_attach_paths(path: str) -> Iterator[str]:
+    """Files to attach for a command-line path, walking directories."""
+    if not os.path.isdir(path):
+        yield path
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(name for name in dirnames if name not in DEFAULT_SKIP_DIRS)
+        for name in sorted(filenames):
+            yield os.path.join(dirpath, name)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Find code that matches the reference snippets of citation sources.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    attach = commands.add_parser("attach", help="Attach reference files to a source")
+    attach.add_argument("source_id", help="Source the files belong to")
+    attach.add_argument("paths", nargs="+", help="Files or directories ('-' reads a snippet from stdin)")
+    attach.add_argument("--project", default=".", help="Project root")
+    scan = commands.add_parser("scan", help="Propose citations for matching code")
+    scan.add_argument("project", nargs="?", default=".", help="Project root")
+    scan.add_argument("--apply", action="store_true", help="Record the proposed citations")
+    scan.add_argument("--json", action="store_true", help="Print the proposals as JSON")
+    scan.add_argument("-j", "--workers", type=int, default=None,
+                      help="Worker processes (default: CPU count)")
+    scan.add_argument("--min-fingerprints", type=int, default=DEFAULT_MIN_FINGERPRINTS,
+                      help=f"Fingerprints a match needs (default: {DEFAULT_MIN_FINGERPRINTS})")
+    args = parser.parse_args(argv)
+
+    tracker = CitationTracker(args.project)
+    index = FingerprintIndex(os.path.join(args.project, FINGERPRINT_INDEX_FILE_NAME))
+    if args.command == "attach":
+        if args.source_id not in tracker.citations["sources"]:
+            print(f"Warning: Source '{args.source_id}' is not registered.")
+        added = 0
+        for path in args.paths:
+            if path == "-":
+                added += index.add_snippet(args.source_id, sys.stdin.read())
+                continue
+            for file_path in _iter_attach_paths(path):
+                added += index.add_file(args.source_id, file_path)
+        index.save()
+        print(f"Added {added} fingerprints; the index holds {len(index)}")
+        return 0
+
+    proposals = propose_citations(tracker, index, workers=args.workers,
+                                  min_fingerprints=args.min_fingerprints)
+    if args.json:
+        print(json.dumps(proposals, indent=2))
+    else:
+        for proposal in proposals:
+            print(f"{proposal['file_path']}:{proposal['line_start']}-{proposal['line_end']}: "
+                  f"matches '{proposal['source_ids'][0]}' ({proposal['comment']})")
+        print(f"{len(proposals)} proposed citations")
+    if args.apply and proposals:
+        tracker.cite_many(proposals)
+        return 0
+    return 1 if proposals else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
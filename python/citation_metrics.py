@@ -0,0 +1,147 @@
+"""
+Opt-in instrumentation for the citation tracker.
+
+A ``TrackerMetrics`` object collects, per operation, a call count, total,
+minimum and maximum time and a timing histogram, plus the bytes read and
+written by the store. Pass ``metrics=True`` (or a ``TrackerMetrics`` to share
+between trackers) to ``CitationTracker`` to enable it. Trackers without
+metrics only pay for one attribute check per instrumented call.
+
+Operations recorded by the tracker:
+
+- ``load``, ``save`` and ``compact``: whole store reads and writes;
+- ``add_source``, ``cite_in_file`` and ``relative_path``;
+- ``attribution_comment`` and ``attribution_header``;
+- ``markdown`` (rendering) and ``export_markdown`` (rendering and writing);
+
+and by JSON stores:
+
+- ``read`` and ``parse``: reading and decoding ``citations.json``;
+- ``serialize`` and ``write``: encoding and writing it;
+- ``read_journal`` and ``append_journal``.
+
+Observers are called with an event dict after each recorded operation, for
+forwarding to another metrics system.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List
+
+# Upper bounds (milliseconds) of the timing histogram buckets; one more
+# bucket counts everything slower
+HISTOGRAM_BOUNDS_MS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 50.0, 100.0, 500.0, 1000.0, 5000.0)
+
+
+class TrackerMetrics:
+    """Counters, timing histograms and byte totals for tracker operations."""
+
+    def __init__(self, observers: Iterable[Callable[[Dict], None]] = ()):
+        """
+        Initialize empty metrics.
+
+        Args:
+            observers: Callbacks to register, see ``add_observer``
+        """
+        self._lock = threading.Lock()
+        self._observers: List[Callable[[Dict], None]] = list(observers)
+        self._operations: Dict[str, Dict] = {}
+        self._bytes_read = 0
+        self._bytes_written = 0
+
+    def add_observer(self, callback: Callable[[Dict], None]) -> None:
+        """
+        Register a callback for every recorded operation.
+
+        The callback receives a dict with the ``operation`` name, its duration
+        in ``seconds`` and the ``bytes_read`` and ``bytes_written``. It runs on
+        the thread that performed the operation and must not raise.
+
+        Args:
+            callback: Function to call
+        """
+        with self._lock:
+            self._observers = self._observers + [callback]
+
+    def remove_observer(self, callback: Callable[[Dict], None]) -> None:
+        """
+        Unregister a callback added with ``add_observer``.
+
+        Args:
+            callback: Function to remove
+        """
+        with self._lock:
+            self._observers = [observer for observer in self._observers if observer != callback]
+
+    def record(self, operation: str, seconds: float, bytes_read: int = 0,
+               bytes_written: int = 0) -> None:
+        """
+        Record one completed operation.
+
+        Args:
+            operation: Operation name
+            seconds: Time the operation took
+            bytes_read: Bytes read from storage
+            bytes_written: Bytes written to storage
+        """
+        elapsed_ms = seconds * 1000
+        bucket = bisect.bisect_left(HISTOGRAM_BOUNDS_MS, elapsed_ms)
+        with self._lock:
+            entry = self._operations.get(operation)
+            if entry is None:
+                entry = self._operations[operation] = {
+                    "count": 0, "total_ms": 0.0, "min_ms": elapsed_ms, "max_ms": elapsed_ms,
+                    "bytes_read": 0, "bytes_written": 0,
+                    "histogram": [0] * (len(HISTOGRAM_BOUNDS_MS) + 1),
+                }
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["min_ms"] = min(entry["min_ms"], elapsed_ms)
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["histogram"][bucket] += 1
+            if bytes_read or bytes_written:
+                entry["bytes_read"] += bytes_read
+                entry["bytes_written"] += bytes_written
+                self._bytes_read += bytes_read
+                self._bytes_written += bytes_written
+            observers = self._observers
+
+        if observers:
+            event = {"operation": operation, "seconds": seconds,
+                     "bytes_read": bytes_read, "bytes_written": bytes_written}
+            for observer in observers:
+                try:
+                    observer(event)
+                except Exception as error:
+                    print(f"Warning: Metrics observer failed: {error}")
+
+    def stats(self) -> Dict:
+        """
+        Snapshot of everything recorded so far.
+
+        Returns:
+            Dict with ``operations`` (per operation: ``count``, ``total_ms``,
+            ``mean_ms``, ``min_ms``, ``max_ms``, ``bytes_read``,
+            ``bytes_written`` and ``histogram``, the counts per bucket of
+            ``bucket_bounds_ms``), the total ``bytes_read`` and
+            ``bytes_written``, and ``bucket_bounds_ms``
+        """
+        with self._lock:
+            operations = {}
+            for operation, entry in self._operations.items():
+                entry = dict(entry, histogram=list(entry["histogram"]))
+                entry["mean_ms"] = entry["total_ms"] / entry["count"]
+                operations[operation] = entry
+            return {
+                "operations": operations,
+                "bytes_read": self._bytes_read,
+                "bytes_written": self._bytes_written,
+                "bucket_bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+            }
+
+    def reset(self) -> None:
+        """Forget everything recorded so far; observers stay registered."""
+        with self._lock:
+            self._operations = {}
+            self._bytes_read = 0
+            self._bytes_written = 0
+
@@ -0,0 +1,593 @@
+"""
+License policy checks over the whole citation graph.
+
+``license_type`` is free text on each source. ``normalize_license`` maps it to
+an SPDX license id or expression ("Apache License, Version 2.0" becomes
+``Apache-2.0``, "GPLv2+" becomes ``GPL-2.0-or-later``). Text that does not
+name a known license becomes a ``LicenseRef-`` id. Normalized results are
+cached, so each distinct string is only parsed once.
+
+A ``LicensePolicy`` holds allow and deny rules (SPDX ids or license
+categories such as ``strong-copyleft``) and, optionally, the license of the
+project itself. The compatibility of every known license with every possible
+project license is precomputed in ``COMPATIBILITY``.
+
+``PolicyEvaluation`` decides a verdict (``allow``, ``review`` or ``deny``)
+once per distinct license, then once per source, and then gives each file
+the worst verdict of the sources it cites. Results are rolled up per
+directory. When a mutation is applied, only the affected files are
+evaluated again: a changed source re-evaluates the files citing it, and a
+changed file re-evaluates that file.
+
+Usage:
+    python citation_policy.py [PROJECT] [--allow LICENSE...] [--deny LICENSE...]
+        [--project-license LICENSE] [--unknown {allow,review,deny}] [--json]
+"""
+import argparse
+import functools
+import json
+import posixpath
+import re
+import sys
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+try:
+    from .citation_index import CitationIndex
+except ImportError:
+    from citation_index import CitationIndex
+
+# Verdicts, from best to worst
+ALLOW = "allow"
+REVIEW = "review"
+DENY = "deny"
+STATUSES = (ALLOW, REVIEW, DENY)
+
+# License categories usable in allow and deny rules
+PERMISSIVE = "permissive"
+WEAK_COPYLEFT = "weak-copyleft"
+STRONG_COPYLEFT = "strong-copyleft"
+NETWORK_COPYLEFT = "network-copyleft"
+UNKNOWN = "unknown"
+CATEGORIES = (PERMISSIVE, WEAK_COPYLEFT, STRONG_COPYLEFT, NETWORK_COPYLEFT, UNKNOWN)
+
+# Known SPDX license ids and their category
+LICENSES: Dict[str, str] = {
+    "0BSD": PERMISSIVE,
+    "Apache-2.0": PERMISSIVE,
+    "BSD-2-Clause": PERMISSIVE,
+    "BSD-3-Clause": PERMISSIVE,
+    "BSL-1.0": PERMISSIVE,
+    "CC-BY-4.0": PERMISSIVE,
+    "CC0-1.0": PERMISSIVE,
+    "ISC": PERMISSIVE,
+    "MIT": PERMISSIVE,
+    "MIT-0": PERMISSIVE,
+    "Python-2.0": PERMISSIVE,
+    "Unlicense": PERMISSIVE,
+    "WTFPL": PERMISSIVE,
+    "Zlib": PERMISSIVE,
+    "EPL-2.0": WEAK_COPYLEFT,
+    "LGPL-2.1-only": WEAK_COPYLEFT,
+    "LGPL-2.1-or-later": WEAK_COPYLEFT,
+    "LGPL-3.0-only": WEAK_COPYLEFT,
+    "LGPL-3.0-or-later": WEAK_COPYLEFT,
+    "MPL-2.0": WEAK_COPYLEFT,
+    "CC-BY-SA-4.0": STRONG_COPYLEFT,
+    "GPL-2.0-only": STRONG_COPYLEFT,
+    "GPL-2.0-or-later": STRONG_COPYLEFT,
+    "GPL-3.0-only": STRONG_COPYLEFT,
+    "GPL-3.0-or-later": STRONG_COPYLEFT,
+    "AGPL-3.0-only": NETWORK_COPYLEFT,
+    "AGPL-3.0-or-later": NETWORK_COPYLEFT,
+}
+
+# Other common spellings of the known licenses. Spellings that only differ
+# in case, punctuation, "v" prefixes, ".0" suffixes, "+" for "or later" or
+# filler words such as "License" and "Version" need no entry.
+_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "0BSD": ("Zero-Clause BSD", "BSD Zero Clause"),
+    "Apache-2.0": ("Apache2", "ASL 2.0", "Apache Software License 2.0"),
+    "BSD-2-Clause": ("Simplified BSD", "FreeBSD", "BSD-2"),
+    "BSD-3-Clause": ("New BSD", "Modified BSD", "Revised BSD", "BSD-3"),
+    "BSL-1.0": ("Boost", "Boost Software License 1.0"),
+    "CC-BY-4.0": ("Creative Commons Attribution 4.0",),
+    "CC-BY-SA-4.0": ("Creative Commons Attribution-ShareAlike 4.0",),
+    "CC0-1.0": ("CC0",),
+    "MIT": ("Expat",),
+    "MIT-0": ("MIT No Attribution",),
+    "Python-2.0": ("PSF", "PSF-2.0", "Python Software Foundation License"),
+    "EPL-2.0": ("Eclipse Public License 2.0",),
+    "LGPL-2.1-only": ("LGPL-2.1", "Lesser General Public License v2.1"),
+    "LGPL-2.1-or-later": ("Lesser General Public License v2.1 or later",),
+    "LGPL-3.0-only": ("LGPL-3.0", "Lesser General Public License v3.0"),
+    "LGPL-3.0-or-later": ("Lesser General Public License v3.0 or later",),
+    "MPL-2.0": ("Mozilla Public License 2.0",),
+    "GPL-2.0-only": ("GPL-2.0", "General Public License v2.0"),
+    "GPL-2.0-or-later": ("General Public License v2.0 or later",),
+    "GPL-3.0-only": ("GPL-3.0", "General Public License v3.0"),
+    "GPL-3.0-or-later": ("General Public License v3.0 or later",),
+    "AGPL-3.0-only": ("AGPL-3.0", "Affero General Public License v3.0"),
+    "AGPL-3.0-or-later": ("Affero General Public License v3.0 or later",),
+}
+
+# Words dropped when comparing license names
+_FILLER_WORDS = frozenset(("the", "license", "licence", "version", "gnu"))
+
+# Project licenses that can include code under each copyleft license
+_GPL2 = frozenset(("GPL-2.0-only", "GPL-2.0-or-later"))
+_GPL3 = frozenset(("GPL-3.0-only", "GPL-3.0-or-later"))
+_AGPL3 = frozenset(("AGPL-3.0-only", "AGPL-3.0-or-later"))
+_COPYLEFT_TARGETS: Dict[str, FrozenSet[str]] = {
+    "GPL-2.0-only": _GPL2,
+    "GPL-2.0-or-later": _GPL2 | _GPL3 | _AGPL3,
+    "GPL-3.0-only": _GPL3 | _AGPL3,
+    "GPL-3.0-or-later": _GPL3 | _AGPL3,
+    "AGPL-3.0-only": _AGPL3,
+    "AGPL-3.0-or-later": _AGPL3,
+    "CC-BY-SA-4.0": frozenset(("CC-BY-SA-4.0",)) | _GPL3,
+}
+
+# Project licenses that cannot include code under an otherwise permissive
+# or weak copyleft license
+_INCOMPATIBLE_TARGETS: Dict[str, FrozenSet[str]] = {
+    "Apache-2.0": frozenset(("GPL-2.0-only",)),
+    "LGPL-3.0-only": frozenset(("GPL-2.0-only",)),
+    "LGPL-3.0-or-later": frozenset(("GPL-2.0-only",)),
+    "EPL-2.0": _GPL2 | _GPL3 | _AGPL3,
+}
+
+
+def _license_key(text: str) -> str:
+    """Spelling-insensitive lookup key for a license name."""
+    key = text.lower().replace("+", " or later ")
+    key = re.sub(r"v(?=\d)", " ", key)
+    key = re.sub(r"(\d)\.0(?![\d.])", r"\1", key)
+    return " ".join(word for word in re.findall(r"[a-z0-9.]+", key)
+                    if word not in _FILLER_WORDS)
+
+
+def _build_normalization_table() -> Dict[str, str]:
+    table = {}
+    for spdx_id in LICENSES:
+        table[_license_key(spdx_id)] = spdx_id
+    for spdx_id, aliases in _ALIASES.items():
+        for alias in aliases:
+            table[_license_key(alias)] = spdx_id
+    return table
+
+
+def _build_compatibility() -> Dict[str, FrozenSet[str]]:
+    compatibility = {}
+    for project_license in LICENSES:
+        compatible = set()
+        for license_id in LICENSES:
+            if license_id in _COPYLEFT_TARGETS:
+                ok = project_license in _COPYLEFT_TARGETS[license_id]
+            else:
+                ok = project_license not in _INCOMPATIBLE_TARGETS.get(license_id, ())
+            if ok:
+                compatible.add(license_id)
+        compatibility[project_license] = frozenset(compatible)
+    return compatibility
+
+
+# License key -> SPDX id
+NORMALIZATION_TABLE = _build_normalization_table()
+
+# Project license -> licenses of code it can include
+COMPATIBILITY = _build_compatibility()
+
+# A parsed SPDX expression: a license id (optionally "id WITH exception"),
+# or ("AND" | "OR", operands)
+LicenseExpression = Union[str, Tuple[str, Tuple["LicenseExpression", ...]]]
+
+_TOKEN_PATTERN = re.compile(r"(\(|\)|\s+AND\s+|\s+OR\s+)")
+
+
+def _normalize_id(text: str) -> str:
+    """Normalize a single license, keeping an SPDX ``WITH`` exception."""
+    base, sep, exception = text.partition(" WITH ")
+    spdx_id = NORMALIZATION_TABLE.get(_license_key(base))
+    if spdx_id is None:
+        slug = re.sub(r"[^A-Za-z0-9.]+", "-", base).strip("-")
+        spdx_id = f"LicenseRef-{slug}"
+    return f"{spdx_id} WITH {exception.strip()}" if sep else spdx_id
+
+
+def _parse_expression(tokens: List[str], pos: int, operator: str) -> Tuple[LicenseExpression, int]:
+    """Parse operands joined by ``operator`` (OR binds looser than AND)."""
+    operands = []
+    while True:
+        if operator == "OR":
+            operand, pos = _parse_expression(tokens, pos, "AND")
+        elif tokens[pos] == "(":
+            operand, pos = _parse_expression(tokens, pos + 1, "OR")
+            if tokens[pos] != ")":
+                raise ValueError("Unbalanced parentheses")
+            pos += 1
+        else:
+            if tokens[pos] in ("AND", "OR", ")"):
+                raise ValueError("Missing operand")
+            operand, pos = _normalize_id(tokens[pos]), pos + 1
+        operands.append(operand)
+        if pos < len(tokens) and tokens[pos] == operator:
+            pos += 1
+            continue
+        if operator == "AND" and pos < len(tokens) and tokens[pos] not in ("OR", ")"):
+            raise ValueError("Missing operator")
+        break
+    return (operands[0] if len(operands) == 1 else (operator, tuple(operands))), pos
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_license(license_type: Optional[str]) -> Optional[LicenseExpression]:
+    """
+    Parse a free-text license into a normalized SPDX expression.
+
+    Args:
+        license_type: License as recorded on a source
+
+    Returns:
+        A license id, an ("AND" | "OR", operands) tuple, or None if no
+        license was recorded
+    """
+    if license_type is None or not license_type.strip():
+        return None
+    tokens = [token.strip() for token in _TOKEN_PATTERN.split(license_type.strip())]
+    tokens = [token for token in tokens if token]
+    if len(tokens) > 1:
+        try:
+            expression, pos = _parse_expression(tokens, 0, "OR")
+            if pos == len(tokens):
+                return expression
+        except (IndexError, ValueError):
+            pass
+    # Not an SPDX expression, e.g. "BSD (3-clause)"
+    return _normalize_id(license_type.strip())
+
+
+def _render(expression: LicenseExpression, nested: bool = False) -> str:
+    if isinstance(expression, str):
+        return expression
+    operator, operands = expression
+    text = f" {operator} ".join(_render(operand, True) for operand in operands)
+    return f"({text})" if nested else text
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_license(license_type: Optional[str]) -> Optional[str]:
+    """
+    Normalize a free-text license to an SPDX id or expression.
+
+    Args:
+        license_type: License as recorded on a source (e.g. "Apache 2.0")
+
+    Returns:
+        SPDX id or expression (e.g. "Apache-2.0"), or None if no license
+        was recorded
+    """
+    expression = parse_license(license_type)
+    return None if expression is None else _render(expression)
+
+
+class LicensePolicy:
+    """Allow and deny rules for the licenses of cited sources."""
+
+    def __init__(self, allow: Iterable[str] = (), deny: Iterable[str] = (),
+                 project_license: Optional[str] = None, unknown: str = REVIEW):
+        """
+        Initialize the policy.
+
+        Rules are license names (normalized like ``license_type``) or
+        license categories (``CATEGORIES``). A license is denied if it
+        matches a deny rule, if there are allow rules and it matches none of
+        them, or if the project license cannot include it. Licenses that are
+        not known, and sources without a license, get the ``unknown`` verdict.
+
+        Args:
+            allow: Licenses or categories that may be cited (default: any)
+            deny: Licenses or categories that must not be cited
+            project_license: License of the project, to check compatibility
+            unknown: Verdict for unknown or missing licenses
+
+        Raises:
+            ValueError: If ``unknown`` is not a verdict or the project
+                license is not a known license
+        """
+        if unknown not in STATUSES:
+            raise ValueError(f"Unknown verdict '{unknown}', expected one of {', '.join(STATUSES)}")
+        self.allow = frozenset(self._rule(rule) for rule in allow)
+        self.deny = frozenset(self._rule(rule) for rule in deny)
+        self.unknown = unknown
+        self.project_license = normalize_license(project_license)
+        if project_license is not None and self.project_license not in COMPATIBILITY:
+            raise ValueError(f"Unknown project license '{project_license}'")
+        self._compatible = COMPATIBILITY.get(self.project_license)
+        self._verdicts: Dict[Optional[str], Tuple[str, str]] = {}
+
+    @staticmethod
+    def _rule(rule: str) -> str:
+        return rule if rule in CATEGORIES else normalize_license(rule)
+
+    def verdict(self, license_type: Optional[str]) -> Tuple[str, str]:
+        """
+        Decide whether code under a license may be cited.
+
+        Args:
+            license_type: License as recorded on a source
+
+        Returns:
+            (verdict, reason) tuple
+        """
+        cached = self._verdicts.get(license_type)
+        if cached is None:
+            expression = parse_license(license_type)
+            if expression is None:
+                cached = (self.unknown, "no license recorded")
+            else:
+                cached = self._expression_verdict(expression)
+            self._verdicts[license_type] = cached
+        return cached
+
+    def _expression_verdict(self, expression: LicenseExpression) -> Tuple[str, str]:
+        if isinstance(expression, str):
+            return self._license_verdict(expression)
+        operator, operands = expression
+        verdicts = [self._expression_verdict(operand) for operand in operands]
+        rank = lambda verdict: STATUSES.index(verdict[0])
+        # Any one license of an OR may be chosen; every license of an AND applies
+        return min(verdicts, key=rank) if operator == "OR" else max(verdicts, key=rank)
+
+    def _license_verdict(self, license_id: str) -> Tuple[str, str]:
+        base = license_id.partition(" WITH ")[0]
+        category = LICENSES.get(base, UNKNOWN)
+        if base in self.deny or category in self.deny:
+            return DENY, f"{license_id} is denied"
+        if self.allow and base not in self.allow and category not in self.allow:
+            return DENY, f"{license_id} is not allowed"
+        if category == UNKNOWN:
+            return self.unknown, f"{license_id} is not a known license"
+        if self._compatible is not None and base not in self._compatible:
+            return DENY, f"{license_id} is incompatible with {self.project_license}"
+        return ALLOW, license_id
+
+
+def _directories(file_path: str) -> List[str]:
+    """Directories containing a project-relative file, "." being the root."""
+    directories = []
+    directory = posixpath.dirname(file_path)
+    while directory:
+        directories.append(directory)
+        directory = posixpath.dirname(directory)
+    directories.append(".")
+    return directories
+
+
+class PolicyEvaluation:
+    """Verdicts of a ``LicensePolicy`` for every cited file, kept up to date."""
+
+    def __init__(self, citations: Dict, policy: LicensePolicy):
+        """
+        Evaluate every file of a citations structure.
+
+        Args:
+            citations: Citations structure as held by ``CitationTracker``
+            policy: Policy to apply
+        """
+        self.policy = policy
+        # Number of file verdicts computed, for checking incremental updates
+        self.files_evaluated = 0
+        self.rebuild(citations)
+
+    def rebuild(self, citations: Dict) -> None:
+        """
+        Evaluate every file again, e.g. after the citations were replaced.
+
+        Args:
+            citations: Citations structure as held by ``CitationTracker``
+        """
+        self._index = CitationIndex(citations)
+        unknown_rank = STATUSES.index(self.policy.unknown)
+        # One verdict per distinct license, then per source, then per file
+        license_ranks = {license_type: STATUSES.index(self.policy.verdict(license_type)[0])
+                         for license_type in set(self._index.source_license.values())}
+        self._source_ranks = {source_id: license_ranks[license_type]
+                              for source_id, license_type in self._index.source_license.items()}
+        source_rank = self._source_ranks.get
+        self._file_ranks: Dict[str, int] = {
+            file_path: max(source_rank(source_id, unknown_rank) for source_id in source_ids)
+            for file_path, source_ids in self._index.file_sources.items() if source_ids}
+        self.files_evaluated += len(self._file_ranks)
+
+        self._directory_counts: Dict[str, List[int]] = {}
+        for file_path, rank in self._file_ranks.items():
+            for directory in _directories(file_path):
+                counts = self._directory_counts.get(directory)
+                if counts is None:
+                    counts = self._directory_counts[directory] = [0] * len(STATUSES)
+                counts[rank] += 1
+
+    def apply(self, op: Dict) -> None:
+        """
+        Update the verdicts for a mutation record.
+
+        Args:
+            op: Mutation record as passed to ``citation_store.apply_op``
+        """
+        self._index.apply(op)
+        if op["op"] == "add_source":
+            source_id = op["source_id"]
+            rank = STATUSES.index(self.policy.verdict(op["source"].get("license_type"))[0])
+            if self._source_ranks.get(source_id) == rank:
+                return
+            self._source_ranks[source_id] = rank
+            for file_path in self._index.by_source.get(source_id, ()):
+                self._evaluate_file(file_path)
+        else:
+            self._evaluate_file(op["file"])
+
+    def _evaluate_file(self, file_path: str) -> None:
+        self.files_evaluated += 1
+        source_ids = self._index.file_sources.get(file_path)
+        new_rank = None
+        if source_ids:
+            unknown_rank = STATUSES.index(self.policy.unknown)
+            new_rank = max(self._source_ranks.get(source_id, unknown_rank)
+                           for source_id in source_ids)
+        old_rank = self._file_ranks.get(file_path)
+        if new_rank == old_rank:
+            return
+        if new_rank is None:
+            del self._file_ranks[file_path]
+        else:
+            self._file_ranks[file_path] = new_rank
+
+        for directory in _directories(file_path):
+            counts = self._directory_counts.get(directory)
+            if counts is None:
+                counts = self._directory_counts[directory] = [0] * len(STATUSES)
+            if old_rank is not None:
+                counts[old_rank] -= 1
+            if new_rank is not None:
+                counts[new_rank] += 1
+            if not any(counts):
+                del self._directory_counts[directory]
+
+    @property
+    def status(self) -> str:
+        """Worst verdict over all files (``allow`` if nothing is cited)."""
+        return STATUSES[max(self._file_ranks.values(), default=0)]
+
+    @property
+    def passed(self) -> bool:
+        """Whether no file is denied."""
+        return self.status != DENY
+
+    def file_status(self, file_path: str) -> Optional[str]:
+        """
+        Verdict of a file.
+
+        Args:
+            file_path: Project-relative file path
+
+        Returns:
+            Worst verdict of the sources the file cites, or None if it
+            cites nothing
+        """
+        rank = self._file_ranks.get(file_path)
+        return None if rank is None else STATUSES[rank]
+
+    def file_statuses(self) -> Dict[str, str]:
+        """
+        Verdicts of every cited file.
+
+        Returns:
+            Mapping of file path to verdict
+        """
+        return {file_path: STATUSES[rank] for file_path, rank in self._file_ranks.items()}
+
+    def explain(self, file_path: str) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        Per-source verdicts behind a file's verdict.
+
+        Args:
+            file_path: Project-relative file path
+
+        Returns:
+            Mapping of source_id to its ``license`` (normalized), ``status``
+            and ``reason``
+        """
+        explanation = {}
+        for source_id in sorted(self._index.file_sources.get(file_path, ())):
+            license_type = self._index.source_license.get(source_id)
+            status, reason = self.policy.verdict(license_type)
+            if source_id not in self._index.source_license:
+                status, reason = self.policy.unknown, "source is not registered"
+            explanation[source_id] = {"license": normalize_license(license_type),
+                                      "status": status, "reason": reason}
+        return explanation
+
+    def directories(self) -> Dict[str, Dict[str, Union[int, str]]]:
+        """
+        Verdicts rolled up per directory, including every ancestor.
+
+        Returns:
+            Mapping of directory ("." for the project root) to the number of
+            files with each verdict and the worst verdict as ``status``
+        """
+        rollup = {}
+        for directory, counts in sorted(self._directory_counts.items()):
+            entry: Dict[str, Union[int, str]] = dict(zip(STATUSES, counts))
+            entry["status"] = STATUSES[max(rank for rank, count in enumerate(counts) if count)]
+            rollup[directory] = entry
+        return rollup
+
+    def violations(self, status: str = DENY) -> Dict[str, List[str]]:
+        """
+        Files with a verdict at least as bad as ``status``, with the reasons.
+
+        Args:
+            status: Least severe verdict to report
+
+        Returns:
+            Mapping of file path to the reasons of its offending sources
+        """
+        threshold = STATUSES.index(status)
+        return {file_path: [f"{source_id}: {verdict['reason']}"
+                            for source_id, verdict in self.explain(file_path).items()
+                            if STATUSES.index(verdict["status"]) >= threshold]
+                for file_path, rank in sorted(self._file_ranks.items()) if rank >= threshold}
+
+    def report(self) -> Dict:
+        """
+        JSON-serializable summary of the evaluation.
+
+        Returns:
+            Dict with the overall ``status``, ``files``, ``directories`` and
+            the reasons of files needing review or denied as ``violations``
+        """
+        return {
+            "status": self.status,
+            "files": dict(sorted(self.file_statuses().items())),
+            "directories": self.directories(),
+            "violations": self.violations(REVIEW),
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Check the licenses of cited sources against a policy.")
+    parser.add_argument("project", nargs="?", default=".", help="Project root")
+    parser.add_argument("--allow", nargs="+", default=[], metavar="LICENSE",
+                        help="Licenses or categories that may be cited (default: any)")
+    parser.add_argument("--deny", nargs="+", default=[], metavar="LICENSE",
+                        help="Licenses or categories that must not be cited")
+    parser.add_argument("--project-license", help="License of the project, to check compatibility")
+    parser.add_argument("--unknown", choices=STATUSES, default=REVIEW,
+                        help=f"Verdict for unknown or missing licenses (default: {REVIEW})")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        from .citation_tracker import CitationTracker
+    except ImportError:
+        from citation_tracker import CitationTracker
+
+    try:
+        policy = LicensePolicy(args.allow, args.deny, args.project_license, args.unknown)
+    except ValueError as error:
+        parser.error(str(error))
+    evaluation = CitationTracker(args.project).evaluate_license_policy(policy)
+    if args.json:
+        print(json.dumps(evaluation.report(), indent=2))
+    else:
+        for file_path, reasons in evaluation.violations(REVIEW).items():
+            print(f"{file_path}: {evaluation.file_status(file_path)}")
+            for reason in reasons:
+                print(f"  {reason}")
+        print(f"License policy: {evaluation.status}")
+    return 0 if evaluation.passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
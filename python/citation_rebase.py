@@ -0,0 +1,282 @@
+"""
+Keep recorded citation line ranges in step with file edits.
+
+Citations store ``line_start``/``line_end`` against the version of the file
+that existed when they were recorded. This module parses unified diffs and
+maps those ranges onto the new version of each changed file: ranges are
+shifted past inserted and deleted lines, shrunk when cited lines are removed,
+and dropped when none of their lines survive. Work is proportional to the
+size of the diff, not the number of files in the project.
+"""
+import bisect
+import re
+from typing import Dict, List, Optional, Tuple
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Path used by unified diffs for the missing side of an added or deleted file
+DEV_NULL = "/dev/null"
+
+
+class FileDiff:
+    """The hunks of a unified diff that apply to one file."""
+
+    def __init__(self, old_path: Optional[str], new_path: Optional[str]):
+        """
+        Initialize the file diff.
+
+        Args:
+            old_path: Path before the change (None for added files)
+            new_path: Path after the change (None for deleted files)
+        """
+        self.old_path = old_path
+        self.new_path = new_path
+        # (old_start, old_count, new_start, new_count, body lines)
+        self.hunks: List[Tuple[int, int, int, int, List[str]]] = []
+
+
+def _unquote_path(path: str) -> str:
+    """
+    Undo git's quoting of unusual file names.
+
+    Quoted names escape non-ASCII characters as the octal values of their
+    UTF-8 bytes, so the escapes are decoded to bytes before decoding UTF-8.
+    """
+    if len(path) < 2 or not (path.startswith('"') and path.endswith('"')):
+        return path
+    raw = path[1:-1].encode("utf-8").decode("unicode_escape")
+    return raw.encode("latin-1").decode("utf-8")
+
+
+def _strip_diff_path(path: str, strip: int) -> Optional[str]:
+    """Turn a ``---``/``+++`` header path into a repository-relative path."""
+    path = _unquote_path(path.split("\t", 1)[0].strip())
+    if path == DEV_NULL:
+        return None
+    parts = path.split("/")
+    return "/".join(parts[strip:]) if len(parts) > strip else path
+
+
+def parse_unified_diff(diff_text: str, strip: int = 1) -> List[FileDiff]:
+    """
+    Parse a unified diff, such as the output of ``git diff``.
+
+    Args:
+        diff_text: Diff text
+        strip: Number of leading path components to remove from file names,
+            as with ``patch -p`` (1 removes git's ``a/`` and ``b/`` prefixes)
+
+    Returns:
+        One FileDiff per file in the diff
+    """
+    files: List[FileDiff] = []
+    current: Optional[FileDiff] = None
+    rename_from: Optional[str] = None
+    lines = diff_text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("diff --git "):
+            current = None
+            rename_from = None
+        elif line.startswith("rename from "):
+            rename_from = _unquote_path(line[len("rename from "):])
+        elif line.startswith("rename to ") and rename_from is not None:
+            # Pure renames have no ---/+++ headers
+            current = FileDiff(rename_from, _unquote_path(line[len("rename to "):]))
+            files.append(current)
+        elif line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            old_path = _strip_diff_path(line[4:], strip)
+            new_path = _strip_diff_path(lines[i + 1][4:], strip)
+            if current is None or (current.old_path, current.new_path) != (old_path, new_path):
+                current = FileDiff(old_path, new_path)
+                files.append(current)
+            i += 1
+        elif current is not None:
+            match = _HUNK_HEADER.match(line)
+            if match:
+                old_start = int(match.group(1))
+                old_count = int(match.group(2) if match.group(2) is not None else 1)
+                new_start = int(match.group(3))
+                new_count = int(match.group(4) if match.group(4) is not None else 1)
+                body: List[str] = []
+                remaining_old, remaining_new = old_count, new_count
+                while (remaining_old or remaining_new) and i + 1 < len(lines):
+                    i += 1
+                    body_line = lines[i]
+                    if body_line.startswith("\\"):
+                        continue
+                    tag = body_line[:1] or " "
+                    if tag in (" ", "-"):
+                        remaining_old -= 1
+                    if tag in (" ", "+"):
+                        remaining_new -= 1
+                    body.append(tag)
+                current.hunks.append((old_start, old_count, new_start, new_count, body))
+        i += 1
+    return files
+
+
+class LineMapper:
+    """Maps line numbers of the old version of a file to the new version."""
+
+    def __init__(self, hunks: List[Tuple[int, int, int, int, List[str]]]):
+        """
+        Build the mapper.
+
+        Args:
+            hunks: Hunks of a single FileDiff
+        """
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._deltas: List[int] = []
+        self._mappings: List[List[Optional[int]]] = []
+        delta = 0
+        for old_start, old_count, new_start, new_count, body in sorted(hunks):
+            mapping: List[Optional[int]] = []
+            new_line = new_start
+            for tag in body:
+                if tag == " ":
+                    mapping.append(new_line)
+                    new_line += 1
+                elif tag == "-":
+                    mapping.append(None)
+                else:
+                    new_line += 1
+            if old_count == 0:
+                # Pure insertion after line old_start
+                self._starts.append(old_start + 1)
+                self._ends.append(old_start)
+            else:
+                self._starts.append(old_start)
+                self._ends.append(old_start + old_count - 1)
+            delta += new_count - old_count
+            self._deltas.append(delta)
+            self._mappings.append(mapping)
+
+    def map_line(self, line: int) -> Optional[int]:
+        """
+        Map an old line number to its new line number.
+
+        Args:
+            line: Line number in the old version of the file
+
+        Returns:
+            Line number in the new version, or None if the line was removed
+        """
+        hunk = bisect.bisect_left(self._ends, line)
+        if hunk < len(self._ends) and self._starts[hunk] <= line:
+            mapping = self._mappings[hunk]
+            offset = line - self._starts[hunk]
+            return mapping[offset] if offset < len(mapping) else None
+        return line + (self._deltas[hunk - 1] if hunk else 0)
+
+    def map_line_or_next(self, line: int) -> Optional[int]:
+        """
+        Map an old line number, or the first line after it that survives.
+
+        Lines past the last hunk are only known to exist if the diff says
+        so, so a line removed up to the end of the last hunk (such as the
+        tail of the file) has no successor.
+
+        Args:
+            line: Line number in the old version of the file
+
+        Returns:
+            Line number in the new version, or None if no line survives
+        """
+        last = self._ends[-1] if self._ends else line
+        while True:
+            new_line = self.map_line(line)
+            if new_line is not None or line >= last:
+                return new_line
+            line += 1
+
+    def map_range(self, start: int, end: int) -> Optional[Tuple[int, int]]:
+        """
+        Map a closed range of old lines to the new version.
+
+        Args:
+            start: First line of the range
+            end: Last line of the range
+
+        Returns:
+            The (start, end) range covering the surviving lines, or None if
+            every line of the range was removed
+        """
+        new_start = None
+        line = start
+        while line <= end:
+            new_start = self.map_line(line)
+            if new_start is not None:
+                break
+            line += 1
+        if new_start is None:
+            return None
+
+        new_end = None
+        line = end
+        while line >= start:
+            new_end = self.map_line(line)
+            if new_end is not None:
+                break
+            line -= 1
+        return new_start, new_end
+
+
+def rebase_file_citations(citations: List[Dict], mapper: LineMapper,
+                          stats: Dict[str, int],
+                          recorded_before: Optional[str] = None) -> List[Dict]:
+    """
+    Map the line ranges of one file's citations through a diff.
+
+    Citations without line numbers are kept unchanged. An open-ended
+    citation (without ``line_end``) whose first line was removed moves to
+    the next line that survives, and is dropped if there is none.
+
+    Args:
+        citations: Citation records of the file
+        mapper: Line mapper for the file's diff
+        stats: Counters ("shifted", "shrunk", "dropped") to update
+        recorded_before: Optional ISO timestamp; citations recorded at or
+            after it already refer to the new version and are kept unchanged
+
+    Returns:
+        The rebased citation records
+    """
+    rebased: List[Dict] = []
+    for citation in citations:
+        start = citation.get("line_start")
+        end = citation.get("line_end")
+        if start is None or (recorded_before is not None
+                             and citation.get("cited_at", "") >= recorded_before):
+            rebased.append(citation)
+            continue
+
+        if end is None:
+            new_start = mapper.map_line_or_next(start)
+            if new_start is None:
+                stats["dropped"] += 1
+                continue
+            new_range = (new_start, None)
+        else:
+            new_range = mapper.map_range(start, end)
+            if new_range is None:
+                stats["dropped"] += 1
+                continue
+
+        if new_range == (start, end):
+            rebased.append(citation)
+            continue
+        updated = dict(citation)
+        updated["line_start"] = new_range[0]
+        if end is not None:
+            updated["line_end"] = new_range[1]
+            if new_range[1] - new_range[0] < end - start:
+                stats["shrunk"] += 1
+            else:
+                stats["shifted"] += 1
+        else:
+            stats["shifted"] += 1
+        rebased.append(updated)
+    return rebased
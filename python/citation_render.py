@@ -0,0 +1,146 @@
+"""
+Markdown fragments for the citations document.
+
+``CitationTracker`` renders CITATIONS.md as a sequence of fragments, one per
+source and one per cited file. ``FragmentCache`` keeps the fragments of
+entries that have not changed since they were rendered, so repeated exports
+from a long-lived tracker only re-render what changed.
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+def render_source_fragment(source: Dict) -> str:
+    """
+    Render the "Sources" section entry for one source.
+
+    Args:
+        source: Source record
+
+    Returns:
+        Markdown lines joined with newlines
+    """
+    lines = [f"### {source['name']}"]
+    if source.get("author"):
+        lines.append(f"**Author:** {source['author']}")
+    if source.get("url"):
+        lines.append(f"**URL:** [{source['url']}]({source['url']})")
+    if source.get("license_type"):
+        lines.append(f"**License:** {source['license_type']}")
+    if source.get("description"):
+        lines.append(f"\n{source['description']}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def render_file_fragment(file_path: str, citations: List[Dict], names: Dict[str, str]) -> str:
+    """
+    Render the "Usage by File" section entry for one file.
+
+    Args:
+        file_path: Project-relative file path
+        citations: Citation records of the file
+        names: Source name table keyed by source ID
+
+    Returns:
+        Markdown lines joined with newlines
+    """
+    lines = [f"### {file_path}"]
+    for citation in citations:
+        source_names = [names[source_id] if source_id in names else f"Unknown ({source_id})"
+                        for source_id in citation["source_ids"]]
+
+        locations = ""
+        if "line_start" in citation and "line_end" in citation:
+            locations = f" (lines {citation['line_start']}-{citation['line_end']})"
+        elif "line_start" in citation:
+            locations = f" (from line {citation['line_start']})"
+
+        lines.append(f"- Uses: {', '.join(source_names)}{locations}")
+        if citation.get("comment"):
+            lines.append(f"  - Note: {citation['comment']}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+class FragmentCache:
+    """
+    Rendered fragments of the sources and files that have not changed since.
+
+    The tracker reports every change as it applies it, so a lookup costs one
+    dict access instead of hashing the entry's data. The cache lives in
+    memory only: another process may change the citations at any time.
+
+    ``generation`` changes whenever cached fragments may no longer match
+    entries that were not changed themselves (source names, which appear in
+    file fragments, or citations replaced wholesale); callers pass the
+    generation they started with so an export that began before such a
+    change neither uses nor stores fragments.
+    """
+
+    def __init__(self):
+        """Initialize an empty cache."""
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._fragments: Dict[str, Dict[str, str]] = {"sources": {}, "files": {}}
+        # Bumped by every change, so a fragment rendered meanwhile is not stored
+        self._changes = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, kind: str, key: str, generation: int) -> Tuple[Optional[str], int]:
+        """
+        Find the fragment of an entry.
+
+        Args:
+            kind: "sources" or "files"
+            key: Source ID or file path
+            generation: ``generation`` when the caller started
+
+        Returns:
+            (fragment, token): the fragment, or None if it has to be
+            rendered, and the token to pass to ``store`` with it
+        """
+        with self._lock:
+            fragment = self._fragments[kind].get(key) if generation == self.generation else None
+            if fragment is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return fragment, self._changes
+
+    def store(self, kind: str, key: str, fragment: str, generation: int, token: int) -> None:
+        """
+        Keep a rendered fragment unless anything changed since ``lookup``.
+
+        Args:
+            kind: "sources" or "files"
+            key: Source ID or file path
+            fragment: Rendered fragment
+            generation: ``generation`` when the caller started
+            token: Token returned by ``lookup``
+        """
+        with self._lock:
+            if generation == self.generation and token == self._changes:
+                self._fragments[kind][key] = fragment
+
+    def invalidate(self, kind: str, key: str) -> None:
+        """Drop the fragment of a changed source or file."""
+        with self._lock:
+            self._fragments[kind].pop(key, None)
+            self._changes += 1
+
+    def invalidate_files(self) -> None:
+        """Drop every file fragment, after a source name changed."""
+        with self._lock:
+            self._fragments["files"].clear()
+            self._changes += 1
+            self.generation += 1
+
+    def clear(self) -> None:
+        """Drop every fragment, after the citations were replaced."""
+        with self._lock:
+            for fragments in self._fragments.values():
+                fragments.clear()
+            self._changes += 1
+            self.generation += 1
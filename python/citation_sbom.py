@@ -0,0 +1,628 @@
+"""
+SBOM export of citations as SPDX 2.3 (tag-value and JSON) and CycloneDX 1.5 JSON.
+
+Sources become SPDX packages or CycloneDX library components, with their
+``license_type`` normalized to SPDX (see ``citation_policy``). Cited files
+become SPDX files or CycloneDX file components, with checksums when the
+file exists. In SPDX, citations with line ranges become snippets with line
+and byte ranges, and each snippet or file is ``GENERATED_FROM`` the packages
+of its sources. CycloneDX records the citations as file properties and the
+sources as dependencies.
+
+Documents are written to a file object as they are produced, one file at a
+time. Parts that a format needs later in the document (SPDX JSON snippets
+and relationships, CycloneDX dependencies) are spooled to a temporary file.
+Memory therefore does not grow with the size of the database.
+
+With ``since``, only what changed after that timestamp is exported. That
+covers sources added or updated after it (``added_at``) and citations
+recorded after it (``cited_at``). The sources those citations refer to are
+included so the document is self-contained. Records without a timestamp
+only appear in full exports.
+
+Usage:
+    python citation_sbom.py [PROJECT] [--format {spdx,spdx-json,cyclonedx-json}]
+        [--since TIMESTAMP] [-o OUTPUT]
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import IO, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+try:
+    from .citation_policy import LICENSES, normalize_license
+except ImportError:
+    from citation_policy import LICENSES, normalize_license
+
+SBOM_FORMATS = ("spdx", "spdx-json", "cyclonedx-json")
+SPDX_VERSION = "SPDX-2.3"
+CYCLONEDX_SPEC_VERSION = "1.5"
+TOOL_NAME = "citation-tracker"
+TOOL_VERSION = "0.1.0"
+
+# Parts kept in memory before a spool moves to disk
+_SPOOL_MAX_SIZE = 1024 * 1024
+
+_NOASSERTION = "NOASSERTION"
+
+Timestamp = Union[str, datetime, None]
+
+
+def _parse_timestamp(value: Timestamp) -> Optional[datetime]:
+    """Naive local datetime for a recorded or requested timestamp."""
+    if value is None or isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if parsed is not None and parsed.tzinfo is not None:
+        # Recorded timestamps are naive local time
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def _is_newer(recorded: Optional[str], since: Optional[datetime]) -> bool:
+    if since is None:
+        return True
+    parsed = _parse_timestamp(recorded)
+    return parsed is not None and parsed > since
+
+
+def _select_files(citations: Dict, since: Optional[datetime]) -> Iterator[Tuple[str, List[Dict]]]:
+    """Files with the citations to export, in recorded order."""
+    for file_path, records in citations["file_citations"].items():
+        if since is not None:
+            records = [record for record in records if _is_newer(record.get("cited_at"), since)]
+        if records:
+            yield file_path, records
+
+
+def _select_sources(citations: Dict, since: Optional[datetime],
+                    referenced: Set[str]) -> Iterator[Tuple[str, Dict]]:
+    """Sources to export: all, or those changed since ``since`` or ``referenced``."""
+    for source_id, source in citations["sources"].items():
+        if source_id in referenced or _is_newer(source.get("added_at"), since):
+            yield source_id, source
+
+
+@functools.lru_cache(maxsize=4096)
+def _element_id(prefix: str, key: str) -> str:
+    """SPDX element id; keys with other characters get a hash to stay unique."""
+    safe = re.sub(r"[^A-Za-z0-9.]+", "-", key).strip("-")
+    if safe != key:
+        safe = f"{safe}-{zlib.crc32(key.encode('utf-8')):08x}"
+    return f"SPDXRef-{prefix}-{safe}"
+
+
+class _FileInfo:
+    """Checksums, line count and line byte offsets of a cited file on disk."""
+
+    def __init__(self, path: Optional[str], lines: Set[int]):
+        self.checksums: Dict[str, str] = {}
+        self.line_count: Optional[int] = None
+        # line number -> (first byte, last byte), both 1-based
+        self.byte_ranges: Dict[int, Tuple[int, int]] = {}
+        if path is None:
+            return
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        self.checksums = {"SHA1": hashlib.sha1(data).hexdigest(),
+                          "SHA256": hashlib.sha256(data).hexdigest()}
+        offset = 0
+        number = 0
+        for number, line in enumerate(data.splitlines(keepends=True), 1):
+            if number in lines:
+                self.byte_ranges[number] = (offset + 1, offset + len(line))
+            offset += len(line)
+        self.line_count = number
+
+
+def _file_info(project_path: Optional[str], file_path: str, records: List[Dict]) -> _FileInfo:
+    lines: Set[int] = set()
+    for record in records:
+        if record.get("line_start") is not None or record.get("line_end") is not None:
+            lines.add(record.get("line_start") or 1)
+            if record.get("line_end") is not None:
+                lines.add(record["line_end"])
+    path = None if project_path is None else os.path.join(project_path, file_path)
+    return _FileInfo(path, lines)
+
+
+def _line_range(record: Dict, info: _FileInfo) -> Optional[Tuple[int, int]]:
+    """Cited line range, or None for a citation of the whole file."""
+    start, end = record.get("line_start"), record.get("line_end")
+    if start is None and end is None:
+        return None
+    if end is None:
+        # Runs to the end of the file, which is only known if it was read
+        end = info.line_count
+        if end is None:
+            return None
+    return (start or 1), end
+
+
+def _citation_text(record: Dict) -> str:
+    text = ", ".join(record["source_ids"])
+    if record.get("line_start") is not None or record.get("line_end") is not None:
+        text += f": lines {record.get('line_start') or 1}-{record.get('line_end') or 'end'}"
+    if record.get("comment"):
+        text += f" ({record['comment']})"
+    return text
+
+
+def _spool() -> IO[str]:
+    return tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE, mode='w+', encoding='utf-8')
+
+
+class _JsonWriter:
+    """Writes one JSON object whose array members are streamed item by item."""
+
+    def __init__(self, fp: IO[str]):
+        self._fp = fp
+        self._fields = 0
+        self._items = 0
+        fp.write("{")
+
+    def field(self, key: str, value) -> None:
+        self._key(key)
+        self._fp.write(json.dumps(value))
+
+    def begin_array(self, key: str) -> None:
+        self._key(key)
+        self._fp.write("[")
+        self._items = 0
+
+    def item(self, value) -> None:
+        self.raw_item(json.dumps(value))
+
+    def raw_item(self, encoded: str) -> None:
+        self._fp.write(",\n    " if self._items else "\n    ")
+        self._fp.write(encoded)
+        self._items += 1
+
+    def copy_items(self, spool: IO[str]) -> None:
+        """Add the items of a spool holding one encoded item per line."""
+        spool.seek(0)
+        for line in spool:
+            self.raw_item(line.rstrip("\n"))
+
+    def end_array(self) -> None:
+        self._fp.write("\n  ]" if self._items else "]")
+
+    def close(self) -> None:
+        self._fp.write("\n}\n")
+
+    def _key(self, key: str) -> None:
+        self._fp.write(",\n  " if self._fields else "\n  ")
+        self._fp.write(json.dumps(key) + ": ")
+        self._fields += 1
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _document_name(citations: Dict, since: Optional[datetime]) -> str:
+    name = citations.get("project_info", {}).get("name") or "project"
+    name = f"{name}-citations"
+    if since is not None:
+        name += f"-since-{since.strftime('%Y%m%dT%H%M%S')}"
+    return name
+
+
+class _LicenseRefs:
+    """``LicenseRef-`` ids used in the document, with the text they came from."""
+
+    def __init__(self):
+        self.texts: Dict[str, str] = {}
+
+    def declared(self, license_type: Optional[str]) -> str:
+        normalized = normalize_license(license_type)
+        if normalized is None:
+            return _NOASSERTION
+        for license_ref in re.findall(r"LicenseRef-[A-Za-z0-9.-]+", normalized):
+            self.texts.setdefault(license_ref, license_type)
+        return normalized
+
+
+def _spdx_package(source_id: str, source: Dict, licenses: _LicenseRefs) -> Dict:
+    package = {
+        "SPDXID": _element_id("Source", source_id),
+        "name": source.get("name") or source_id,
+        "downloadLocation": source.get("url") or _NOASSERTION,
+        "filesAnalyzed": False,
+        "licenseConcluded": _NOASSERTION,
+        "licenseDeclared": licenses.declared(source.get("license_type")),
+        "copyrightText": _NOASSERTION,
+        "primaryPackagePurpose": "SOURCE",
+    }
+    if source.get("url"):
+        package["homepage"] = source["url"]
+    if source.get("author"):
+        package["originator"] = f"Person: {source['author']}"
+    if source.get("description"):
+        package["description"] = source["description"]
+    package["comment"] = f"Citation source '{source_id}'"
+    if source.get("added_at"):
+        package["comment"] += f", added {source['added_at']}"
+    return package
+
+
+def _spdx_elements(project_path: Optional[str], file_path: str, records: List[Dict],
+                   sources: Dict) -> Tuple[Dict, List[Dict], List[Tuple[str, str, str]], Set[str]]:
+    """
+    SPDX file, snippets and relationships for the exported citations of a file.
+
+    Returns:
+        (file, snippets, relationships, ids of the registered sources cited)
+    """
+    info = _file_info(project_path, file_path, records)
+    file_id = _element_id("File", file_path)
+    spdx_file: Dict = {
+        "SPDXID": file_id,
+        "fileName": f"./{file_path}",
+        "checksums": [{"algorithm": algorithm, "checksumValue": value}
+                      for algorithm, value in info.checksums.items()],
+        "licenseConcluded": _NOASSERTION,
+        "copyrightText": _NOASSERTION,
+    }
+    if not info.checksums:
+        spdx_file["comment"] = "The file was not found when the document was created"
+
+    snippets: List[Dict] = []
+    relationships = [("SPDXRef-DOCUMENT", "DESCRIBES", file_id)]
+    related: Set[Tuple[str, str]] = set()
+    cited: Set[str] = set()
+    snippet_prefix = _element_id("Snippet", file_path)
+    for number, record in enumerate(records, 1):
+        line_range = _line_range(record, info)
+        element_id = file_id
+        if line_range is not None:
+            element_id = f"{snippet_prefix}-{number}"
+            start, end = line_range
+            ranges = [{"startPointer": {"reference": file_id, "lineNumber": start},
+                       "endPointer": {"reference": file_id, "lineNumber": end}}]
+            if start in info.byte_ranges and end in info.byte_ranges:
+                ranges.insert(0, {"startPointer": {"reference": file_id,
+                                                   "offset": info.byte_ranges[start][0]},
+                                  "endPointer": {"reference": file_id,
+                                                 "offset": info.byte_ranges[end][1]}})
+            snippet = {
+                "SPDXID": element_id,
+                "snippetFromFile": file_id,
+                "ranges": ranges,
+                "licenseConcluded": _NOASSERTION,
+                "copyrightText": _NOASSERTION,
+                "comment": _citation_text(record),
+            }
+            snippets.append(snippet)
+        for source_id in record["source_ids"]:
+            if source_id in sources and (element_id, source_id) not in related:
+                related.add((element_id, source_id))
+                cited.add(source_id)
+                relationships.append((element_id, "GENERATED_FROM", _element_id("Source", source_id)))
+    return spdx_file, snippets, relationships, cited
+
+
+def _spdx_document_fields(citations: Dict, since: Optional[datetime]) -> Dict:
+    name = _document_name(citations, since)
+    fields = {
+        "spdxVersion": SPDX_VERSION,
+        "dataLicense": "CC0-1.0",
+        "SPDXID": "SPDXRef-DOCUMENT",
+        "name": name,
+        "documentNamespace": f"https://spdx.org/spdxdocs/{name}-{uuid.uuid4()}",
+        "creationInfo": {"created": _utc_now(), "creators": [f"Tool: {TOOL_NAME}-{TOOL_VERSION}"]},
+    }
+    if since is not None:
+        fields["comment"] = f"Citations recorded after {since.isoformat()}"
+    return fields
+
+
+def write_spdx_json(citations: Dict, fp: IO[str], project_path: Optional[str] = None,
+                    since: Timestamp = None) -> None:
+    """
+    Write citations as an SPDX 2.3 JSON document.
+
+    Args:
+        citations: Citations structure as held by ``CitationTracker``
+        fp: Text file object to write to
+        project_path: Project root, to read the cited files for checksums
+            and byte ranges (skipped if None)
+        since: Only export what changed after this timestamp
+    """
+    since = _parse_timestamp(since)
+    sources = citations["sources"]
+    writer = _JsonWriter(fp)
+    for key, value in _spdx_document_fields(citations, since).items():
+        writer.field(key, value)
+
+    referenced: Set[str] = set()
+    with _spool() as snippets, _spool() as relationships:
+        writer.begin_array("files")
+        for file_path, records in _select_files(citations, since):
+            spdx_file, file_snippets, file_relationships, cited = _spdx_elements(
+                project_path, file_path, records, sources)
+            writer.item(spdx_file)
+            for snippet in file_snippets:
+                snippets.write(json.dumps(snippet) + "\n")
+            for element_id, relationship_type, related_id in file_relationships:
+                relationships.write(json.dumps({"spdxElementId": element_id,
+                                                "relationshipType": relationship_type,
+                                                "relatedSpdxElement": related_id}) + "\n")
+            referenced |= cited
+        writer.end_array()
+        writer.begin_array("snippets")
+        writer.copy_items(snippets)
+        writer.end_array()
+
+        licenses = _LicenseRefs()
+        writer.begin_array("packages")
+        for source_id, source in _select_sources(citations, since, referenced):
+            writer.item(_spdx_package(source_id, source, licenses))
+        writer.end_array()
+        writer.begin_array("relationships")
+        writer.copy_items(relationships)
+        writer.end_array()
+
+    writer.begin_array("hasExtractedLicensingInfos")
+    for license_ref, text in sorted(licenses.texts.items()):
+        writer.item({"licenseId": license_ref, "name": text, "extractedText": text})
+    writer.end_array()
+    writer.close()
+
+
+def _tag_text(value: str) -> str:
+    return f"<text>{value}</text>" if "\n" in value or "<" in value else value
+
+
+def write_spdx_tag_value(citations: Dict, fp: IO[str], project_path: Optional[str] = None,
+                         since: Timestamp = None) -> None:
+    """
+    Write citations as an SPDX 2.3 tag-value document.
+
+    Files and snippets come first, as tag-value treats files that follow a
+    package as part of it.
+
+    Args:
+        citations: Citations structure as held by ``CitationTracker``
+        fp: Text file object to write to
+        project_path: Project root, to read the cited files for checksums
+            and byte ranges (skipped if None)
+        since: Only export what changed after this timestamp
+    """
+    since = _parse_timestamp(since)
+    sources = citations["sources"]
+    fields = _spdx_document_fields(citations, since)
+    fp.write(f"SPDXVersion: {fields['spdxVersion']}\n"
+             f"DataLicense: {fields['dataLicense']}\n"
+             f"SPDXID: {fields['SPDXID']}\n"
+             f"DocumentName: {fields['name']}\n"
+             f"DocumentNamespace: {fields['documentNamespace']}\n")
+    for creator in fields["creationInfo"]["creators"]:
+        fp.write(f"Creator: {creator}\n")
+    fp.write(f"Created: {fields['creationInfo']['created']}\n")
+    if "comment" in fields:
+        fp.write(f"DocumentComment: {_tag_text(fields['comment'])}\n")
+
+    referenced: Set[str] = set()
+    for file_path, records in _select_files(citations, since):
+        spdx_file, snippets, relationships, cited = _spdx_elements(
+            project_path, file_path, records, sources)
+        fp.write(f"\nFileName: {spdx_file['fileName']}\n"
+                 f"SPDXID: {spdx_file['SPDXID']}\n")
+        for checksum in spdx_file["checksums"]:
+            fp.write(f"FileChecksum: {checksum['algorithm']}: {checksum['checksumValue']}\n")
+        fp.write(f"LicenseConcluded: {_NOASSERTION}\n"
+                 f"FileCopyrightText: {_NOASSERTION}\n")
+        if "comment" in spdx_file:
+            fp.write(f"FileComment: {_tag_text(spdx_file['comment'])}\n")
+        for snippet in snippets:
+            fp.write(f"\nSnippetSPDXID: {snippet['SPDXID']}\n"
+                     f"SnippetFromFileSPDXID: {snippet['snippetFromFile']}\n")
+            for pointer_range in snippet["ranges"]:
+                start, end = pointer_range["startPointer"], pointer_range["endPointer"]
+                if "offset" in start:
+                    fp.write(f"SnippetByteRange: {start['offset']}:{end['offset']}\n")
+                else:
+                    fp.write(f"SnippetLineRange: {start['lineNumber']}:{end['lineNumber']}\n")
+            fp.write(f"SnippetLicenseConcluded: {_NOASSERTION}\n"
+                     f"SnippetCopyrightText: {_NOASSERTION}\n"
+                     f"SnippetComment: {_tag_text(snippet['comment'])}\n")
+        fp.write("\n")
+        for element_id, relationship_type, related_id in relationships:
+            fp.write(f"Relationship: {element_id} {relationship_type} {related_id}\n")
+        referenced |= cited
+
+    licenses = _LicenseRefs()
+    for source_id, source in _select_sources(citations, since, referenced):
+        package = _spdx_package(source_id, source, licenses)
+        fp.write(f"\nPackageName: {_tag_text(package['name'])}\n"
+                 f"SPDXID: {package['SPDXID']}\n"
+                 f"PackageDownloadLocation: {package['downloadLocation']}\n"
+                 f"FilesAnalyzed: false\n"
+                 f"PrimaryPackagePurpose: {package['primaryPackagePurpose']}\n"
+                 f"PackageLicenseConcluded: {package['licenseConcluded']}\n"
+                 f"PackageLicenseDeclared: {package['licenseDeclared']}\n"
+                 f"PackageCopyrightText: {package['copyrightText']}\n")
+        if "homepage" in package:
+            fp.write(f"PackageHomePage: {package['homepage']}\n")
+        if "originator" in package:
+            fp.write(f"PackageOriginator: {package['originator']}\n")
+        if "description" in package:
+            fp.write(f"PackageDescription: <text>{package['description']}</text>\n")
+        fp.write(f"PackageComment: {_tag_text(package['comment'])}\n")
+
+    for license_ref, text in sorted(licenses.texts.items()):
+        fp.write(f"\nLicenseID: {license_ref}\n"
+                 f"ExtractedText: <text>{text}</text>\n"
+                 f"LicenseName: {_tag_text(text)}\n")
+
+
+def _cyclonedx_licenses(license_type: Optional[str]) -> List[Dict]:
+    normalized = normalize_license(license_type)
+    if normalized is None:
+        return []
+    if normalized in LICENSES:
+        return [{"license": {"id": normalized}}]
+    if "LicenseRef-" not in normalized:
+        return [{"expression": normalized}]
+    return [{"license": {"name": license_type}}]
+
+
+def _cyclonedx_source(source_id: str, source: Dict) -> Dict:
+    component: Dict = {
+        "type": "library",
+        "bom-ref": f"source:{source_id}",
+        "name": source.get("name") or source_id,
+    }
+    if source.get("author"):
+        component["author"] = source["author"]
+    if source.get("description"):
+        component["description"] = source["description"]
+    licenses = _cyclonedx_licenses(source.get("license_type"))
+    if licenses:
+        component["licenses"] = licenses
+    if source.get("url"):
+        component["externalReferences"] = [{"type": "website", "url": source["url"]}]
+    properties = [{"name": f"{TOOL_NAME}:source_id", "value": source_id}]
+    if source.get("added_at"):
+        properties.append({"name": f"{TOOL_NAME}:added_at", "value": source["added_at"]})
+    component["properties"] = properties
+    return component
+
+
+def write_cyclonedx_json(citations: Dict, fp: IO[str], project_path: Optional[str] = None,
+                         since: Timestamp = None) -> None:
+    """
+    Write citations as a CycloneDX 1.5 JSON BOM.
+
+    Args:
+        citations: Citations structure as held by ``CitationTracker``
+        fp: Text file object to write to
+        project_path: Project root, to read the cited files for hashes
+            (skipped if None)
+        since: Only export what changed after this timestamp
+    """
+    since = _parse_timestamp(since)
+    sources = citations["sources"]
+    project_name = citations.get("project_info", {}).get("name") or "project"
+    metadata: Dict = {
+        "timestamp": _utc_now(),
+        "tools": {"components": [{"type": "application", "name": TOOL_NAME,
+                                  "version": TOOL_VERSION}]},
+        "component": {"type": "application", "bom-ref": "project", "name": project_name},
+    }
+    if since is not None:
+        metadata["properties"] = [{"name": f"{TOOL_NAME}:since", "value": since.isoformat()}]
+
+    writer = _JsonWriter(fp)
+    writer.field("bomFormat", "CycloneDX")
+    writer.field("specVersion", CYCLONEDX_SPEC_VERSION)
+    writer.field("serialNumber", f"urn:uuid:{uuid.uuid4()}")
+    writer.field("version", 1)
+    writer.field("metadata", metadata)
+
+    referenced: Set[str] = set()
+    with _spool() as dependencies:
+        writer.begin_array("components")
+        for file_path, records in _select_files(citations, since):
+            info = _file_info(project_path, file_path, records)
+            component: Dict = {"type": "file", "bom-ref": f"file:{file_path}", "name": file_path}
+            if info.checksums:
+                component["hashes"] = [{"alg": "SHA-1", "content": info.checksums["SHA1"]},
+                                       {"alg": "SHA-256", "content": info.checksums["SHA256"]}]
+            component["properties"] = [{"name": f"{TOOL_NAME}:citation", "value": _citation_text(record)}
+                                       for record in records]
+            writer.item(component)
+
+            cited = []
+            for record in records:
+                for source_id in record["source_ids"]:
+                    if source_id in sources and source_id not in cited:
+                        cited.append(source_id)
+            if cited:
+                dependencies.write(json.dumps({"ref": f"file:{file_path}",
+                                               "dependsOn": [f"source:{source_id}"
+                                                             for source_id in cited]}) + "\n")
+                referenced.update(cited)
+        for source_id, source in _select_sources(citations, since, referenced):
+            writer.item(_cyclonedx_source(source_id, source))
+        writer.end_array()
+        writer.begin_array("dependencies")
+        writer.copy_items(dependencies)
+        writer.end_array()
+    writer.close()
+
+
+_WRITERS = {
+    "spdx": write_spdx_tag_value,
+    "spdx-json": write_spdx_json,
+    "cyclonedx-json": write_cyclonedx_json,
+}
+
+
+def write_sbom(citations: Dict, fp: IO[str], sbom_format: str = "spdx-json",
+               project_path: Optional[str] = None, since: Timestamp = None) -> None:
+    """
+    Write citations in one of ``SBOM_FORMATS``.
+
+    Args:
+        citations: Citations structure as held by ``CitationTracker``
+        fp: Text file object to write to
+        sbom_format: "spdx" (tag-value), "spdx-json" or "cyclonedx-json"
+        project_path: Project root, to read the cited files for checksums
+            (skipped if None)
+        since: Only export what changed after this timestamp
+
+    Raises:
+        ValueError: If the format or the timestamp is not recognized
+    """
+    writer = _WRITERS.get(sbom_format)
+    if writer is None:
+        raise ValueError(f"Unknown SBOM format '{sbom_format}', expected one of {', '.join(SBOM_FORMATS)}")
+    if since is not None and _parse_timestamp(since) is None:
+        raise ValueError(f"Invalid timestamp '{since}'")
+    writer(citations, fp, project_path=project_path, since=since)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export citations as an SPDX or CycloneDX SBOM.")
+    parser.add_argument("project", nargs="?", default=".", help="Project root")
+    parser.add_argument("--format", choices=SBOM_FORMATS, default="spdx-json",
+                        help="Output format (default: spdx-json)")
+    parser.add_argument("--since", help="Only export changes after this ISO timestamp")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        from .citation_tracker import CitationTracker
+    except ImportError:
+        from citation_tracker import CitationTracker
+
+    tracker = CitationTracker(args.project)
+    try:
+        if args.output:
+            tracker.export_sbom(args.output, args.format, since=args.since)
+        else:
+            tracker.write_sbom(sys.stdout, args.format, since=args.since)
+    except ValueError as error:
+        parser.error(str(error))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
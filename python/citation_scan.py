@@ -0,0 +1,688 @@
+"""
+Attribution marker scanner.
+
+``CitationTracker`` produces ``# Attribution:`` comments
+(``generate_attribution_comment``) and attribution headers
+(``insert_attribution_header``). This module reads them back from a source
+tree and reconciles them with ``citations.json``, reporting drift in both
+directions: markers with no recorded citation, and recorded citations with
+no marker in the file.
+
+Files are scanned by a pool of worker processes. Each file is rejected with a
+single substring search before any line parsing happens, large files are
+memory-mapped, and binary or ignored files are skipped.
+
+A ``ScanCache`` lets repeated scans read only the files that changed.
+
+Usage:
+    python citation_scan.py [PROJECT] [--json] [-j WORKERS] [--no-cache]
+
+The exit status is 1 when drift is found, so the scan can gate CI.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from .citation_files import (DEFAULT_SKIP_DIRS, MIN_PARALLEL_SCAN_FILES, looks_binary,
+                                 pool_batches, use_process_pool)
+    from .citation_store import atomic_open
+    from .citation_tracker import CitationTracker
+except ImportError:
+    from citation_files import (DEFAULT_SKIP_DIRS, MIN_PARALLEL_SCAN_FILES, looks_binary,
+                                pool_batches, use_process_pool)
+    from citation_store import atomic_open
+    from citation_tracker import CitationTracker
+
+# Scan cache kept next to citations.json by the command-line entry point
+SCAN_CACHE_FILE_NAME = "citations.scan-cache.json"
+
+# First line of the header written by CitationTracker.insert_attribution_header
+HEADER_TITLE = "This file contains code derived from or inspired by the following sources:"
+
+_COMMENT_NEEDLE = b"Attribution:"
+_HEADER_NEEDLE = HEADER_TITLE.encode("utf-8")
+
+# "# Attribution: Name, by Author" with any common line comment prefix
+_COMMENT_LINE = re.compile(
+    rb"^[ \t]*(?:#|//|--|;|%|\*)[ \t]*Attribution:[ \t]*(.*?)[ \t]*\r?$", re.MULTILINE)
+_SOURCE_LINE = re.compile(rb"^[ \t]*(?:#|//|--|;|%|\*)[ \t]*Source:[ \t]*(\S+)", re.MULTILINE)
+_HEADER_ENTRY = re.compile(r"^- (.*?)(?: \((\S+)\))?$")
+_UNKNOWN_SOURCE = re.compile(r"^Unknown source \((.+)\)$")
+
+# File name patterns that are never scanned
+DEFAULT_IGNORE_PATTERNS = (
+    "citations.json", "citations.journal", "citations.*.json", "citations.json.*",
+    "citations.lock", "citations.fingerprints", "citations.sock", "CITATIONS.md",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.ico", "*.pdf", "*.zip", "*.gz", "*.tar",
+    "*.whl", "*.exe", "*.dll", "*.so", "*.dylib", "*.pyc", "*.class", "*.jar", "*.db",
+)
+
+# Files at least this large are memory-mapped instead of read
+_MMAP_THRESHOLD = 256 * 1024
+
+
+def list_project_files(project_path: str, skip_dirs=DEFAULT_SKIP_DIRS,
+                       ignore_patterns: Iterable[str] = DEFAULT_IGNORE_PATTERNS,
+                       use_git: bool = True) -> List[str]:
+    """
+    List the files of a project that may contain attribution markers.
+
+    Inside a git work tree the listing comes from ``git ls-files`` so that
+    ``.gitignore`` rules apply; otherwise the tree is walked.
+
+    Args:
+        project_path: Project root
+        skip_dirs: Directory names that are never descended into
+        ignore_patterns: File name patterns to skip
+        use_git: Use git to list files when possible
+
+    Returns:
+        Project-relative paths with forward slashes
+    """
+    paths = None
+    if use_git:
+        try:
+            output = subprocess.run(
+                ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+                cwd=project_path, check=True, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL).stdout
+            paths = [path for path in output.decode("utf-8").split("\0") if path]
+        except (OSError, subprocess.CalledProcessError):
+            paths = None
+
+    if paths is None:
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(project_path):
+            dirnames[:] = [name for name in dirnames if name not in skip_dirs]
+            rel_dir = os.path.relpath(dirpath, project_path)
+            for name in filenames:
+                rel = name if rel_dir == "." else os.path.join(rel_dir, name)
+                paths.append(rel.replace(os.sep, "/"))
+
+    patterns = tuple(ignore_patterns)
+    return [path for path in paths
+            if not any(part in skip_dirs for part in path.split("/")[:-1])
+            and not any(fnmatch(path.rsplit("/", 1)[-1], pattern) for pattern in patterns)]
+
+
+def _read(path: str, need_content: bool = False) -> Optional[bytes]:
+    """
+    Read a file, returning None for binary or unreadable files.
+
+    Unless ``need_content`` is set, large files without any marker come back
+    as empty bytes without being copied out of the memory map.
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return b""
+            if size < _MMAP_THRESHOLD:
+                data = f.read()
+                return None if looks_binary(data) else data
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if looks_binary(mapped):
+                    return None
+                if (not need_content and mapped.find(_COMMENT_NEEDLE) == -1
+                        and mapped.find(_HEADER_NEEDLE) == -1):
+                    return b""
+                return mapped[:]
+    except OSError:
+        return None
+
+
+def parse_markers(data: bytes) -> List[Dict]:
+    """
+    Extract attribution markers from file contents.
+
+    Args:
+        data: Raw file contents
+
+    Returns:
+        Marker dicts with "line", "kind" ("comment" or "header"), "name" and
+        "url" (None when absent) keys, in file order
+    """
+    markers: List[Dict] = []
+    if _COMMENT_NEEDLE in data:
+        line_no, counted = 1, 0
+        for match in _COMMENT_LINE.finditer(data):
+            line_no += data.count(b"\n", counted, match.start())
+            counted = match.start()
+            url = None
+            next_start = match.end() + 1
+            next_line = _SOURCE_LINE.match(data, next_start) if next_start < len(data) else None
+            if next_line:
+                url = next_line.group(1).decode("utf-8", "replace")
+            markers.append({"line": line_no, "kind": "comment",
+                            "name": match.group(1).decode("utf-8", "replace"), "url": url})
+
+    header_at = data.find(_HEADER_NEEDLE)
+    while header_at != -1:
+        line_start = data.rfind(b"\n", 0, header_at) + 1
+        line_no = data.count(b"\n", 0, line_start) + 1
+        line_end = data.find(b"\n", header_at)
+        if data[line_start:line_end if line_end != -1 else len(data)].strip() == _HEADER_NEEDLE:
+            offset = 0
+            while line_end != -1:
+                start, line_end = line_end + 1, data.find(b"\n", line_end + 1)
+                offset += 1
+                text = data[start:line_end if line_end != -1 else len(data)]
+                text = text.decode("utf-8", "replace").rstrip("\r")
+                if text.strip() in ('"""', "'''", "*/"):
+                    break
+                match = _HEADER_ENTRY.match(text)
+                if match:
+                    markers.append({"line": line_no + offset, "kind": "header",
+                                    "name": match.group(1), "url": match.group(2)})
+        header_at = data.find(_HEADER_NEEDLE, header_at + len(_HEADER_NEEDLE))
+
+    markers.sort(key=lambda marker: marker["line"])
+    return markers
+
+
+def scan_file(path: str) -> Optional[List[Dict]]:
+    """
+    Scan one file for attribution markers.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        Markers found, or None if the file is binary or unreadable
+    """
+    data = _read(path)
+    if data is None:
+        return None
+    if _COMMENT_NEEDLE not in data and _HEADER_NEEDLE not in data:
+        return []
+    return parse_markers(data)
+
+
+def fingerprint_ranges(data: bytes, ranges: Iterable[Tuple[int, int]]) -> Dict[str, str]:
+    """
+    Hash the contents of cited line ranges.
+
+    Args:
+        data: Raw file contents
+        ranges: Closed (line_start, line_end) ranges
+
+    Returns:
+        Hex digests keyed by "start-end"
+    """
+    ranges = list(ranges)
+    if not ranges:
+        return {}
+    lines = data.split(b"\n")
+    return {f"{start}-{end}": hashlib.sha1(b"\n".join(lines[start - 1:end])).hexdigest()
+            for start, end in ranges}
+
+
+def content_hash(data) -> str:
+    """
+    Stable hash of JSON-serializable data.
+
+    Args:
+        data: Data to hash
+
+    Returns:
+        Hex digest
+    """
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def _scan_chunk(args: Tuple[str, List[Tuple[str, List[Tuple[int, int]]]]]
+                ) -> List[Tuple[str, Optional[List[Dict]], Dict[str, str]]]:
+    """Process pool worker: scan a batch of (path, cited ranges) items."""
+    root, items = args
+    results = []
+    for path, ranges in items:
+        data = _read(os.path.join(root, path), need_content=bool(ranges))
+        if data is None:
+            results.append((path, None, {}))
+            continue
+        found = (parse_markers(data)
+                 if _COMMENT_NEEDLE in data or _HEADER_NEEDLE in data else [])
+        results.append((path, found, fingerprint_ranges(data, ranges)))
+    return results
+
+
+def _scan_items(project_path: str, items: List[Tuple[str, List[Tuple[int, int]]]],
+                workers: Optional[int]) -> List[Tuple[str, Optional[List[Dict]], Dict[str, str]]]:
+    """Scan (path, cited ranges) items, in a process pool when worthwhile."""
+    if not use_process_pool(len(items), workers, MIN_PARALLEL_SCAN_FILES):
+        return _scan_chunk((project_path, items))
+
+    workers, batches = pool_batches(items, workers, 64)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk_results in pool.map(_scan_chunk, [(project_path, batch) for batch in batches]):
+            results.extend(chunk_results)
+    return results
+
+
+def scan_tree(project_path: str, paths: Optional[List[str]] = None,
+              workers: Optional[int] = None) -> Tuple[Dict[str, List[Dict]], List[str]]:
+    """
+    Scan a project for attribution markers.
+
+    Args:
+        project_path: Project root
+        paths: Project-relative files to scan (defaults to
+            ``list_project_files(project_path)``)
+        workers: Worker processes (defaults to the CPU count; 1 scans in
+            this process)
+
+    Returns:
+        (markers, skipped) where markers maps each file containing markers to
+        its markers and skipped lists binary or unreadable files
+    """
+    if paths is None:
+        paths = list_project_files(project_path)
+
+    markers: Dict[str, List[Dict]] = {}
+    skipped: List[str] = []
+    for path, found, _ in _scan_items(project_path, [(path, []) for path in paths], workers):
+        if found is None:
+            skipped.append(path)
+        elif found:
+            markers[path] = found
+    return markers, skipped
+
+
+class ScanCache:
+    """
+    Persistent per-file scan results, so repeated scans only read changed files.
+
+    Entries are keyed by project-relative path and validated against the
+    file's mtime and size. Each entry holds the markers found in the file and
+    fingerprints of its cited line ranges. The cache also remembers a hash of
+    each file's citation set so attribution headers are only regenerated for
+    files whose citations changed.
+    """
+
+    # Bump when the entry format changes so old caches are discarded
+    VERSION = 1
+
+    # Files modified this recently are rescanned next time, since a later
+    # edit within the same timestamp tick would not change their mtime
+    RACY_SECONDS = 2.0
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the cache, loading it from disk if possible.
+
+        Args:
+            path: Optional file to persist the cache in
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.files: Dict[str, Dict] = {}
+        self.headers: Dict[str, str] = {}
+        self._dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+                if stored.get("version") == self.VERSION:
+                    self.files = stored["files"]
+                    self.headers = stored["headers"]
+            except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+                print("Warning: Scan cache unreadable, starting a new one.")
+
+    def lookup(self, rel_path: str, stat: os.stat_result,
+               ranges: Iterable[Tuple[int, int]] = ()) -> Optional[Dict]:
+        """
+        Cached entry for a file, if it is still valid.
+
+        Args:
+            rel_path: Project-relative path
+            stat: Current ``os.stat`` result of the file
+            ranges: Cited ranges whose fingerprints the caller needs
+
+        Returns:
+            The entry, or None if the file must be rescanned
+        """
+        entry = self.files.get(rel_path)
+        if (entry is None or entry["mtime_ns"] != stat.st_mtime_ns
+                or entry["size"] != stat.st_size
+                or any(f"{start}-{end}" not in entry["fingerprints"] for start, end in ranges)):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, rel_path: str, stat: os.stat_result, markers: Optional[List[Dict]],
+              fingerprints: Dict[str, str]) -> None:
+        """
+        Record the scan result of a file.
+
+        Args:
+            rel_path: Project-relative path
+            stat: ``os.stat`` result taken before the file was read
+            markers: Markers found (None for binary files)
+            fingerprints: Cited range fingerprints
+        """
+        racy = time.time() - stat.st_mtime < self.RACY_SECONDS
+        self.files[rel_path] = {
+            "mtime_ns": None if racy else stat.st_mtime_ns,
+            "size": stat.st_size,
+            "markers": markers,
+            "fingerprints": fingerprints,
+        }
+        self._dirty = True
+
+    def prune(self, live_paths: Iterable[str]) -> None:
+        """
+        Forget files that are no longer part of the project.
+
+        Args:
+            live_paths: Project-relative paths that still exist
+        """
+        live = set(live_paths)
+        for rel_path in [path for path in self.files if path not in live]:
+            del self.files[rel_path]
+            self._dirty = True
+
+    def stale_headers(self, tracker: CitationTracker) -> Dict[str, str]:
+        """
+        Attribution headers of the files whose citation set changed.
+
+        The first call returns a header for every cited file; later calls
+        only return headers that would differ from the last ones returned.
+
+        Args:
+            tracker: Citation tracker of the project
+
+        Returns:
+            Mapping of project-relative file path to its new header
+        """
+        sources = tracker.citations["sources"]
+        file_citations = tracker.citations["file_citations"]
+        stale = {}
+        for file_path, records in file_citations.items():
+            source_ids = list(dict.fromkeys(
+                source_id for record in records for source_id in record["source_ids"]))
+            digest = content_hash([
+                [source_id, {field: (sources.get(source_id) or {}).get(field)
+                             for field in ("name", "url", "author", "license_type")}]
+                for source_id in source_ids])
+            if self.headers.get(file_path) != digest:
+                stale[file_path] = tracker.insert_attribution_header(
+                    os.path.join(tracker.project_path, file_path))
+                self.headers[file_path] = digest
+                self._dirty = True
+        for file_path in [path for path in self.headers if path not in file_citations]:
+            del self.headers[file_path]
+            self._dirty = True
+        return stale
+
+    def save(self) -> None:
+        """Persist the cache if it changed."""
+        if not self.path or not self._dirty:
+            return
+        with atomic_open(self.path) as f:
+            json.dump({"version": self.VERSION, "files": self.files, "headers": self.headers},
+                      f, separators=(',', ':'))
+        self._dirty = False
+
+
+class ScanReport:
+    """Drift between the attribution markers in a tree and the recorded citations."""
+
+    def __init__(self):
+        # Files read by this scan
+        self.files_scanned = 0
+        # Files whose results came from the scan cache
+        self.files_cached = 0
+        # file -> markers found in it
+        self.markers: Dict[str, List[Dict]] = {}
+        # Markers whose source is not cited for their file (or is unknown)
+        self.unrecorded: List[Dict] = []
+        # Recorded (file, source_id) citations with no marker in the file
+        self.unmarked: List[Dict] = []
+        # Cited files that do not exist in the tree
+        self.missing_files: List[str] = []
+        # Binary or unreadable files
+        self.skipped: List[str] = []
+        # Cited ranges whose content changed since the previous cached scan
+        self.changed_ranges: List[Dict] = []
+
+    @property
+    def ok(self) -> bool:
+        """True if markers and recorded citations agree."""
+        return not (self.unrecorded or self.unmarked or self.missing_files)
+
+    def to_dict(self) -> Dict:
+        """Machine-readable form of the report."""
+        return {
+            "files_scanned": self.files_scanned,
+            "files_cached": self.files_cached,
+            "unrecorded": self.unrecorded,
+            "unmarked": self.unmarked,
+            "missing_files": self.missing_files,
+            "skipped": self.skipped,
+            "changed_ranges": self.changed_ranges,
+        }
+
+
+def _marker_lookup(sources: Dict) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]]]:
+    """Index sources by the texts markers render them as, and by URL."""
+    by_text: Dict[str, Set[str]] = {}
+    by_url: Dict[str, Set[str]] = {}
+    for source_id, source in sources.items():
+        name = source.get("name") or ""
+        by_text.setdefault(name, set()).add(source_id)
+        if source.get("author"):
+            by_text.setdefault(f"{name}, by {source['author']}", set()).add(source_id)
+        if source.get("url"):
+            by_url.setdefault(source["url"], set()).add(source_id)
+    return by_text, by_url
+
+
+def resolve_marker(marker: Dict, by_text: Dict[str, Set[str]],
+                   by_url: Dict[str, Set[str]]) -> Set[str]:
+    """
+    Find the source IDs an attribution marker may refer to.
+
+    Args:
+        marker: Marker as returned by ``parse_markers``
+        by_text: Source IDs keyed by rendered marker text
+        by_url: Source IDs keyed by URL
+
+    Returns:
+        Candidate source IDs (empty if the marker matches no source)
+    """
+    unknown = _UNKNOWN_SOURCE.match(marker["name"])
+    if unknown:
+        return {unknown.group(1)}
+    candidates = set(by_text.get(marker["name"], ()))
+    if marker.get("url") and marker["url"] in by_url:
+        by_address = by_url[marker["url"]]
+        candidates = (candidates & by_address) or by_address
+    return candidates
+
+
+def reconcile(citations: Dict, markers: Dict[str, List[Dict]],
+              existing_files: Optional[Set[str]] = None) -> ScanReport:
+    """
+    Compare scanned markers with recorded citations.
+
+    Args:
+        citations: Citations structure as held by ``CitationTracker``
+        markers: Markers per project-relative file
+        existing_files: Files present in the tree; cited files outside this
+            set are reported as missing
+
+    Returns:
+        The drift report
+    """
+    report = ScanReport()
+    report.markers = markers
+    by_text, by_url = _marker_lookup(citations["sources"])
+
+    recorded: Dict[str, Set[str]] = {}
+    for file_path, records in citations["file_citations"].items():
+        key = file_path.replace("\\", "/")
+        cited = recorded.setdefault(key, set())
+        for record in records:
+            cited.update(record["source_ids"])
+
+    for file_path, found in markers.items():
+        cited = recorded.get(file_path, set())
+        marked: Set[str] = set()
+        for marker in found:
+            candidates = resolve_marker(marker, by_text, by_url)
+            matched = candidates & cited
+            if matched:
+                marked.update(matched)
+            else:
+                report.unrecorded.append(dict(marker, file=file_path,
+                                              source_ids=sorted(candidates)))
+        for source_id in sorted(cited - marked):
+            report.unmarked.append({"file": file_path, "source_id": source_id})
+
+    for file_path, cited in recorded.items():
+        if file_path in markers:
+            continue
+        if existing_files is not None and file_path not in existing_files:
+            report.missing_files.append(file_path)
+            continue
+        for source_id in sorted(cited):
+            report.unmarked.append({"file": file_path, "source_id": source_id})
+    return report
+
+
+def _cited_ranges(citations: Dict) -> Dict[str, List[Tuple[int, int]]]:
+    """Closed line ranges recorded per file, keyed with forward slashes."""
+    ranges: Dict[str, Set[Tuple[int, int]]] = {}
+    for file_path, records in citations["file_citations"].items():
+        for record in records:
+            if "line_start" in record and "line_end" in record:
+                ranges.setdefault(file_path.replace("\\", "/"), set()).add(
+                    (record["line_start"], record["line_end"]))
+    return {file_path: sorted(found) for file_path, found in ranges.items()}
+
+
+def scan_project(tracker: CitationTracker, workers: Optional[int] = None,
+                 paths: Optional[List[str]] = None,
+                 cache: Optional[ScanCache] = None) -> ScanReport:
+    """
+    Scan a tracker's project and reconcile the markers with its citations.
+
+    With a cache, only files whose mtime or size changed since the previous
+    scan are read, and cited ranges whose content changed are reported.
+
+    Args:
+        tracker: Citation tracker of the project
+        workers: Worker processes (defaults to the CPU count)
+        paths: Project-relative files to scan (defaults to every project file)
+        cache: Optional scan cache, updated and saved by the scan
+
+    Returns:
+        The drift report
+    """
+    if paths is None:
+        paths = list_project_files(tracker.project_path)
+    cited_ranges = _cited_ranges(tracker.citations)
+
+    markers: Dict[str, List[Dict]] = {}
+    skipped: List[str] = []
+    to_scan: List[Tuple[str, List[Tuple[int, int]]]] = []
+    stats: Dict[str, os.stat_result] = {}
+    cached = 0
+    for path in paths:
+        if cache is None:
+            to_scan.append((path, []))
+            continue
+        try:
+            stat = os.stat(os.path.join(tracker.project_path, path))
+        except OSError:
+            skipped.append(path)
+            continue
+        ranges = cited_ranges.get(path, [])
+        entry = cache.lookup(path, stat, ranges)
+        if entry is None:
+            stats[path] = stat
+            to_scan.append((path, ranges))
+            continue
+        cached += 1
+        if entry["markers"] is None:
+            skipped.append(path)
+        elif entry["markers"]:
+            markers[path] = entry["markers"]
+
+    changed_ranges: List[Dict] = []
+    for path, found, fingerprints in _scan_items(tracker.project_path, to_scan, workers):
+        if found is None:
+            skipped.append(path)
+        elif found:
+            markers[path] = found
+        if cache is not None:
+            previous = cache.files.get(path)
+            if previous is not None:
+                for key, digest in fingerprints.items():
+                    old = previous["fingerprints"].get(key)
+                    if old is not None and old != digest:
+                        start, end = key.split("-")
+                        changed_ranges.append({"file": path, "line_start": int(start),
+                                               "line_end": int(end)})
+            cache.store(path, stats[path], found, fingerprints)
+
+    if cache is not None:
+        cache.prune(paths)
+        cache.save()
+
+    report = reconcile(tracker.citations, markers, set(paths))
+    report.files_scanned = len(to_scan)
+    report.files_cached = cached
+    report.skipped = skipped
+    report.changed_ranges = changed_ranges
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Check that attribution markers agree with citations.json.")
+    parser.add_argument("project", nargs="?", default=".", help="Project root")
+    parser.add_argument("--json", action="store_true", help="Print a JSON report")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Read every file instead of using {SCAN_CACHE_FILE_NAME}")
+    args = parser.parse_args(argv)
+
+    cache = None if args.no_cache else ScanCache(
+        os.path.join(args.project, SCAN_CACHE_FILE_NAME))
+    report = scan_project(CitationTracker(args.project), args.workers, cache=cache)
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        for marker in report.unrecorded:
+            print(f"{marker['file']}:{marker['line']}: attribution '{marker['name']}' "
+                  f"has no recorded citation")
+        for entry in report.unmarked:
+            print(f"{entry['file']}: citation of '{entry['source_id']}' has no attribution marker")
+        for file_path in report.missing_files:
+            print(f"{file_path}: cited file does not exist")
+        for entry in report.changed_ranges:
+            print(f"{entry['file']}:{entry['line_start']}-{entry['line_end']}: "
+                  f"cited lines changed since the last scan")
+        print(f"Scanned {report.files_scanned} files: {len(report.unrecorded)} unrecorded, "
+              f"{len(report.unmarked)} unmarked, {len(report.missing_files)} missing")
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
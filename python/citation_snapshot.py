@@ -0,0 +1,507 @@
+"""
+Compact binary snapshots of the citations structure.
+
+A snapshot holds the same data as ``citations.json`` in a fraction of the
+space:
+
+- every string (keys, paths, names, comments) is stored once in a string
+  table and referenced by number;
+- the key set of each distinct record layout is stored once, so records only
+  carry their values;
+- ``source_ids`` are stored as indices into the source table;
+- ISO timestamps are stored as microseconds since the epoch.
+
+Source and file entries are reachable through offset tables, so read-only
+consumers can memory-map a snapshot with ``SnapshotReader`` and decode only
+the entries they look at. Conversion is lossless in both directions:
+``read_snapshot(path)`` returns exactly the structure that was written.
+
+Usage:
+    python citation_snapshot.py citations.json citations.snap
+    python citation_snapshot.py citations.snap citations.json
+"""
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .citation_store import (LAZY_SECTIONS, CitationStore, LazyMapping, atomic_open,
+                                 read_citations_json, write_citations_json)
+except ImportError:
+    from citation_store import (LAZY_SECTIONS, CitationStore, LazyMapping, atomic_open,
+                                read_citations_json, write_citations_json)
+
+SNAPSHOT_MAGIC = b"CITSNAP\0"
+SNAPSHOT_VERSION = 1
+
+# magic, version, then the offsets of the string, shape, top-level, source and
+# file sections
+_HEADER = struct.Struct("<8sI5Q")
+_COUNT = struct.Struct("<I")
+_ENTRY = struct.Struct("<IQ")
+_FLOAT = struct.Struct("<d")
+
+# Value tags
+_NULL, _FALSE, _TRUE, _INT, _FLOAT_TAG, _STR, _LIST, _OBJECT, _TIMESTAMP, _SOURCE_REFS, _SECTION = range(11)
+
+# Naive ISO timestamps as written by ``datetime.isoformat()``
+_TIMESTAMP_PATTERN = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d{6})?")
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buf, pos: int) -> Tuple[int, int]:
+    byte = buf[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    value = byte & 0x7F
+    shift = 7
+    while True:
+        pos += 1
+        byte = buf[pos]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos + 1
+        shift += 7
+
+
+def timestamp_micros(text: str) -> Optional[int]:
+    """
+    Convert a naive ISO timestamp to microseconds since the epoch.
+
+    Args:
+        text: Timestamp as written by ``datetime.isoformat()``
+
+    Returns:
+        Microseconds since 1970-01-01, or None unless ``format_timestamp``
+        turns the result back into exactly the same text
+    """
+    if len(text) < 19 or text[10] != "T" or not _TIMESTAMP_PATTERN.fullmatch(text):
+        return None
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.isoformat() != text:
+        return None
+    return (parsed - _EPOCH) // _MICROSECOND
+
+
+def format_timestamp(micros: int) -> str:
+    """
+    Convert microseconds since the epoch back to an ISO timestamp.
+
+    Args:
+        micros: Value returned by ``timestamp_micros``
+
+    Returns:
+        Naive ISO timestamp
+    """
+    return (_EPOCH + micros * _MICROSECOND).isoformat()
+
+
+class _SectionMarker:
+    """Stands in for a lazily stored section inside the top-level record."""
+
+
+_SECTION_MARKER = _SectionMarker()
+
+
+class _Encoder:
+    """Encodes values while collecting the string and shape tables."""
+
+    def __init__(self, source_ids: List[str]):
+        self.strings: Dict[str, int] = {}
+        self.shapes: Dict[Tuple[str, ...], int] = {}
+        self.source_index = {source_id: i for i, source_id in enumerate(source_ids)}
+
+    def string(self, text: str) -> int:
+        ref = self.strings.get(text)
+        if ref is None:
+            ref = self.strings[text] = len(self.strings)
+        return ref
+
+    def encode(self, value: Any, out: bytearray) -> None:
+        if value is None:
+            out.append(_NULL)
+        elif value is _SECTION_MARKER:
+            out.append(_SECTION)
+        elif value is True:
+            out.append(_TRUE)
+        elif value is False:
+            out.append(_FALSE)
+        elif isinstance(value, str):
+            micros = timestamp_micros(value)
+            if micros is None:
+                out.append(_STR)
+                _write_varint(out, self.string(value))
+            else:
+                out.append(_TIMESTAMP)
+                _write_varint(out, micros << 1 if micros >= 0 else (~micros << 1) | 1)
+        elif isinstance(value, int):
+            out.append(_INT)
+            _write_varint(out, value << 1 if value >= 0 else (~value << 1) | 1)
+        elif isinstance(value, float):
+            out.append(_FLOAT_TAG)
+            out += _FLOAT.pack(value)
+        elif isinstance(value, (list, tuple)):
+            out.append(_LIST)
+            _write_varint(out, len(value))
+            for item in value:
+                self.encode(item, out)
+        elif isinstance(value, dict):
+            keys = tuple(value)
+            shape = self.shapes.get(keys)
+            if shape is None:
+                for key in keys:
+                    if not isinstance(key, str):
+                        raise TypeError(f"Snapshot keys must be strings, not {key!r}")
+                    self.string(key)
+                shape = self.shapes[keys] = len(self.shapes)
+            out.append(_OBJECT)
+            _write_varint(out, shape)
+            for key, item in value.items():
+                if key == "source_ids":
+                    self.encode_source_ids(item, out)
+                else:
+                    self.encode(item, out)
+        else:
+            raise TypeError(f"Cannot store {type(value).__name__} in a snapshot")
+
+    def encode_source_ids(self, value: Any, out: bytearray) -> None:
+        refs = None
+        if isinstance(value, list):
+            refs = [self.source_index.get(source_id) for source_id in value]
+        if refs is None or None in refs:
+            # Unknown sources keep their IDs as strings
+            self.encode(value, out)
+            return
+        out.append(_SOURCE_REFS)
+        _write_varint(out, len(refs))
+        for ref in refs:
+            _write_varint(out, ref)
+
+
+def encode_snapshot(citations: Dict) -> bytes:
+    """
+    Encode a citations structure as a snapshot.
+
+    Args:
+        citations: Citations structure; its sections may be any mapping
+
+    Returns:
+        Snapshot bytes
+
+    Raises:
+        TypeError: If the structure holds values JSON could not hold either
+    """
+    sources = citations.get("sources")
+    source_ids = list(sources) if isinstance(sources, Mapping) else []
+    encoder = _Encoder(source_ids)
+
+    sections: Dict[str, Tuple[bytearray, bytearray]] = {}
+    top: Dict[str, Any] = {}
+    for key, value in citations.items():
+        if key not in LAZY_SECTIONS or not isinstance(value, Mapping):
+            top[key] = value
+            continue
+        top[key] = _SECTION_MARKER
+        table, data = bytearray(_COUNT.pack(len(value))), bytearray()
+        for entry_key, entry in value.items():
+            table += _ENTRY.pack(encoder.string(entry_key), len(data))
+            encoder.encode(entry, data)
+        sections[key] = (table, data)
+
+    top_data = bytearray()
+    encoder.encode(top, top_data)
+
+    shape_data = bytearray()
+    _write_varint(shape_data, len(encoder.shapes))
+    for keys in encoder.shapes:
+        _write_varint(shape_data, len(keys))
+        for key in keys:
+            _write_varint(shape_data, encoder.strings[key])
+
+    # Character offsets into one UTF-8 blob, so the table decodes in one go
+    text = "".join(encoder.strings)
+    if len(text) > 0xFFFFFFFF:
+        raise ValueError("String table too large for a snapshot")
+    offsets = [0]
+    for string in encoder.strings:
+        offsets.append(offsets[-1] + len(string))
+    blob = text.encode("utf-8")
+    string_data = (_COUNT.pack(len(encoder.strings)) + struct.pack("<Q", len(blob))
+                   + struct.pack(f"<{len(offsets)}I", *offsets) + blob)
+
+    empty = (bytearray(_COUNT.pack(0)), bytearray())
+    parts = [string_data, shape_data, top_data,
+             b"".join(sections.get("sources", empty)), b"".join(sections.get("file_citations", empty))]
+    section_offsets = []
+    position = _HEADER.size
+    for part in parts:
+        section_offsets.append(position)
+        position += len(part)
+    return _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, *section_offsets) + b"".join(parts)
+
+
+def write_snapshot(citations: Dict, path: str) -> None:
+    """
+    Write a citations structure as a snapshot file.
+
+    Args:
+        citations: Citations structure to write
+        path: Destination path
+    """
+    data = encode_snapshot(citations)
+    with atomic_open(path, 'wb') as f:
+        f.write(data)
+
+
+class SnapshotReader:
+    """
+    Read-only, memory-mapped view of a snapshot file.
+
+    Only the string and shape tables are decoded when the reader is opened;
+    sources and file citations are decoded on first access.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a snapshot.
+
+        Args:
+            path: Path to the snapshot file
+
+        Raises:
+            ValueError: If the file is not a snapshot this version can read
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"{path} is not a citations snapshot")
+        buf = self._buf
+        if len(buf) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a citations snapshot")
+        magic, version, *offsets = _HEADER.unpack_from(buf, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} citations snapshot")
+        strings_at, shapes_at, top_at, sources_at, files_at = offsets
+
+        count = _COUNT.unpack_from(buf, strings_at)[0]
+        blob_size = struct.unpack_from("<Q", buf, strings_at + 4)[0]
+        positions = struct.unpack_from(f"<{count + 1}I", buf, strings_at + 12)
+        blob_at = strings_at + 12 + 4 * (count + 1)
+        text = buf[blob_at:blob_at + blob_size].decode("utf-8")
+        self._strings = [text[positions[i]:positions[i + 1]] for i in range(count)]
+
+        count, pos = _read_varint(buf, shapes_at)
+        self._shapes: List[Tuple[str, ...]] = []
+        for _ in range(count):
+            size, pos = _read_varint(buf, pos)
+            keys = []
+            for _ in range(size):
+                ref, pos = _read_varint(buf, pos)
+                keys.append(self._strings[ref])
+            self._shapes.append(tuple(keys))
+
+        self._source_ids: List[str] = []
+        source_entries = self._entries(sources_at)
+        self._source_ids = list(source_entries)
+        self.sources = LazyMapping(source_entries, self._loader(source_entries))
+        file_entries = self._entries(files_at)
+        self.file_citations = LazyMapping(file_entries, self._loader(file_entries))
+
+        top = self._decode(top_at)[0]
+        self.citations: Dict = {}
+        for key, value in top.items():
+            if value is _SECTION_MARKER:
+                value = self.sources if key == "sources" else self.file_citations
+            self.citations[key] = value
+
+    def _entries(self, at: int) -> Dict[str, int]:
+        count = _COUNT.unpack_from(self._buf, at)[0]
+        data_at = at + _COUNT.size + count * _ENTRY.size
+        return {self._strings[ref]: data_at + offset for ref, offset in
+                _ENTRY.iter_unpack(self._buf[at + _COUNT.size:data_at])}
+
+    def _loader(self, entries: Dict[str, int]):
+        return lambda key: self._decode(entries[key])[0]
+
+    def _decode(self, pos: int) -> Tuple[Any, int]:
+        buf = self._buf
+        tag = buf[pos]
+        pos += 1
+        if tag == _STR:
+            ref, pos = _read_varint(buf, pos)
+            return self._strings[ref], pos
+        if tag == _INT or tag == _TIMESTAMP:
+            value, pos = _read_varint(buf, pos)
+            value = ~(value >> 1) if value & 1 else value >> 1
+            if tag == _TIMESTAMP:
+                return format_timestamp(value), pos
+            return value, pos
+        if tag == _OBJECT:
+            shape, pos = _read_varint(buf, pos)
+            record = {}
+            for key in self._shapes[shape]:
+                record[key], pos = self._decode(pos)
+            return record, pos
+        if tag == _LIST:
+            size, pos = _read_varint(buf, pos)
+            items = []
+            for _ in range(size):
+                item, pos = self._decode(pos)
+                items.append(item)
+            return items, pos
+        if tag == _SOURCE_REFS:
+            size, pos = _read_varint(buf, pos)
+            refs = []
+            for _ in range(size):
+                ref, pos = _read_varint(buf, pos)
+                refs.append(self._source_ids[ref])
+            return refs, pos
+        if tag == _NULL:
+            return None, pos
+        if tag == _TRUE:
+            return True, pos
+        if tag == _FALSE:
+            return False, pos
+        if tag == _FLOAT_TAG:
+            return _FLOAT.unpack_from(buf, pos)[0], pos + _FLOAT.size
+        if tag == _SECTION:
+            return _SECTION_MARKER, pos
+        raise ValueError(f"Corrupt snapshot {self.path}: unknown tag {tag} at {pos - 1}")
+
+    def materialize(self) -> Dict:
+        """
+        Decode the whole snapshot.
+
+        Returns:
+            The citations structure with plain dicts for every section
+        """
+        return {key: dict(value) if isinstance(value, LazyMapping) else value
+                for key, value in self.citations.items()}
+
+    def close(self) -> None:
+        """Unmap the file; entries not decoded yet become unreadable."""
+        self._buf.close()
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_snapshot(path: str) -> Dict:
+    """
+    Read a whole snapshot file.
+
+    Args:
+        path: Path to the snapshot
+
+    Returns:
+        The citations structure exactly as it was written
+
+    Raises:
+        ValueError: If the file is not a readable snapshot
+    """
+    with SnapshotReader(path) as reader:
+        return reader.materialize()
+
+
+class SnapshotStore(CitationStore):
+    """
+    Stores citations in a single snapshot file.
+
+    Every write rewrites the snapshot, so this suits projects that are
+    written rarely and read often, such as report and CI consumers.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the store.
+
+        Args:
+            path: Path to the snapshot file
+        """
+        self.path = path
+        self._reader: Optional[SnapshotReader] = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> Optional[Dict]:
+        if not self.exists():
+            return None
+        try:
+            return read_snapshot(self.path)
+        except (ValueError, struct.error, IndexError):
+            print(f"Warning: Citations snapshot {self.path} is corrupted, starting fresh.")
+            return None
+
+    def load_lazy(self) -> Optional[Dict]:
+        if not self.exists():
+            return None
+        try:
+            reader = SnapshotReader(self.path)
+        except (ValueError, struct.error, IndexError):
+            print(f"Warning: Citations snapshot {self.path} is corrupted, starting fresh.")
+            return None
+        self.close()
+        self._reader = reader
+        return reader.citations
+
+    def save(self, citations: Dict) -> None:
+        # Encode first: lazily loaded entries still read from the current file
+        data = encode_snapshot(citations)
+        self.close()
+        with atomic_open(self.path, 'wb') as f:
+            f.write(data)
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Convert citations between JSON and the compact snapshot format.")
+    parser.add_argument("input", help="citations.json or snapshot to read")
+    parser.add_argument("output", help="File to write in the other format")
+    args = parser.parse_args(argv)
+
+    with open(args.input, 'rb') as f:
+        is_snapshot = f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    if is_snapshot:
+        write_citations_json(read_snapshot(args.input), args.output)
+    else:
+        citations = read_citations_json(args.input)
+        if citations is None:
+            print(f"Cannot read citations from {args.input}")
+            return 1
+        write_snapshot(citations, args.output)
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
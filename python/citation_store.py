@@ -0,0 +1,1052 @@
+"""
+Storage backends for the citation tracker.
+
+A store persists the citations structure used by ``CitationTracker``:
+
+    {
+        "project_info": {...},
+        "sources": {source_id: {...}},
+        "file_citations": {file_path: [{...}, ...]}
+    }
+
+Mutations are described by small operation records (see ``apply_op``) so that
+backends can persist them incrementally instead of rewriting everything.
+
+Several processes may share one project. Files are replaced atomically,
+JSON stores take an advisory lock (``citations.lock``) while they read or
+write, and a writer that finds the files changed by another process merges
+its mutations into the other process's data instead of overwriting it.
+"""
+import itertools
+import json
+import mmap
+import os
+import shutil
+import stat
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from .citation_metrics import TrackerMetrics
+except ImportError:
+    from citation_metrics import TrackerMetrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Sections of the citations structure that lazy stores load entry by entry
+LAZY_SECTIONS = ("sources", "file_citations")
+
+# Characters of JSON text collected before each write
+_WRITE_CHUNK_SIZE = 256 * 1024
+
+
+def apply_op(citations: Dict, op: Dict) -> None:
+    """
+    Apply a single mutation record to a citations structure.
+
+    Args:
+        citations: Citations structure to update in place
+        op: Mutation record; ``op["op"]`` is one of ``add_source``, ``cite``
+            or ``set_file`` (replace all citations of one file; an empty list
+            removes the file)
+
+    Raises:
+        ValueError: If the operation is not recognised
+    """
+    kind = op["op"]
+    if kind == "add_source":
+        citations["sources"][op["source_id"]] = op["source"]
+    elif kind == "cite":
+        file_citations = citations["file_citations"]
+        # Compact storage returns copies, so it is appended to directly
+        append_citation = getattr(file_citations, "append_citation", None)
+        if append_citation is not None:
+            append_citation(op["file"], op["citation"])
+        else:
+            file_citations.setdefault(op["file"], []).append(op["citation"])
+    elif kind == "set_file":
+        if op["citations"]:
+            citations["file_citations"][op["file"]] = op["citations"]
+        else:
+            citations["file_citations"].pop(op["file"], None)
+    else:
+        raise ValueError(f"Unknown journal operation: {kind}")
+
+
+def _writable(citations: Dict) -> Dict:
+    """Citations whose sections can be changed; read-only views are copied."""
+    if all(isinstance(citations[section], MutableMapping) for section in LAZY_SECTIONS):
+        return citations
+    writable = dict(citations)
+    for section in LAZY_SECTIONS:
+        writable[section] = dict(citations[section])
+    return writable
+
+
+def read_citations_json(path: str, metrics: Optional[TrackerMetrics] = None) -> Optional[Dict]:
+    """
+    Read a citations JSON file.
+
+    Args:
+        path: Path to the JSON file
+        metrics: Optional metrics to record the ``read`` and ``parse`` time in
+
+    Returns:
+        The citations structure, or None if the file is missing or corrupted
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        if metrics is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        started = time.perf_counter()
+        with open(path, 'rb') as f:
+            data = f.read()
+        read = time.perf_counter()
+        metrics.record("read", read - started, bytes_read=len(data))
+        citations = json.loads(data)
+        metrics.record("parse", time.perf_counter() - read)
+        return citations
+    except json.JSONDecodeError:
+        print(f"Warning: Citations file corrupted, creating new one.")
+        return None
+
+
+def encode_citations_json(citations: Dict) -> Tuple[str, Dict[str, List]]:
+    """
+    Encode a citations structure exactly as ``json.dump(indent=2)`` would.
+
+    The text is built piece by piece so the position of every entry of the
+    lazily loadable sections is known.
+
+    Args:
+        citations: Citations structure; its sections may be any mapping
+
+    Returns:
+        (text, offsets) where offsets maps each of ``LAZY_SECTIONS`` to
+        ``[key, offset, length]`` entries locating each value in the text
+    """
+    offsets: Dict[str, List] = {}
+    return "".join(_iter_citations_json(citations, offsets)), offsets
+
+
+def _iter_citations_json(citations: Dict, offsets: Dict[str, List]) -> Iterator[str]:
+    """Yield the pieces of ``encode_citations_json``'s text, filling in ``offsets``."""
+    if not citations:
+        yield "{}"
+        return
+
+    position = 0
+    separator = "\n"
+    yield "{"
+    position += 1
+    for key, value in citations.items():
+        text = f"{separator}  {json.dumps(key)}: "
+        separator = ",\n"
+        if key not in LAZY_SECTIONS or not isinstance(value, Mapping):
+            text += json.dumps(value, indent=2).replace("\n", "\n  ")
+            yield text
+            position += len(text)
+            continue
+
+        entries = offsets[key] = []
+        if not value:
+            text += "{}"
+            yield text
+            position += len(text)
+            continue
+        inner_separator = "\n"
+        text += "{"
+        for entry_key, entry in value.items():
+            text += f"{inner_separator}    {json.dumps(entry_key)}: "
+            inner_separator = ",\n"
+            position += len(text)
+            yield text
+            text = json.dumps(entry, indent=2).replace("\n", "\n    ")
+            entries.append([entry_key, position, len(text)])
+        text += "\n  }"
+        yield text
+        position += len(text)
+    yield "\n}"
+
+
+# Flags for the temporary files of atomic_open; O_BINARY stops Windows from
+# translating newlines below Python's own file objects
+_TEMP_FILE_FLAGS = (os.O_WRONLY | os.O_CREAT | os.O_EXCL
+                    | getattr(os, 'O_BINARY', 0) | getattr(os, 'O_NOFOLLOW', 0))
+
+
+def _create_temp_file(path: str) -> Tuple[int, str]:
+    """
+    Create a new file next to ``path`` for ``atomic_open``.
+
+    Unlike ``tempfile.mkstemp`` the file is created with mode 0o666, so the
+    process umask applies just as it would to ``open(path, 'w')``.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    while True:
+        temp_path = os.path.join(directory, f"{name}.{os.urandom(6).hex()}.tmp")
+        try:
+            return os.open(temp_path, _TEMP_FILE_FLAGS, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = 'w') -> Iterator[IO]:
+    """
+    Open a temporary file that replaces ``path`` once it is closed.
+
+    Readers see either the old or the new contents, never a partly written
+    file. If the block raises, ``path`` is left untouched. Text is written
+    without newline translation, so byte offsets computed from the text
+    hold on every platform. A replaced file keeps its permissions; a new
+    one gets the permissions the umask allows.
+
+    Args:
+        path: File to replace
+        mode: ``'w'`` for UTF-8 text or ``'wb'`` for bytes
+
+    Yields:
+        The open temporary file
+    """
+    fd, temp_path = _create_temp_file(path)
+    try:
+        text = 'b' not in mode
+        with open(fd, mode, encoding='utf-8' if text else None, newline='' if text else None) as f:
+            yield f
+        try:
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class FileLock:
+    """
+    Advisory lock on a file, shared by all processes that use it.
+
+    The lock is re-entrant for the thread holding it; other threads of the
+    same process wait for it like other processes do. The lock file also
+    holds a generation number that writers bump whenever they replace the
+    data the lock protects, so other processes can tell that their copy is
+    stale.
+    """
+
+    # Width of the generation number, so rewriting it never shortens the file
+    _GENERATION_WIDTH = 20
+
+    def __init__(self, path: str):
+        """
+        Initialize the lock.
+
+        Args:
+            path: Lock file, created on first use
+        """
+        self.path = path
+        # Held by the thread that holds the file lock; guards _fd and _depth
+        self._thread_lock = threading.RLock()
+        self._fd: Optional[int] = None
+        self._depth = 0
+
+    @contextmanager
+    def hold(self, shared: bool = False) -> Iterator[None]:
+        """
+        Hold the lock for the duration of a ``with`` block.
+
+        Args:
+            shared: Take a shared (reader) lock instead of an exclusive one;
+                Windows only has exclusive locks. Nested blocks keep the mode
+                of the outermost one.
+        """
+        with self._thread_lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            # LK_LOCK gives up after ten seconds; keep waiting
+                            continue
+            except BaseException:
+                os.close(fd)
+                raise
+            self._fd = fd
+            self._depth = 1
+            try:
+                yield
+            finally:
+                self._depth = 0
+                self._fd = None
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+                os.close(fd)
+
+    def generation(self) -> int:
+        """Current generation number; the lock must be held."""
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        data = os.read(self._fd, self._GENERATION_WIDTH)
+        try:
+            return int(data or 0)
+        except ValueError:
+            return 0
+
+    def bump_generation(self) -> int:
+        """Increment the generation number; the exclusive lock must be held."""
+        generation = self.generation() + 1
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, b"%0*d" % (self._GENERATION_WIDTH, generation))
+        return generation
+
+
+def write_citations_json(citations: Dict, path: str,
+                         metrics: Optional[TrackerMetrics] = None) -> Dict[str, List]:
+    """
+    Write a citations structure as pretty-printed JSON.
+
+    The text is written in chunks as it is encoded, so memory use does not
+    grow with the size of the file.
+
+    Args:
+        citations: Citations structure to write; its sections may be any mapping
+        path: Destination path
+        metrics: Optional metrics to record the ``serialize`` and ``write`` time in
+
+    Returns:
+        Entry offsets as returned by ``encode_citations_json``
+    """
+    offsets: Dict[str, List] = {}
+    started = time.perf_counter()
+    writing = 0.0
+    written = 0
+    buffer: List[str] = []
+    buffered = 0
+    # json.dumps escapes all non-ASCII characters, so offsets are byte offsets
+    with atomic_open(path) as f:
+        for piece in itertools.chain(_iter_citations_json(citations, offsets), [None]):
+            if piece is not None:
+                buffer.append(piece)
+                buffered += len(piece)
+                if buffered < _WRITE_CHUNK_SIZE:
+                    continue
+            write_started = time.perf_counter()
+            f.write("".join(buffer))
+            writing += time.perf_counter() - write_started
+            written += buffered
+            buffer = []
+            buffered = 0
+    if metrics is not None:
+        elapsed = time.perf_counter() - started
+        metrics.record("serialize", elapsed - writing)
+        metrics.record("write", writing, bytes_written=written)
+    return offsets
+
+
+class LazyMapping(MutableMapping):
+    """
+    Mapping whose values are loaded on first access.
+
+    Keys are known up front, so iteration, ``len`` and membership tests never
+    load anything. Assigned values replace the lazily loaded ones.
+    """
+
+    def __init__(self, keys: Iterable[str], loader: Callable[[str], Any]):
+        """
+        Initialize the mapping.
+
+        Args:
+            keys: All keys, in order
+            loader: Called with a key to load its value
+        """
+        self._keys = dict.fromkeys(keys)
+        self._loaded: Dict[str, Any] = {}
+        self._loader = loader
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._loaded[key]
+        except KeyError:
+            if key not in self._keys:
+                raise
+        value = self._loaded[key] = self._loader(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._keys.setdefault(key)
+        self._loaded[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self._keys[key]
+        self._loaded.pop(key, None)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def loaded_count(self) -> int:
+        """Number of values that have been loaded or assigned."""
+        return len(self._loaded)
+
+
+class CitationStore(ABC):
+    """
+    Interface for persisting the citations structure.
+
+    Backends implement ``exists``, ``load`` and ``save``; the other methods
+    have defaults built on them.
+    """
+
+    # Set by the tracker when metrics are enabled; see ``TrackerMetrics``
+    metrics: Optional[TrackerMetrics] = None
+
+    @abstractmethod
+    def exists(self) -> bool:
+        """Return True if the store already holds a saved citations structure."""
+
+    @abstractmethod
+    def load(self) -> Optional[Dict]:
+        """
+        Load the complete citations structure.
+
+        Returns:
+            The stored citations, or None if nothing has been saved yet
+        """
+
+    def load_lazy(self) -> Optional[Dict]:
+        """
+        Open the citations structure without materializing every entry.
+
+        The ``sources`` and ``file_citations`` sections are returned as
+        ``LazyMapping`` objects where the backend supports it. Backends
+        without an index fall back to a full ``load``.
+
+        Returns:
+            The stored citations, or None if nothing has been saved yet
+        """
+        return self.load()
+
+    @abstractmethod
+    def save(self, citations: Dict) -> None:
+        """
+        Replace the stored contents with a full citations structure.
+
+        Args:
+            citations: Citations structure to store
+        """
+
+    def write(self, citations: Dict, ops: List[Dict]) -> Optional[Dict]:
+        """
+        Persist mutations that have already been applied to ``citations``.
+
+        Backends that cannot write incrementally fall back to a full save,
+        which also lays down the first snapshot of a new store.
+
+        Args:
+            citations: Current in-memory citations structure
+            ops: Mutation records applied since the last write
+
+        Returns:
+            None, or the structure the caller should use from now on when
+            changes made by another process were merged in
+        """
+        self.save(citations)
+        return None
+
+    def compact(self, citations: Dict) -> Optional[Dict]:
+        """
+        Rewrite the store in its most compact form.
+
+        Args:
+            citations: Current in-memory citations structure
+
+        Returns:
+            None, or the structure the caller should use from now on when
+            changes made by another process were merged in
+        """
+        self.save(citations)
+        return None
+
+    def read_changes(self) -> Optional[List[Dict]]:
+        """
+        Read what other processes changed since this store last read or wrote.
+
+        Backends that cannot tell report no changes.
+
+        Returns:
+            The mutation records other processes wrote (empty if nothing
+            changed), or None if the stored structure was replaced in a way
+            that needs a full ``load``
+        """
+        return []
+
+    def close(self) -> None:
+        """Release any resources held by the store."""
+
+
+class JsonStore(CitationStore):
+    """
+    Stores citations in a single pretty-printed JSON file.
+
+    A journal left behind by ``JournaledJsonStore`` is replayed when loading
+    and folded into the file on the next save, so both stores can open the
+    same project.
+
+    With ``index`` set, every save also writes a small sidecar index
+    (``citations.index.json``) with the byte offset of each source and file
+    entry, which lets ``load_lazy`` read single entries without parsing the
+    whole file. Stores without ``index`` keep an index that already exists
+    up to date, for the lazy readers that created it. The index is ignored
+    once the JSON file is changed by anything else.
+
+    Reads and writes hold ``citations.lock``. If another process changed the
+    files since this store last read them, ``write`` reloads them and
+    re-applies its mutations before writing, so no process loses the
+    other's changes.
+    """
+
+    # Bump when the sidecar index format changes
+    INDEX_VERSION = 1
+
+    def __init__(self, path: str, journal_path: Optional[str] = None, index: bool = False):
+        """
+        Initialize the store.
+
+        Args:
+            path: Path to the citations JSON file
+            journal_path: Path to the journal (defaults to ``citations.journal``
+                next to the JSON file)
+            index: Write the sidecar index used by ``load_lazy``
+        """
+        self.path = path
+        self.index = index
+        self.journal_path = journal_path or os.path.join(
+            os.path.dirname(path), 'citations.journal')
+        self.index_path = os.path.join(os.path.dirname(path), 'citations.index.json')
+        self.lock = FileLock(os.path.join(os.path.dirname(path), 'citations.lock'))
+        self._journal_size = 0
+        self._mapped: Optional[mmap.mmap] = None
+        # What the files looked like when this store last read or wrote them
+        self._generation = 0
+        self._signature: Optional[Tuple[int, int, int]] = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> Optional[Dict]:
+        with self.lock.hold(shared=True):
+            return self._load()
+
+    def _load(self) -> Optional[Dict]:
+        """Load the snapshot and journal; the lock must be held."""
+        self._generation = self.lock.generation()
+        self._signature = self._file_signature()
+        citations = read_citations_json(self.path, self.metrics)
+        if citations is None:
+            if self._signature is not None:
+                self._preserve_unreadable()
+            if not os.path.exists(self.journal_path):
+                return None
+            citations = {"project_info": {}, "sources": {}, "file_citations": {}}
+        self._replay_journal(citations)
+        return citations
+
+    def _preserve_unreadable(self) -> None:
+        """Keep a copy of an unreadable snapshot before it gets replaced."""
+        backup_path = self.path + '.corrupt'
+        shutil.copy2(self.path, backup_path)
+        print(f"Warning: Unreadable citations file copied to {backup_path}.")
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _snapshot_changed(self) -> bool:
+        """Whether another process replaced the snapshot; the lock must be held."""
+        return (self.lock.generation() != self._generation
+                or self._file_signature() != self._signature)
+
+    def _journal_changed(self) -> bool:
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            size = 0
+        return size != self._journal_size
+
+    def read_changes(self) -> Optional[List[Dict]]:
+        with self.lock.hold(shared=True):
+            if self._snapshot_changed():
+                return None
+            if self._journal_changed():
+                return self._read_journal()
+            return []
+
+    def _replay_journal(self, citations: Dict) -> None:
+        """Apply journaled mutations on top of the loaded snapshot."""
+        self._journal_size = 0
+        for op in self._read_journal():
+            apply_op(citations, op)
+
+    def _read_journal(self) -> List[Dict]:
+        """Read the journal records past the ones this store has seen."""
+        if not os.path.exists(self.journal_path):
+            return []
+        started = time.perf_counter()
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._journal_size)
+            data = f.read()
+        self._journal_size += len(data)
+        if self.metrics is not None:
+            self.metrics.record("read_journal", time.perf_counter() - started, bytes_read=len(data))
+        ops = []
+        for line in data.decode('utf-8').splitlines():
+            try:
+                ops.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn final record from an interrupted append
+                print("Warning: Skipping unreadable journal record.")
+        return ops
+
+    def load_lazy(self) -> Optional[Dict]:
+        with self.lock.hold(shared=True):
+            index = self._read_index()
+            if index is None and self.index:
+                index = self._index_existing_file()
+            if index is None:
+                return self._load()
+
+            with open(self.path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._close_mapping()
+            self._mapped = mapped
+            self._generation = self.lock.generation()
+            self._signature = self._file_signature()
+
+            def entry_loader(entries: List) -> LazyMapping:
+                positions = {key: (offset, length) for key, offset, length in entries}
+
+                def load_entry(key: str) -> Any:
+                    offset, length = positions[key]
+                    return json.loads(mapped[offset:offset + length])
+                return LazyMapping(positions, load_entry)
+
+            citations: Dict = {}
+            for key in index["order"]:
+                if key in index["offsets"]:
+                    citations[key] = entry_loader(index["offsets"][key])
+                else:
+                    citations[key] = index["values"][key]
+            self._replay_journal(citations)
+            return citations
+
+    def _read_index(self) -> Optional[Dict]:
+        """Read the sidecar index if it still describes the JSON file."""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            stat = os.stat(self.path)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if (not isinstance(index, dict) or index.get("version") != self.INDEX_VERSION
+                or index.get("size") != stat.st_size
+                or index.get("mtime_ns") != stat.st_mtime_ns
+                or not stat.st_size):
+            return None
+        return index
+
+    def _index_existing_file(self) -> Optional[Dict]:
+        """Index a JSON file saved without an index, if it has the layout we write."""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            citations = json.loads(data)
+            text, offsets = encode_citations_json(citations)
+        except (OSError, ValueError, AttributeError):
+            return None
+        if text.encode('utf-8') != data:
+            return None
+        return self._write_index(citations, offsets)
+
+    def _write_index(self, citations: Dict, offsets: Dict[str, List]) -> Dict:
+        """Write and return the sidecar index for the JSON file that was just saved."""
+        stat = os.stat(self.path)
+        index = {
+            "version": self.INDEX_VERSION,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "order": list(citations),
+            "offsets": offsets,
+            "values": {key: value for key, value in citations.items() if key not in offsets},
+        }
+        with atomic_open(self.index_path) as f:
+            json.dump(index, f, separators=(',', ':'))
+        return index
+
+    def _close_mapping(self) -> None:
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+    def close(self) -> None:
+        self._close_mapping()
+
+    def save(self, citations: Dict) -> None:
+        with self.lock.hold():
+            self._save(citations)
+
+    def _save(self, citations: Dict) -> None:
+        """Replace the snapshot and drop the journal; the lock must be held."""
+        offsets = write_citations_json(citations, self.path, self.metrics)
+        if self.index or os.path.exists(self.index_path):
+            self._write_index(citations, offsets)
+        # The snapshot now contains everything the journal recorded
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_size = 0
+        self._generation = self.lock.bump_generation()
+        self._signature = self._file_signature()
+
+    def write(self, citations: Dict, ops: List[Dict]) -> Optional[Dict]:
+        with self.lock.hold():
+            merged = None
+            if self._snapshot_changed() or self._journal_changed():
+                merged = self._reload_with(ops)
+            self._save(citations if merged is None else merged)
+        return merged
+
+    def compact(self, citations: Dict) -> Optional[Dict]:
+        # A full write folds the journal in and merges other processes' changes
+        return JsonStore.write(self, citations, [])
+
+    def _reload_with(self, ops: List[Dict]) -> Optional[Dict]:
+        """Reload what other processes wrote and re-apply ``ops`` on top."""
+        current = self._load()
+        if current is None:
+            return None
+        for op in ops:
+            apply_op(current, op)
+        return current
+
+
+class JournaledJsonStore(JsonStore):
+    """
+    Stores citations as a JSON snapshot plus an append-only journal.
+
+    Each write appends one compact JSON line per mutation to the journal. The
+    journal is replayed on top of the snapshot when loading and is folded back
+    into the snapshot once it passes ``compact_threshold`` bytes.
+
+    Records appended by other processes are picked up from the end of the
+    journal on the next write, so concurrent writers only hold the lock for
+    the length of one append.
+    """
+
+    def __init__(self, path: str, journal_path: Optional[str] = None,
+                 compact_threshold: int = 1024 * 1024, index: bool = False):
+        """
+        Initialize the store.
+
+        Args:
+            path: Path to the citations JSON snapshot
+            journal_path: Path to the journal (defaults to ``citations.journal``
+                next to the snapshot)
+            compact_threshold: Journal size in bytes that triggers compaction
+            index: Write the sidecar index used by ``load_lazy``
+        """
+        super().__init__(path, journal_path, index)
+        self.compact_threshold = compact_threshold
+
+    def write(self, citations: Dict, ops: List[Dict]) -> Optional[Dict]:
+        with self.lock.hold():
+            merged = None
+            if self._snapshot_changed():
+                merged = self._reload_with(ops)
+            elif self._journal_changed():
+                merged = _writable(citations)
+                ops = self._merge_journal(merged, ops)
+            if not self.exists():
+                self._save(citations if merged is None else merged)
+                return merged
+
+            started = time.perf_counter()
+            # Bytes, so the size matches the file on every platform
+            data = "".join(json.dumps(op, separators=(',', ':')) + "\n" for op in ops).encode('utf-8')
+            with open(self.journal_path, 'ab') as f:
+                f.write(data)
+            size = len(data)
+            self._journal_size += size
+            if self.metrics is not None:
+                self.metrics.record("append_journal", time.perf_counter() - started,
+                                    bytes_written=size)
+            if self._journal_size >= self.compact_threshold:
+                self._save(citations if merged is None else merged)
+        return merged
+
+    def _merge_journal(self, citations: Dict, ops: List[Dict]) -> List[Dict]:
+        """
+        Apply records other processes appended and adjust ``ops`` to match.
+
+        ``citations`` already has ``ops`` applied, so the other records land
+        after them in memory but before them in the journal. For any entry
+        both sides changed, the memory state is made authoritative: our
+        sources are re-applied and our records for a shared file become one
+        ``set_file`` with the merged list.
+
+        Returns:
+            The records to append to the journal
+        """
+        theirs = self._read_journal()
+        for op in theirs:
+            apply_op(citations, op)
+        their_sources = {op["source_id"] for op in theirs if op["op"] == "add_source"}
+        their_files = {op["file"] for op in theirs if op["op"] != "add_source"}
+
+        merged_ops = []
+        rewritten = set()
+        for op in ops:
+            if op["op"] == "add_source":
+                if op["source_id"] in their_sources:
+                    apply_op(citations, op)
+                merged_ops.append(op)
+            elif op["file"] not in their_files:
+                merged_ops.append(op)
+            elif op["file"] not in rewritten:
+                rewritten.add(op["file"])
+                merged_ops.append({"op": "set_file", "file": op["file"],
+                                   "citations": list(citations["file_citations"].get(op["file"], []))})
+        return merged_ops
+
+
+class SqliteStore(CitationStore):
+    """
+    Stores citations in an indexed SQLite database.
+
+    Sources are indexed by ``source_id`` and ``license_type``; citations are
+    indexed by file path and by each cited source. Mutations are applied as
+    incremental upserts inside a single transaction per write.
+
+    The store may be used from any thread, such as a tracker's background
+    writer; calls are serialized on one connection.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS project_info (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sources (
+            source_id TEXT PRIMARY KEY,
+            license_type TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sources_license ON sources (license_type);
+        CREATE TABLE IF NOT EXISTS citations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_path TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_citations_file ON citations (file_path);
+        CREATE TABLE IF NOT EXISTS citation_sources (
+            citation_id INTEGER NOT NULL REFERENCES citations (id) ON DELETE CASCADE,
+            source_id TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_citation_sources_source
+            ON citation_sources (source_id);
+        CREATE INDEX IF NOT EXISTS idx_citation_sources_citation
+            ON citation_sources (citation_id);
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the store, creating the schema if needed.
+
+        Args:
+            path: Path to the SQLite database file
+        """
+        import sqlite3
+
+        self.path = path
+        self._lock = threading.RLock()
+        # Other processes may hold the write lock briefly; wait for them
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        # Changes whenever another connection commits
+        self._data_version = self._read_data_version()
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def read_changes(self) -> Optional[List[Dict]]:
+        with self._lock:
+            data_version = self._read_data_version()
+            if data_version == self._data_version:
+                return []
+            self._data_version = data_version
+            return None
+
+    def exists(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM project_info LIMIT 1").fetchone()
+        return row is not None
+
+    def load(self) -> Optional[Dict]:
+        with self._lock:
+            return self._load()
+
+    def _load(self) -> Optional[Dict]:
+        if not self.exists():
+            return None
+
+        citations = {"project_info": {}, "sources": {}, "file_citations": {}}
+        for key, value in self._conn.execute("SELECT key, value FROM project_info"):
+            citations["project_info"][key] = json.loads(value)
+        for source_id, data in self._conn.execute(
+                "SELECT source_id, data FROM sources ORDER BY rowid"):
+            citations["sources"][source_id] = json.loads(data)
+        file_citations = citations["file_citations"]
+        for file_path, data in self._conn.execute(
+                "SELECT file_path, data FROM citations ORDER BY id"):
+            file_citations.setdefault(file_path, []).append(json.loads(data))
+        return citations
+
+    def load_lazy(self) -> Optional[Dict]:
+        with self._lock:
+            return self._load_lazy()
+
+    def _load_lazy(self) -> Optional[Dict]:
+        if not self.exists():
+            return None
+
+        project_info = {key: json.loads(value) for key, value in
+                        self._conn.execute("SELECT key, value FROM project_info")}
+        source_ids = [row[0] for row in
+                      self._conn.execute("SELECT source_id FROM sources ORDER BY rowid")]
+        file_paths = [row[0] for row in self._conn.execute(
+            "SELECT file_path FROM citations GROUP BY file_path ORDER BY MIN(id)")]
+
+        def load_source(source_id: str) -> Dict:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT data FROM sources WHERE source_id = ?", (source_id,)).fetchone()
+            return json.loads(row[0])
+
+        def load_file(file_path: str) -> List[Dict]:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT data FROM citations WHERE file_path = ? ORDER BY id", (file_path,)).fetchall()
+            return [json.loads(row[0]) for row in rows]
+
+        return {
+            "project_info": project_info,
+            "sources": LazyMapping(source_ids, load_source),
+            "file_citations": LazyMapping(file_paths, load_file),
+        }
+
+    def save(self, citations: Dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM citation_sources")
+            self._conn.execute("DELETE FROM citations")
+            self._conn.execute("DELETE FROM sources")
+            self._conn.execute("DELETE FROM project_info")
+            self._conn.executemany(
+                "INSERT INTO project_info (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in citations["project_info"].items()])
+            for source_id, source in citations["sources"].items():
+                self._upsert_source(source_id, source)
+            for file_path, file_citations in citations["file_citations"].items():
+                for citation in file_citations:
+                    self._insert_citation(file_path, citation)
+
+    def write(self, citations: Dict, ops: List[Dict]) -> Optional[Dict]:
+        with self._lock:
+            if not self.exists():
+                self.save(citations)
+                return None
+            self._write_ops(ops)
+        return None
+
+    def _write_ops(self, ops: List[Dict]) -> None:
+        """Apply mutation records as upserts in one transaction; the lock must be held."""
+        with self._conn:
+            for op in ops:
+                kind = op["op"]
+                if kind == "add_source":
+                    self._upsert_source(op["source_id"], op["source"])
+                elif kind == "cite":
+                    self._insert_citation(op["file"], op["citation"])
+                elif kind == "set_file":
+                    self._conn.execute(
+                        "DELETE FROM citations WHERE file_path = ?", (op["file"],))
+                    for citation in op["citations"]:
+                        self._insert_citation(op["file"], citation)
+                else:
+                    raise ValueError(f"Unknown journal operation: {kind}")
+
+    def compact(self, citations: Dict) -> Optional[Dict]:
+        with self._lock:
+            self.save(citations)
+            self._conn.execute("VACUUM")
+        return None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _upsert_source(self, source_id: str, source: Dict) -> None:
+        """Insert or update a single source row, keeping its original position."""
+        values = (source.get("license_type"), json.dumps(source), source_id)
+        cursor = self._conn.execute(
+            "UPDATE sources SET license_type = ?, data = ? WHERE source_id = ?", values)
+        if cursor.rowcount == 0:
+            self._conn.execute(
+                "INSERT INTO sources (license_type, data, source_id) VALUES (?, ?, ?)", values)
+
+    def _insert_citation(self, file_path: str, citation: Dict) -> None:
+        """Insert a single citation row and its source links."""
+        cursor = self._conn.execute(
+            "INSERT INTO citations (file_path, data) VALUES (?, ?)",
+            (file_path, json.dumps(citation)))
+        self._conn.executemany(
+            "INSERT INTO citation_sources (citation_id, source_id) VALUES (?, ?)",
+            [(cursor.lastrowid, source_id) for source_id in citation["source_ids"]])
@@ -3,45 +3,764 @@ Citation Tracker for AI-Generated Content
 This module provides utilities to track and properly attribute sources when using
 AI-assisted code generation tools like GitHub Copilot.
 """
-import json
+import atexit
+import functools
 import os
-from typing import Dict, List, Optional, Union
+import subprocess
+import sys
+import threading
+import time
+import weakref
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
 from datetime import datetime
 
+try:
+    from .citation_metrics import TrackerMetrics
+    from .citation_render import FragmentCache, render_file_fragment, render_source_fragment
+    from .citation_store import (CitationStore, JsonStore, JournaledJsonStore,
+                                 apply_op, atomic_open, read_citations_json, write_citations_json)
+except ImportError:
+    from citation_metrics import TrackerMetrics
+    from citation_render import FragmentCache, render_file_fragment, render_source_fragment
+    from citation_store import (CitationStore, JsonStore, JournaledJsonStore,
+                                apply_op, atomic_open, read_citations_json, write_citations_json)
+
+
+def _synchronized(method):
+    """Run a tracker method while holding the tracker's lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _instrumented(operation: str):
+    """Record the duration of a tracker method when metrics are enabled."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if metrics is None:
+                return method(self, *args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.record(operation, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+# Marks a source that did not exist before a batch, for rollback, or an
+# entry that did not exist when a view was taken
+_ABSENT = object()
+
+# Journal size (in bytes) after which a journaled tracker compacts itself
+DEFAULT_JOURNAL_COMPACT_THRESHOLD = 1024 * 1024
+
+# Number of normalized file paths each tracker remembers
+PATH_CACHE_SIZE = 4096
+
+# Characters per chunk of a streamed citations document
+_MARKDOWN_CHUNK_SIZE = 64 * 1024
+
+# Directory (inside the output directory) of the document listing the cited
+# files outside the project, in per-directory exports
+EXTERNAL_FILES_DIRECTORY = "_external"
+
+# Keyword arguments accepted by the bulk ingestion methods
+_SOURCE_FIELDS = ("source_id", "name", "url", "author", "license_type", "description")
+_CITATION_FIELDS = ("file_path", "source_ids", "line_start", "line_end", "comment")
+
+
+def canonical_file_key(file_path: str, project_path: str) -> str:
+    """
+    Canonical ``file_citations`` key of a file.
+    
+    Keys use forward slashes and are relative to the project root, with
+    ``.`` and ``..`` segments and symbolic links resolved, so every way of
+    spelling a path gives the same, interned key. Relative paths are taken
+    relative to the project root and backslashes count as separators. Links
+    that point outside the project are not resolved.
+    
+    Args:
+        file_path: Absolute or project-relative path of the file
+        project_path: Root directory of the project
+        
+    Returns:
+        The canonical key
+    """
+    path = os.path.join(project_path, file_path.replace("\\", "/"))
+    key = os.path.relpath(os.path.realpath(path), os.path.realpath(project_path))
+    if key == os.pardir or key.startswith(os.pardir + os.sep):
+        key = os.path.relpath(os.path.abspath(path), os.path.abspath(project_path))
+    return sys.intern(key.replace(os.sep, "/"))
+
+
+class _ViewSection(Mapping):
+    """
+    Point-in-time view of the ``sources`` or ``file_citations`` section.
+    
+    Taking the view only copies the keys. Entries are read one at a time
+    under the tracker's lock; the tracker hands the view an entry's old
+    value before changing it, so the view keeps reading the data as it was
+    when the view was taken. File citation lists are copied as they are
+    read, since recording a citation appends to them.
+    """
+    
+    def __init__(self, lock: threading.RLock, live: Mapping, copy_values: bool):
+        """
+        Initialize the view; the lock must be held.
+        
+        Args:
+            lock: The tracker's lock
+            live: Section the tracker keeps changing
+            copy_values: Whether values are lists to copy when read
+        """
+        self._lock = lock
+        self._live = live
+        self._keys = list(live)
+        self._copy_values = copy_values
+        self._preserved: Dict[str, object] = {}
+        
+    def preserve(self, key: str) -> None:
+        """Remember an entry before it changes; the lock must be held."""
+        if key not in self._preserved:
+            value = self._live.get(key, _ABSENT)
+            if self._copy_values and value is not _ABSENT:
+                value = list(value)
+            self._preserved[key] = value
+            
+    def is_current(self, key: str) -> bool:
+        """Whether an entry is unchanged since the view was taken; the lock must be held."""
+        return key not in self._preserved
+        
+    def __getitem__(self, key: str):
+        with self._lock:
+            if key in self._preserved:
+                value = self._preserved[key]
+                if value is _ABSENT:
+                    raise KeyError(key)
+                return value
+            value = self._live[key]
+            return list(value) if self._copy_values else value
+            
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            if key in self._preserved:
+                return self._preserved[key] is not _ABSENT
+            return key in self._live
+            
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+        
+    def __len__(self) -> int:
+        return len(self._keys)
+        
+    # Mapping defines __eq__, which would leave views unhashable
+    __hash__ = object.__hash__
+
 
 class CitationTracker:
-    """A class for tracking citations in AI-generated content."""
+    """
+    A class for tracking citations in AI-generated content.
+    
+    A tracker may be shared between threads. With ``flush_interval_ms`` set,
+    mutations only update memory and a background thread writes them to the
+    store, so no caller waits for disk I/O except ``flush``, ``close``,
+    ``compact`` and ``import_json``.
+    """
     
-    def __init__(self, project_path: str = None):
+    def __init__(self, project_path: str = None, journal: bool = False,
+                 journal_compact_threshold: int = DEFAULT_JOURNAL_COMPACT_THRESHOLD,
+                 store: Optional[CitationStore] = None, render_cache: bool = False,
+                 lazy: bool = False, compact_memory: bool = False,
+                 flush_interval_ms: Optional[int] = None,
+                 metrics: Union[bool, TrackerMetrics] = False):
         """
         Initialize the citation tracker.
         
         Args:
             project_path: Root directory of the project for storing citation data
+            journal: If True, mutations are appended to ``citations.journal``
+                instead of rewriting ``citations.json`` every time
+            journal_compact_threshold: Journal size in bytes after which the
+                journal is folded back into ``citations.json``
+            store: Storage backend to use instead of the JSON file (for example
+                a ``SqliteStore``); ``journal`` is ignored when this is given
+            render_cache: If True, rendered Markdown fragments are kept in
+                memory so later exports from this tracker only re-render the
+                sources and files that changed
+            lazy: If True, sources and file citations are read from the store
+                on first access instead of all being parsed up front
+            compact_memory: If True, file citations are held in shared array
+                columns instead of one dict per citation (see
+                ``CompactFileCitations``); lookups return copies of the records
+            flush_interval_ms: If set, mutations are queued and written by a
+                background thread at most this often; call ``flush`` to
+                write them immediately and ``close`` when done
+            metrics: True to collect timings and byte counts (see ``stats``),
+                or a ``TrackerMetrics`` to collect them into
         """
         self.project_path = project_path or os.getcwd()
         self.citations_file = os.path.join(self.project_path, 'citations.json')
+        self.journal_file = os.path.join(self.project_path, 'citations.journal')
+        self.render_cache = render_cache
+        self.lazy = lazy
+        self.compact_memory = compact_memory
+        self._fragment_cache = FragmentCache() if render_cache else None
+        self._canonical_keys = functools.lru_cache(maxsize=PATH_CACHE_SIZE)(
+            functools.partial(canonical_file_key, project_path=self.project_path))
+        if store is None:
+            if journal:
+                store = JournaledJsonStore(self.citations_file, self.journal_file,
+                                           journal_compact_threshold, index=lazy)
+            else:
+                store = JsonStore(self.citations_file, self.journal_file, index=lazy)
+        self.store = store
+        if isinstance(metrics, TrackerMetrics):
+            self.metrics: Optional[TrackerMetrics] = metrics
+        else:
+            self.metrics = TrackerMetrics() if metrics else None
+        self.store.metrics = self.metrics
+        self._batch_depth = 0
+        self._batch_ops: List[Dict] = []
+        self._batch_timestamp: Optional[str] = None
+        self._index: Optional["CitationIndex"] = None
+        # License policy evaluations kept up to date with every mutation
+        self._evaluations: "weakref.WeakSet[PolicyEvaluation]" = weakref.WeakSet()
+        # Sections of the views handed out by ``_view`` that are still in use
+        self._views: "weakref.WeakSet[_ViewSection]" = weakref.WeakSet()
+        self._batch_undo: List[Tuple] = []
+        self._lock = threading.RLock()
+        # Serializes writes of queued mutations; taken before ``_lock``
+        self._flush_lock = threading.Lock()
+        self._pending_ops: List[Dict] = []
+        self._flush_stats = {"flushes": 0, "ops_flushed": 0, "max_queue_depth": 0,
+                             "last_flush_ms": 0.0, "max_flush_ms": 0.0, "total_flush_ms": 0.0}
         self.citations = self._load_citations()
         
+        self._flush_interval = None if flush_interval_ms is None else flush_interval_ms / 1000
+        self._flusher: Optional[threading.Thread] = None
+        if self._flush_interval is not None:
+            self._wake = threading.Event()
+            self._closing = threading.Event()
+            self._last_flush = 0.0
+            self._flusher = threading.Thread(target=self._run_flusher, daemon=True,
+                                             name="citation-flusher")
+            self._flusher.start()
+            atexit.register(self.close)
+        
+    @_instrumented("load")
     def _load_citations(self) -> Dict:
-        """Load existing citations from the citations file."""
-        if os.path.exists(self.citations_file):
+        """Load existing citations from the store."""
+        citations = self.store.load_lazy() if self.lazy else self.store.load()
+        if citations is None:
+            # Initialize a new citations structure
+            citations = {
+                "project_info": {
+                    "name": os.path.basename(self.project_path),
+                    "created_at": datetime.now().isoformat()
+                },
+                "sources": {},
+                "file_citations": {}
+            }
+        self._compact(citations)
+        return citations
+    
+    def _compact(self, citations: Dict) -> None:
+        """Move file citations to columnar storage if ``compact_memory`` is set."""
+        if self.compact_memory:
             try:
-                with open(self.citations_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                print(f"Warning: Citations file corrupted, creating new one.")
-        
-        # Initialize a new citations structure
-        return {
-            "project_info": {
-                "name": os.path.basename(self.project_path),
-                "created_at": datetime.now().isoformat()
-            },
-            "sources": {},
-            "file_citations": {}
-        }
+                from .citation_compact import compact_citations
+            except ImportError:
+                from citation_compact import compact_citations
+            compact_citations(citations)
+    
+    @staticmethod
+    def _apply_op(citations: Dict, op: Dict) -> None:
+        """Apply a single mutation record to a citations structure."""
+        apply_op(citations, op)
+    
+    @_synchronized
+    def _record(self, op: Dict) -> None:
+        """Apply a mutation in memory and persist it."""
+        if self._batch_depth:
+            self._batch_undo.append(self._undo_entry(op))
+        self._apply_in_memory(op)
+        if self._batch_depth:
+            self._batch_ops.append(op)
+            return
+        self._persist([op])
+    
+    def _apply_in_memory(self, op: Dict) -> None:
+        """Apply a mutation to the citations, the query index and policy evaluations."""
+        self._preserve_for_views(op["op"], op["source_id"] if op["op"] == "add_source" else op["file"])
+        if self._fragment_cache is not None:
+            self._invalidate_fragments(op)
+        self._apply_op(self.citations, op)
+        if self._index is not None:
+            self._index.apply(op)
+        for evaluation in self._evaluations:
+            evaluation.apply(op)
+    
+    def _invalidate_fragments(self, op: Dict) -> None:
+        """Drop the cached Markdown fragments a mutation is about to make stale."""
+        if op["op"] != "add_source":
+            self._fragment_cache.invalidate("files", op["file"])
+            return
+        self._fragment_cache.invalidate("sources", op["source_id"])
+        previous = self.citations["sources"].get(op["source_id"])
+        # File fragments show source names, or "Unknown" for missing sources
+        if previous is None or previous.get("name") != op["source"]["name"]:
+            self._fragment_cache.invalidate_files()
+    
+    def _undo_entry(self, op: Dict) -> Tuple:
+        """What is needed to take back a mutation that is about to be applied."""
+        if op["op"] == "add_source":
+            return op["op"], op["source_id"], self.citations["sources"].get(op["source_id"], _ABSENT)
+        if op["op"] == "set_file":
+            return op["op"], op["file"], self.citations["file_citations"].get(op["file"])
+        return op["op"], op["file"], None
+    
+    def _undo(self, entry: Tuple) -> None:
+        """Take back one mutation recorded by ``_undo_entry``."""
+        kind, key, previous = entry
+        self._preserve_for_views(kind, key)
+        if kind == "add_source":
+            if previous is _ABSENT:
+                del self.citations["sources"][key]
+            else:
+                self.citations["sources"][key] = previous
+            return
+        file_citations = self.citations["file_citations"]
+        if kind == "cite":
+            previous = file_citations[key][:-1]
+        if previous:
+            file_citations[key] = previous
+        else:
+            file_citations.pop(key, None)
+    
+    def _persist(self, ops: List[Dict]) -> None:
+        """Write already-applied mutation records to the store, or queue them."""
+        if self._flusher is None:
+            self._adopt(self._timed_write(self.citations, ops))
+            return
+        self._pending_ops.extend(ops)
+        stats = self._flush_stats
+        stats["max_queue_depth"] = max(stats["max_queue_depth"], len(self._pending_ops))
+        self._wake.set()
+    
+    def _timed_write(self, citations: Dict, ops: List[Dict]) -> Optional[Dict]:
+        """Write mutation records to the store and record how long it took."""
+        started = time.perf_counter()
+        merged = self.store.write(citations, ops)
+        elapsed = (time.perf_counter() - started) * 1000
+        if self.metrics is not None:
+            self.metrics.record("save", elapsed / 1000)
+        with self._lock:
+            stats = self._flush_stats
+            stats["flushes"] += 1
+            stats["ops_flushed"] += len(ops)
+            stats["last_flush_ms"] = elapsed
+            stats["max_flush_ms"] = max(stats["max_flush_ms"], elapsed)
+            stats["total_flush_ms"] += elapsed
+        return merged
+    
+    def _view(self) -> Dict:
+        """
+        View of the citations structure that is safe to read without the lock.
+        
+        The view shows the citations as they were when it was taken, while
+        only copying the keys up front: sources and files are read one at a
+        time, and the few entries that change while the view is in use are
+        kept aside for it (see ``_ViewSection``).
+        """
+        with self._lock:
+            view = dict(self.citations)
+            for section in ("sources", "file_citations"):
+                view[section] = _ViewSection(self._lock, self.citations[section],
+                                             copy_values=section == "file_citations")
+                self._views.add(view[section])
+            return view
+    
+    def _preserve_for_views(self, kind: str, key: str) -> None:
+        """Let open views keep the entry a mutation is about to change."""
+        if not self._views:
+            return
+        live = self.citations["sources" if kind == "add_source" else "file_citations"]
+        for section in self._views:
+            if section._live is live:
+                section.preserve(key)
+    
+    def flush(self) -> None:
+        """Write all queued mutations to the store now."""
+        with self._flush_lock:
+            with self._lock:
+                ops, self._pending_ops = self._pending_ops, []
+                if not ops:
+                    return
+                view = self._view()
+            try:
+                merged = self._timed_write(view, ops)
+            except BaseException:
+                with self._lock:
+                    self._pending_ops[:0] = ops
+                raise
+            if merged is not None:
+                with self._lock:
+                    # Mutations queued while writing are not in the merged copy yet
+                    for op in self._pending_ops:
+                        self._apply_op(merged, op)
+                    self._adopt(merged)
+    
+    def flush_stats(self) -> Dict[str, float]:
+        """
+        Statistics about writes to the store.
+        
+        Returns:
+            Dict with the number of ``flushes`` and ``ops_flushed``, the
+            current and maximum ``queue_depth``, and the last, maximum and
+            mean flush latency in milliseconds
+        """
+        with self._lock:
+            stats = dict(self._flush_stats)
+            stats["queue_depth"] = len(self._pending_ops)
+        stats["mean_flush_ms"] = stats["total_flush_ms"] / stats["flushes"] if stats["flushes"] else 0.0
+        return stats
+    
+    def _run_flusher(self) -> None:
+        """Background thread writing queued mutations at most once per interval."""
+        while not self._closing.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            delay = self._last_flush + self._flush_interval - time.monotonic()
+            if delay > 0 and self._closing.wait(delay):
+                # close() writes whatever is still queued
+                return
+            try:
+                self.flush()
+            except Exception as error:
+                print(f"Warning: Writing citations failed, will retry: {error}")
+                self._wake.set()
+            self._last_flush = time.monotonic()
+    
+    def _adopt(self, merged: Optional[Dict]) -> None:
+        """Switch to citations the store merged with another process's changes."""
+        if merged is None:
+            return
+        self._compact(merged)
+        self.citations = merged
+        self._reset_indexes()
+    
+    def _reset_indexes(self) -> None:
+        """Drop the query index and re-evaluate policies after ``citations`` changed wholesale."""
+        self._index = None
+        if self._fragment_cache is not None:
+            self._fragment_cache.clear()
+        for evaluation in self._evaluations:
+            evaluation.rebuild(self.citations)
+    
+    def _now(self) -> str:
+        """Timestamp for new records; shared by every record in a batch."""
+        if self._batch_timestamp is not None:
+            return self._batch_timestamp
+        return datetime.now().isoformat()
+    
+    @contextmanager
+    def batch(self) -> Iterator["CitationTracker"]:
+        """
+        Group mutations so they are written to disk once, when the block exits.
+        
+        Nested batches join the outermost one. If the outermost block raises,
+        none of its mutations are persisted and the in-memory state is
+        restored. Other threads wait until the batch is over.
+        
+        Yields:
+            The tracker itself
+        """
+        with self._lock:
+            if self._batch_depth == 0:
+                self._batch_timestamp = datetime.now().isoformat()
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    undo, self._batch_undo = self._batch_undo, []
+                    for entry in reversed(undo):
+                        self._undo(entry)
+                    self._batch_ops = []
+                    self._batch_timestamp = None
+                    self._reset_indexes()
+                raise
+            
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                ops, self._batch_ops = self._batch_ops, []
+                self._batch_undo = []
+                self._batch_timestamp = None
+                if ops:
+                    self._persist(ops)
+    
+    def add_sources(self, sources: Iterable[Dict]) -> None:
+        """
+        Add many citation sources with a single write.
+        
+        All entries are validated before any of them is applied.
+        
+        Args:
+            sources: Dicts holding the keyword arguments of ``add_source``
+            
+        Raises:
+            ValueError: If any entry is malformed
+        """
+        sources = list(sources)
+        for index, entry in enumerate(sources):
+            self._validate_entry(index, entry, _SOURCE_FIELDS, ("source_id", "name"))
+            
+        with self.batch():
+            for entry in sources:
+                self.add_source(**entry)
+                
+    def cite_many(self, citations: Iterable[Dict]) -> None:
+        """
+        Record many file citations with a single write.
+        
+        All entries are validated before any of them is applied.
+        
+        Args:
+            citations: Dicts holding the keyword arguments of ``cite_in_file``
+            
+        Raises:
+            ValueError: If any entry is malformed
+        """
+        citations = list(citations)
+        for index, entry in enumerate(citations):
+            self._validate_entry(index, entry, _CITATION_FIELDS, ("file_path", "source_ids"))
+            source_ids = entry["source_ids"]
+            if isinstance(source_ids, str):
+                source_ids = [source_ids]
+            if not source_ids or not all(isinstance(sid, str) and sid for sid in source_ids):
+                raise ValueError(f"Entry {index}: source_ids must be a source ID or a list of them")
+            line_start = entry.get("line_start")
+            line_end = entry.get("line_end")
+            for key, value in (("line_start", line_start), ("line_end", line_end)):
+                if value is not None and not isinstance(value, int):
+                    raise ValueError(f"Entry {index}: {key} must be an integer")
+            if line_start is not None and line_end is not None and line_end < line_start:
+                raise ValueError(f"Entry {index}: line_end is before line_start")
+                
+        with self.batch():
+            for entry in citations:
+                self.cite_in_file(**entry)
+    
+    @staticmethod
+    def _validate_entry(index: int, entry: Dict, allowed: Iterable[str],
+                        required: Iterable[str]) -> None:
+        """Check a bulk ingestion entry for unknown and missing fields."""
+        if not isinstance(entry, dict):
+            raise ValueError(f"Entry {index}: expected a dict, got {type(entry).__name__}")
+        unknown = set(entry) - set(allowed)
+        if unknown:
+            raise ValueError(f"Entry {index}: unknown fields {sorted(unknown)}")
+        for key in required:
+            if not entry.get(key):
+                raise ValueError(f"Entry {index}: missing required field '{key}'")
+    
+    def refresh(self) -> bool:
+        """
+        Pick up changes other processes made to the store.
+        
+        Records appended to a journal are applied one by one, keeping the
+        query index warm; a replaced snapshot is loaded in full. While
+        mutations are queued nothing is read, as the next flush merges the
+        other processes' changes anyway.
+        
+        Returns:
+            True if the citations changed
+        """
+        with self._flush_lock:
+            if self._flusher is None:
+                # Synchronous writers write the store under the lock, so it is read under it too
+                with self._lock:
+                    return self._refresh()
+            return self._refresh()
+    
+    def _refresh(self) -> bool:
+        """Read other processes' changes; the flush lock must be held."""
+        with self._lock:
+            if self._pending_ops:
+                return False
+        changes = self.store.read_changes()
+        if changes is None:
+            # Load without the lock so queries keep being answered
+            citations = self._load_citations()
+            with self._lock:
+                for op in self._pending_ops:
+                    self._apply_op(citations, op)
+                self.citations = citations
+                self._reset_indexes()
+            return True
+        with self._lock:
+            for op in changes:
+                self._apply_in_memory(op)
+        return bool(changes)
+    
+    @_instrumented("compact")
+    def compact(self) -> None:
+        """Rewrite the store in its most compact form, folding in any journal."""
+        with self._flush_lock:
+            self._rewrite_store(self.store.compact)
+    
+    def _rewrite_store(self, rewrite: Callable[[Dict], Optional[Dict]]) -> None:
+        """
+        Rewrite the whole store along with any queued mutations.
+        
+        With a background writer, mutations only update memory, so the store
+        is written from a view without holding the lock and other threads
+        keep recording meanwhile; their mutations stay queued for the next
+        flush. Synchronous writers hold the lock while writing, so the
+        rewrite does too. The flush lock must be held.
+        
+        Args:
+            rewrite: Store method taking the citations and returning merged
+                citations or None, such as ``store.compact``
+        """
+        if self._flusher is None:
+            with self._lock:
+                ops, self._pending_ops = self._pending_ops, []
+                if ops:
+                    self._adopt(self._timed_write(self.citations, ops))
+                self._adopt(rewrite(self.citations))
+            return
+        
+        with self._lock:
+            ops, self._pending_ops = self._pending_ops, []
+            view = self._view()
+        try:
+            merged = self._timed_write(view, ops) if ops else None
+        except BaseException:
+            with self._lock:
+                self._pending_ops[:0] = ops
+            raise
+        merged = rewrite(view if merged is None else merged) or merged
+        if merged is not None:
+            with self._lock:
+                # Mutations queued while writing are not in the merged copy yet
+                for op in self._pending_ops:
+                    self._apply_op(merged, op)
+                self._adopt(merged)
+        
+    def close(self) -> None:
+        """Write queued mutations, stop the background writer and release the store."""
+        if self._flusher is not None:
+            self._closing.set()
+            self._wake.set()
+            self._flusher.join()
+            self._flusher = None
+            atexit.unregister(self.close)
+        self.flush()
+        self.store.close()
+        
+    def export_json(self, output_path: str) -> str:
+        """
+        Export all citations to a JSON file in the ``citations.json`` format.
+        
+        Args:
+            output_path: Path for the JSON file
+            
+        Returns:
+            Path to the created JSON file
+        """
+        write_citations_json(self._view(), output_path)
+        return output_path
+        
+    def export_snapshot(self, output_path: str) -> str:
+        """
+        Export all citations to a compact binary snapshot.
+        
+        Args:
+            output_path: Path for the snapshot file
+            
+        Returns:
+            Path to the created snapshot
+        """
+        try:
+            from .citation_snapshot import write_snapshot
+        except ImportError:
+            from citation_snapshot import write_snapshot
+        write_snapshot(self._view(), output_path)
+        return output_path
+        
+    def write_sbom(self, fp: TextIO, sbom_format: str = "spdx-json",
+                   since: Union[str, datetime, None] = None) -> None:
+        """
+        Stream the citations as an SBOM document to an open text file.
+        
+        Args:
+            fp: File object to write to
+            sbom_format: "spdx" (tag-value), "spdx-json" or "cyclonedx-json"
+            since: Only export sources added and citations recorded after
+                this timestamp (ISO string or datetime)
+            
+        Raises:
+            ValueError: If the format or the timestamp is not recognized
+        """
+        try:
+            from .citation_sbom import write_sbom
+        except ImportError:
+            from citation_sbom import write_sbom
+        write_sbom(self._view(), fp, sbom_format, project_path=self.project_path, since=since)
+        
+    def export_sbom(self, output_path: str, sbom_format: str = "spdx-json",
+                    since: Union[str, datetime, None] = None) -> str:
+        """
+        Export the citations as an SPDX or CycloneDX SBOM file.
+        
+        Args:
+            output_path: Path for the SBOM file
+            sbom_format: "spdx" (tag-value), "spdx-json" or "cyclonedx-json"
+            since: Only export sources added and citations recorded after
+                this timestamp (ISO string or datetime)
+            
+        Returns:
+            Path to the created SBOM file
+            
+        Raises:
+            ValueError: If the format or the timestamp is not recognized
+        """
+        with atomic_open(output_path) as f:
+            self.write_sbom(f, sbom_format, since=since)
+        return output_path
+        
+    def import_json(self, input_path: str) -> None:
+        """
+        Replace all citations with the contents of a ``citations.json`` file.
+        
+        Args:
+            input_path: Path to the JSON file to import
+            
+        Raises:
+            ValueError: If the file is missing or not valid citations JSON
+        """
+        citations = read_citations_json(input_path)
+        if citations is None:
+            raise ValueError(f"Cannot import citations from {input_path}")
+        self._compact(citations)
+        with self._flush_lock:
+            with self._lock:
+                # Queued mutations are superseded by the import
+                self._pending_ops = []
+                self.citations = citations
+                self._reset_indexes()
+            self._rewrite_store(self.store.save)
     
+    @_instrumented("add_source")
     def add_source(self, 
                   source_id: str, 
                   name: str, 
@@ -60,16 +779,20 @@ class CitationTracker:
             license_type: License type (e.g., MIT, Apache 2.0)
             description: Brief description of the source
         """
-        self.citations["sources"][source_id] = {
-            "name": name,
-            "url": url,
-            "author": author,
-            "license_type": license_type,
-            "description": description,
-            "added_at": datetime.now().isoformat()
-        }
-        self._save_citations()
+        self._record({
+            "op": "add_source",
+            "source_id": source_id,
+            "source": {
+                "name": name,
+                "url": url,
+                "author": author,
+                "license_type": license_type,
+                "description": description,
+                "added_at": self._now()
+            }
+        })
         
+    @_instrumented("cite_in_file")
     def cite_in_file(self, file_path: str, source_ids: Union[str, List[str]], 
                     line_start: Optional[int] = None, 
                     line_end: Optional[int] = None,
@@ -84,17 +807,14 @@ class CitationTracker:
             line_end: Optional ending line number
             comment: Optional comment about how the source was used
         """
-        rel_path = os.path.relpath(file_path, self.project_path)
+        rel_path = self._relative_path(file_path)
         
         if isinstance(source_ids, str):
             source_ids = [source_ids]
             
-        if rel_path not in self.citations["file_citations"]:
-            self.citations["file_citations"][rel_path] = []
-            
         citation = {
             "source_ids": source_ids,
-            "cited_at": datetime.now().isoformat()
+            "cited_at": self._now()
         }
         
         if line_start is not None:
@@ -104,9 +824,278 @@ class CitationTracker:
         if comment:
             citation["comment"] = comment
             
-        self.citations["file_citations"][rel_path].append(citation)
-        self._save_citations()
+        self._record({"op": "cite", "file": rel_path, "citation": citation})
+        
+    @_synchronized
+    def _get_index(self) -> "CitationIndex":
+        """Return the query index, building it on first use."""
+        if self._index is None:
+            try:
+                from .citation_index import CitationIndex
+            except ImportError:
+                from citation_index import CitationIndex
+            self._index = CitationIndex(self.citations)
+        return self._index
+        
+    @_synchronized
+    def files_citing(self, source_id: str) -> Dict[str, List[Tuple[Optional[int], Optional[int]]]]:
+        """
+        Find the files that use content from a source.
+        
+        Args:
+            source_id: Source ID to look up
+            
+        Returns:
+            Mapping of file path to the (line_start, line_end) ranges citing
+            the source; bounds that were not recorded are None
+        """
+        return self._get_index().files_citing(source_id)
+        
+    @_synchronized
+    def files_with_license(self, license_type: Optional[str]) -> Set[str]:
+        """
+        Find the files affected by a license.
+        
+        Args:
+            license_type: License type as recorded on the sources
+            
+        Returns:
+            Set of file paths citing at least one source under that license
+        """
+        return self._get_index().files_with_license(license_type)
+        
+    @_synchronized
+    def evaluate_license_policy(self, policy: "LicensePolicy") -> "PolicyEvaluation":
+        """
+        Check the licenses of every cited source against a policy.
+        
+        The returned evaluation is updated as citations are recorded: a
+        source whose license changes only re-evaluates the files citing it.
+        
+        Args:
+            policy: Allow and deny rules to apply
+            
+        Returns:
+            Per-file and per-directory verdicts
+        """
+        try:
+            from .citation_policy import PolicyEvaluation
+        except ImportError:
+            from citation_policy import PolicyEvaluation
+        evaluation = PolicyEvaluation(self.citations, policy)
+        self._evaluations.add(evaluation)
+        return evaluation
+        
+    def citations_at(self, file_path: str, line: int) -> List[Dict]:
+        """
+        Find the citations covering a line of a file.
+        
+        Citations recorded without line numbers apply to the whole file.
+        
+        Args:
+            file_path: Path to the file
+            line: Line number
+            
+        Returns:
+            Citation records covering the line, ordered by their first line
+        """
+        return self.citations_overlapping(file_path, line, line)
+        
+    @_synchronized
+    def citations_overlapping(self, file_path: str, line_start: int, line_end: int) -> List[Dict]:
+        """
+        Find the citations of a file that overlap a range of lines.
+        
+        Args:
+            file_path: Path to the file
+            line_start: First line of the range
+            line_end: Last line of the range
+            
+        Returns:
+            Citation records overlapping the range, ordered by their first line
+        """
+        rel_path = self._relative_path(file_path)
+        return self._get_index().citations_overlapping(rel_path, line_start, line_end)
+        
+    @_synchronized
+    def coalesced_ranges(self, file_path: str) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Get the merged line ranges each source covers in a file.
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            Mapping of source ID to sorted, non-overlapping (start, end) ranges
+        """
+        return self._get_index().coalesced_ranges(self._relative_path(file_path))
+        
+    @_synchronized
+    def coalesce_citations(self, file_path: str) -> int:
+        """
+        Merge overlapping or adjacent citations of the same sources in a file.
+        
+        Citations are merged when they cite exactly the same set of sources
+        and both have a line range. The merged record keeps the earliest
+        ``cited_at`` and joins distinct comments.
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            Number of citations removed by merging
+        """
+        rel_path = self._relative_path(file_path)
+        file_citations = self.citations["file_citations"].get(rel_path, [])
+        
+        merged: List[Dict] = []
+        open_groups: Dict[frozenset, Dict] = {}
+        ranged = [c for c in file_citations if "line_start" in c and "line_end" in c]
+        for citation in sorted(ranged, key=lambda c: c["line_start"]):
+            key = frozenset(citation["source_ids"])
+            current = open_groups.get(key)
+            if current is not None and citation["line_start"] <= current["line_end"] + 1:
+                current["line_end"] = max(current["line_end"], citation["line_end"])
+                current["cited_at"] = min(current["cited_at"], citation["cited_at"])
+                comment = citation.get("comment")
+                if comment and comment not in current.get("comment", "").split("; "):
+                    current["comment"] = "; ".join(filter(None, [current.get("comment"), comment]))
+                continue
+            current = open_groups[key] = dict(citation)
+            merged.append(current)
+            
+        removed = len(ranged) - len(merged)
+        if removed:
+            unranged = [c for c in file_citations if not ("line_start" in c and "line_end" in c)]
+            self._record({"op": "set_file", "file": rel_path, "citations": unranged + merged})
+        return removed
         
+    @_synchronized
+    def rebase_citations(self, diff_text: str, diff_root: Optional[str] = None,
+                         strip: int = 1, recorded_before: Optional[str] = None) -> Dict[str, int]:
+        """
+        Update cited line ranges for the edits described by a unified diff.
+        
+        Only files named in the diff are touched. Ranges are shifted past
+        inserted and deleted lines, shrunk when cited lines are removed and
+        dropped when none of their lines survive. Renamed files keep their
+        citations under the new name; deleted files lose them.
+        
+        Args:
+            diff_text: Unified diff, as produced by ``git diff``
+            diff_root: Directory the diff's paths are relative to (defaults to
+                the project path)
+            strip: Leading path components to strip from diff paths
+            recorded_before: Optional ISO timestamp; only the line ranges of
+                citations recorded before it are moved, as later ones were
+                recorded against the new version of the file
+            
+        Returns:
+            Counters for "files", "shifted", "shrunk" and "dropped"
+        """
+        try:
+            from .citation_rebase import LineMapper, parse_unified_diff, rebase_file_citations
+        except ImportError:
+            from citation_rebase import LineMapper, parse_unified_diff, rebase_file_citations
+        diff_root = diff_root or self.project_path
+        stats = {"files": 0, "shifted": 0, "shrunk": 0, "dropped": 0}
+        file_citations = self.citations["file_citations"]
+        
+        with self.batch():
+            for file_diff in parse_unified_diff(diff_text, strip):
+                if file_diff.old_path is None:
+                    continue
+                old_key = self._relative_path(os.path.join(diff_root, file_diff.old_path))
+                if old_key not in file_citations:
+                    continue
+                    
+                stats["files"] += 1
+                if file_diff.new_path is None:
+                    stats["dropped"] += len(file_citations[old_key])
+                    self._record({"op": "set_file", "file": old_key, "citations": []})
+                    continue
+                    
+                new_key = self._relative_path(os.path.join(diff_root, file_diff.new_path))
+                rebased = rebase_file_citations(file_citations[old_key],
+                                                LineMapper(file_diff.hunks), stats,
+                                                recorded_before)
+                if new_key != old_key:
+                    self._record({"op": "set_file", "file": old_key, "citations": []})
+                    rebased = file_citations.get(new_key, []) + rebased
+                self._record({"op": "set_file", "file": new_key, "citations": rebased})
+                
+        return stats
+        
+    def rebase_citations_from_git(self, old_rev: str, new_rev: str = "HEAD",
+                                  only_older: bool = False) -> Dict[str, int]:
+        """
+        Update cited line ranges for the changes between two git revisions.
+        
+        Args:
+            old_rev: Revision the recorded line numbers refer to
+            new_rev: Revision to move the line numbers to
+            only_older: If True, only move citations recorded before
+                ``old_rev`` was committed; later ones are taken to refer to
+                the working tree that became ``new_rev`` already
+            
+        Returns:
+            Counters for "files", "shifted", "shrunk" and "dropped"
+            
+        Raises:
+            subprocess.CalledProcessError: If git fails
+        """
+        def git(*args: str) -> str:
+            return subprocess.run(["git", *args], cwd=self.project_path, check=True,
+                                  stdout=subprocess.PIPE, encoding="utf-8").stdout
+                                  
+        repo_root = git("rev-parse", "--show-toplevel").strip()
+        diff_text = git("diff", "--no-color", "--no-ext-diff", "-U0", "-M", old_rev, new_rev)
+        recorded_before = None
+        if only_older:
+            # cited_at holds local times, so the commit time is converted to match
+            committed = int(git("log", "-1", "--format=%ct", old_rev).strip())
+            recorded_before = datetime.fromtimestamp(committed).isoformat()
+        return self.rebase_citations(diff_text, diff_root=repo_root,
+                                     recorded_before=recorded_before)
+        
+    @_instrumented("relative_path")
+    def _relative_path(self, file_path: str) -> str:
+        """Convert a file path to the key used in ``file_citations``."""
+        return self._canonical_keys(file_path)
+        
+    def migrate_file_keys(self) -> Dict[str, List[str]]:
+        """
+        Rename ``file_citations`` keys to their canonical form.
+        
+        Citations recorded under different spellings of the same file (for
+        example ``./a.py``, ``a.py`` and ``sub\\..\\a.py``) are merged
+        under one key, in the order the spellings appear. Only the changed
+        files are written.
+        
+        Returns:
+            Each canonical key that replaced other keys, with the keys it replaced
+        """
+        with self.batch():
+            file_citations = self.citations["file_citations"]
+            groups: Dict[str, List[str]] = {}
+            for file_path in list(file_citations):
+                groups.setdefault(self._relative_path(file_path), []).append(file_path)
+            
+            renamed = {}
+            for key, file_paths in groups.items():
+                if file_paths == [key]:
+                    continue
+                merged = [citation for file_path in file_paths
+                          for citation in file_citations[file_path]]
+                for file_path in file_paths:
+                    if file_path != key:
+                        self._record({"op": "set_file", "file": file_path, "citations": []})
+                self._record({"op": "set_file", "file": key, "citations": merged})
+                renamed[key] = [file_path for file_path in file_paths if file_path != key]
+        return renamed
+        
+    @_instrumented("attribution_comment")
+    @_synchronized
     def generate_attribution_comment(self, source_id: str) -> str:
         """
         Generate a code comment for attribution.
@@ -132,6 +1121,8 @@ class CitationTracker:
             
         return comment
         
+    @_instrumented("attribution_header")
+    @_synchronized
     def insert_attribution_header(self, file_path: str) -> str:
         """
         Generate an attribution header for a file.
@@ -142,14 +1133,14 @@ class CitationTracker:
         Returns:
             Formatted header with all attributions for the file
         """
-        rel_path = os.path.relpath(file_path, self.project_path)
+        rel_path = self._relative_path(file_path)
         if rel_path not in self.citations["file_citations"]:
             return "# No recorded attributions for this file."
             
         file_citations = self.citations["file_citations"][rel_path]
-        cited_sources = set()
-        for citation in file_citations:
-            cited_sources.update(citation["source_ids"])
+        # First-citation order keeps the header stable between runs
+        cited_sources = dict.fromkeys(
+            source_id for citation in file_citations for source_id in citation["source_ids"])
             
         header = [
             "\"\"\"",
@@ -172,6 +1163,7 @@ class CitationTracker:
         header.append("\"\"\"")
         return "\n".join(header)
     
+    @_instrumented("markdown")
     def generate_citations_markdown(self) -> str:
         """
         Generate a Markdown document with all citations.
@@ -179,49 +1171,121 @@ class CitationTracker:
         Returns:
             Markdown formatted citations document
         """
-        md = ["# Project Citations", "", "This document lists all external sources used in this project."]
-        
-        if not self.citations["sources"]:
-            md.append("\n*No citations recorded.*")
-            return "\n".join(md)
-            
-        md.append("\n## Sources\n")
-        
-        for source_id, source in self.citations["sources"].items():
-            md.append(f"### {source['name']}")
-            if source.get("author"):
-                md.append(f"**Author:** {source['author']}")
-            if source.get("url"):
-                md.append(f"**URL:** [{source['url']}]({source['url']})")
-            if source.get("license_type"):
-                md.append(f"**License:** {source['license_type']}")
-            if source.get("description"):
-                md.append(f"\n{source['description']}")
-            md.append("")
-            
-        md.append("## Usage by File\n")
-        
-        for file_path, citations in self.citations["file_citations"].items():
-            md.append(f"### {file_path}")
-            for citation in citations:
-                source_names = []
-                for source_id in citation["source_ids"]:
-                    source = self.citations["sources"].get(source_id, {"name": f"Unknown ({source_id})"})
-                    source_names.append(source["name"])
-                    
-                locations = ""
-                if "line_start" in citation and "line_end" in citation:
-                    locations = f" (lines {citation['line_start']}-{citation['line_end']})"
-                elif "line_start" in citation:
-                    locations = f" (from line {citation['line_start']})"
-                    
-                md.append(f"- Uses: {', '.join(source_names)}{locations}")
-                if citation.get("comment"):
-                    md.append(f"  - Note: {citation['comment']}")
-            md.append("")
+        return "".join(self.iter_citations_markdown())
+        
+    def iter_citations_markdown(self, file_paths: Optional[Iterable[str]] = None,
+                                chunk_size: int = _MARKDOWN_CHUNK_SIZE) -> Iterator[str]:
+        """
+        Generate the citations document incrementally.
+        
+        Concatenating the chunks gives the same text as
+        ``generate_citations_markdown``; memory use is bounded by
+        ``chunk_size`` rather than the size of the document.
+        
+        Args:
+            file_paths: Optional project-relative files to limit the document
+                to; only the sources they cite are listed
+            chunk_size: Approximate number of characters per chunk
+            
+        Yields:
+            Consecutive pieces of the Markdown document
+        """
+        yield from self._chunk_lines(self._iter_markdown_lines(file_paths), chunk_size)
+        
+    @staticmethod
+    def _chunk_lines(lines: Iterable[str], chunk_size: int) -> Iterator[str]:
+        """Join document lines into chunks of about ``chunk_size`` characters."""
+        buffer: List[str] = []
+        buffered = 0
+        separator = ""
+        for line in lines:
+            buffer.append(separator)
+            buffer.append(line)
+            buffered += len(line) + 1
+            separator = "\n"
+            if buffered >= chunk_size:
+                yield "".join(buffer)
+                buffer = []
+                buffered = 0
+        if buffer:
+            yield "".join(buffer)
+            
+    @_instrumented("markdown")
+    def write_citations_markdown(self, fp: TextIO,
+                                 file_paths: Optional[Iterable[str]] = None) -> None:
+        """
+        Stream the citations document to an open text file.
+        
+        Args:
+            fp: File object to write to
+            file_paths: Optional project-relative files to limit the document to
+        """
+        for chunk in self.iter_citations_markdown(file_paths):
+            fp.write(chunk)
+            
+    def _markdown_view(self) -> Tuple[Dict, int]:
+        """View to render the citations document from, with the render cache generation."""
+        cache = self._fragment_cache
+        with self._lock:
+            return self._view(), cache.generation if cache is not None else 0
+            
+    def _iter_markdown_lines(self, file_paths: Optional[Iterable[str]] = None,
+                             markdown_view: Optional[Tuple[Dict, int]] = None) -> Iterator[str]:
+        """Yield the lines of the citations document, from a new view unless one is given."""
+        cache = self._fragment_cache
+        view, generation = markdown_view or self._markdown_view()
+        sources = view["sources"]
+        file_citations = view["file_citations"]
+        if file_paths is None:
+            files = file_citations
+            listed_sources = sources
+        else:
+            files = [path for path in file_paths if path in file_citations]
+            cited = {source_id for path in files
+                     for citation in file_citations[path]
+                     for source_id in citation["source_ids"]}
+            listed_sources = [source_id for source_id in sources if source_id in cited]
+            
+        yield "# Project Citations"
+        yield ""
+        yield "This document lists all external sources used in this project."
+        
+        if not sources:
+            yield "\n*No citations recorded.*"
+            return
+            
+        yield "\n## Sources\n"
+        
+        for source_id in listed_sources:
+            yield self._fragment(cache, generation, "sources", sources, source_id,
+                                 render_source_fragment)
+            
+        yield "## Usage by File\n"
+        
+        # Resolve source names once instead of per citation
+        names = {source_id: source["name"] for source_id, source in sources.items()}
+        for file_path in files:
+            yield self._fragment(cache, generation, "files", file_citations, file_path,
+                                 lambda records: render_file_fragment(file_path, records, names))
             
-        return "\n".join(md)
+    def _fragment(self, cache: Optional[FragmentCache], generation: int, kind: str,
+                  section: _ViewSection, key: str, render) -> str:
+        """Render one entry of a view, reusing the cached fragment while the entry is unchanged."""
+        if cache is None:
+            return render(section[key])
+        with self._lock:
+            current = section.is_current(key)
+            if current:
+                fragment, token = cache.lookup(kind, key, generation)
+                if fragment is not None:
+                    return fragment
+            value = section[key]
+        fragment = render(value)
+        if current:
+            cache.store(kind, key, fragment, generation, token)
+        return fragment
         
+    @_instrumented("export_markdown")
     def export_citations_markdown(self, output_path: Optional[str] = None) -> str:
         """
         Export citations to a markdown file.
@@ -235,14 +1299,67 @@ class CitationTracker:
         if not output_path:
             output_path = os.path.join(self.project_path, "CITATIONS.md")
             
-        md_content = self.generate_citations_markdown()
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(md_content)
+        with atomic_open(output_path) as f:
+            self.write_citations_markdown(f)
             
         return output_path
+        
+    def export_citations_markdown_by_directory(self, output_dir: Optional[str] = None) -> List[str]:
+        """
+        Export one citations document per top-level directory.
+        
+        Each document covers the files under one top-level directory of the
+        project and lists only the sources those files cite. Files in the
+        project root go into the document at the top of ``output_dir``, and
+        cited files outside the project into ``EXTERNAL_FILES_DIRECTORY``.
+        All documents are rendered from the same view of the citations.
+        
+        Args:
+            output_dir: Directory to mirror the project layout into (defaults
+                to the project path)
+            
+        Returns:
+            Paths to the created markdown files
+            
+        Raises:
+            ValueError: If a document would be written outside ``output_dir``,
+                for example through a symbolic link
+        """
+        output_dir = output_dir or self.project_path
+        markdown_view = self._markdown_view()
+        groups: Dict[str, List[str]] = {}
+        for file_path in markdown_view[0]["file_citations"]:
+            parts = file_path.replace(os.sep, "/").split("/", 1)
+            directory = parts[0] if len(parts) > 1 else ""
+            if directory in (os.curdir, os.pardir) or os.path.splitdrive(directory)[0]:
+                directory = EXTERNAL_FILES_DIRECTORY
+            groups.setdefault(directory, []).append(file_path)
+            
+        root = os.path.realpath(output_dir)
+        output_paths = []
+        for directory, file_paths in groups.items():
+            target_dir = os.path.join(output_dir, directory)
+            if os.path.commonpath([root, os.path.realpath(target_dir)]) != root:
+                raise ValueError(f"Citations for {directory} would be written outside {output_dir}")
+            os.makedirs(target_dir, exist_ok=True)
+            output_path = os.path.join(target_dir, "CITATIONS.md")
+            with atomic_open(output_path) as f:
+                lines = self._iter_markdown_lines(file_paths, markdown_view)
+                for chunk in self._chunk_lines(lines, _MARKDOWN_CHUNK_SIZE):
+                    f.write(chunk)
+            output_paths.append(output_path)
+        return output_paths
+    
+    def stats(self) -> Dict:
+        """
+        Snapshot of the metrics collected by this tracker.
+        
+        Returns:
+            The ``TrackerMetrics.stats`` dict; it has no operations when
+            metrics are disabled
+        """
+        return (self.metrics or TrackerMetrics()).stats()
     
     def _save_citations(self) -> None:
-        """Save citations to the citations file."""
-        with open(self.citations_file, 'w', encoding='utf-8') as f:
-            json.dump(self.citations, f, indent=2)
+        """Save all citations to the store."""
+        self.store.save(self.citations)
@@ -0,0 +1,116 @@
+"""
+Unit tests for the citation_aggregate module.
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_aggregate import aggregate_citations, discover_citation_files, write_aggregate
+from citation_tracker import CitationTracker
+
+
+class TestAggregateCitations(unittest.TestCase):
+    """Test cases for multi-project aggregation."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.root = self.test_dir.name
+        
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+        
+    def _project(self, name, sources, cited):
+        path = os.path.join(self.root, name)
+        os.makedirs(path)
+        tracker = CitationTracker(path)
+        with tracker.batch():
+            for source_id, fields in sources.items():
+                tracker.add_source(source_id=source_id, **fields)
+            for file_name, source_id in cited:
+                tracker.cite_in_file(os.path.join(path, file_name), source_id)
+                
+    def test_merge_by_id_and_url(self):
+        """Test merging sources by ID and URL, with conflict detection."""
+        self._project("svc-a", {
+            "requests": {"name": "Requests", "url": "https://github.com/psf/requests",
+                         "license_type": "Apache-2.0"}
+        }, [("a.py", "requests")])
+        self._project("svc-b", {
+            "psf-requests": {"name": "Requests", "url": "http://github.com/psf/requests/"},
+            "requests": {"name": "Other", "url": "https://github.com/psf/requests",
+                         "license_type": "MIT"}
+        }, [("b.py", "psf-requests")])
+        os.makedirs(os.path.join(self.root, "node_modules", "dep"))
+        with open(os.path.join(self.root, "node_modules", "dep", "citations.json"), "w") as f:
+            f.write("{}")
+            
+        result = aggregate_citations(self.root, workers=1)
+        
+        self.assertEqual(result.projects, ["svc-a", "svc-b"])
+        self.assertEqual(list(result.citations["sources"]), ["requests"])
+        self.assertEqual(result.aliases, {("svc-b", "psf-requests"): "requests"})
+        self.assertEqual(result.citations["file_citations"]["svc-b/b.py"][0]["source_ids"],
+                         ["requests"])
+        self.assertEqual(sorted(c["field"] for c in result.conflicts), ["license_type", "name"])
+        
+    def test_parallel_load_matches_serial(self):
+        """Test that the process pool gives the same result as a serial load."""
+        for i in range(10):
+            self._project(f"svc-{i}", {f"src-{i}": {"name": f"Source {i}"}},
+                          [("main.py", f"src-{i}")])
+        self.assertEqual(len(discover_citation_files(self.root)), 10)
+        
+        serial = aggregate_citations(self.root, workers=1)
+        parallel = aggregate_citations(self.root, workers=2)
+        self.assertEqual(parallel.citations["sources"], serial.citations["sources"])
+        self.assertEqual(parallel.citations["file_citations"], serial.citations["file_citations"])
+        
+    def test_unreadable_projects_are_skipped(self):
+        """Test that broken projects are reported and nothing is written into them."""
+        self._project("svc-a", {"a": {"name": "Source A"}}, [("a.py", "a")])
+        for name, content in (("svc-b", "{not json"), ("svc-c", "[]")):
+            os.makedirs(os.path.join(self.root, name))
+            with open(os.path.join(self.root, name, "citations.json"), "w") as f:
+                f.write(content)
+        journal_only = os.path.join(self.root, "svc-d")
+        os.makedirs(journal_only)
+        with open(os.path.join(journal_only, "citations.json"), "w") as f:
+            f.write("{broken")
+        with open(os.path.join(journal_only, "citations.journal"), "w") as f:
+            f.write(json.dumps({"op": "add_source", "source_id": "d",
+                                "source": {"name": "Source D"}}) + "\n{torn")
+        before = {name: sorted(os.listdir(os.path.join(self.root, name)))
+                  for name in ("svc-b", "svc-c", "svc-d")}
+
+        result = aggregate_citations(self.root, workers=1)
+
+        self.assertEqual(result.projects, ["svc-a", "svc-d"])
+        self.assertEqual(sorted(result.citations["sources"]), ["a", "d"])
+        self.assertEqual([os.path.basename(os.path.dirname(path)) for path in result.errors],
+                         ["svc-b", "svc-c"])
+        for name, files in before.items():
+            self.assertEqual(sorted(os.listdir(os.path.join(self.root, name))), files)
+
+    def test_write_aggregate(self):
+        """Test writing the combined report, skipping its own output directory."""
+        self._project("svc-a", {"a": {"name": "Source A", "license_type": "MIT"}},
+                      [("a.py", "a")])
+        output_dir = os.path.join(self.root, "report")
+        write_aggregate(aggregate_citations(self.root, workers=1), output_dir)
+        
+        result = aggregate_citations(self.root, workers=1, exclude=[output_dir])
+        self.assertEqual(result.projects, ["svc-a"])
+        with open(os.path.join(output_dir, "LICENSES.md"), "r") as f:
+            self.assertIn("| MIT | 1 | 1 |", f.read())
+        with open(os.path.join(output_dir, "citations.json"), "r") as f:
+            self.assertIn("svc-a/a.py", json.load(f)["file_citations"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+Unit tests for the citation_async module.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_async import AsyncCitationTracker
+from citation_store import JsonStore, SqliteStore
+from citation_tracker import CitationTracker
+
+
+class SlowCompactStore(JsonStore):
+    """JSON store whose compaction waits until the test lets it finish."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.compacting = threading.Event()
+        self.release = threading.Event()
+
+    def compact(self, citations):
+        self.compacting.set()
+        self.release.wait(5)
+        return super().compact(citations)
+
+
+class TestAsyncCitationTracker(unittest.TestCase):
+    """Test cases for AsyncCitationTracker class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+
+    def test_concurrent_citations(self):
+        """Test that citations from many coroutines are written together."""
+        async def cite(tracker, worker):
+            for i in range(10):
+                await tracker.cite_in_file(os.path.join(self.project_path, f"f{worker % 7}.py"),
+                                           "lib", line_start=i + 1, line_end=i + 1)
+                await asyncio.sleep(0)
+
+        async def run():
+            async with await AsyncCitationTracker.open(self.project_path, journal=True) as tracker:
+                await tracker.add_source(source_id="lib", name="Library", license_type="MIT")
+                await asyncio.gather(*(cite(tracker, worker) for worker in range(200)))
+                files = await tracker.files_with_license("MIT")
+            return tracker, files
+
+        tracker, files = asyncio.run(run())
+        self.assertEqual(len(files), 7)
+        stats = tracker.flush_stats()
+        self.assertEqual(stats["ops_flushed"], 2001)
+        self.assertLess(stats["flushes"], 100)
+        reloaded = CitationTracker(self.project_path)
+        self.assertEqual(reloaded.citations, tracker.citations)
+
+    def test_queries_and_export(self):
+        """Test that queries and exports match the synchronous tracker."""
+        file_path = os.path.join(self.project_path, "a.py")
+
+        async def run():
+            tracker = AsyncCitationTracker(self.project_path)
+            await tracker.add_source(source_id="lib", name="Library", url="https://example.com")
+            await tracker.cite_many([
+                {"file_path": file_path, "source_ids": "lib", "line_start": 1, "line_end": 5},
+                {"file_path": file_path, "source_ids": "lib", "line_start": 4, "line_end": 9},
+            ])
+            results = {
+                "citing": await tracker.files_citing("lib"),
+                "at": await tracker.citations_at(file_path, 4),
+                "ranges": await tracker.coalesced_ranges(file_path),
+                "markdown": await tracker.generate_citations_markdown(),
+                "path": await tracker.export_citations_markdown(),
+            }
+            await tracker.close()
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(results["citing"], {"a.py": [(1, 5), (4, 9)]})
+        self.assertEqual(len(results["at"]), 2)
+        self.assertEqual(results["ranges"], {"lib": [(1, 9)]})
+        with open(results["path"], encoding="utf-8") as f:
+            self.assertEqual(f.read(), results["markdown"])
+        self.assertEqual(CitationTracker(self.project_path).generate_citations_markdown(),
+                         results["markdown"])
+
+    def test_recording_during_compact(self):
+        """Test that the event loop keeps recording while compact() writes."""
+        store = SlowCompactStore(os.path.join(self.project_path, "citations.json"))
+        file_path = os.path.join(self.project_path, "a.py")
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            async with AsyncCitationTracker(self.project_path, store=store) as tracker:
+                await tracker.add_source(source_id="lib", name="Library")
+                compaction = asyncio.ensure_future(tracker.compact())
+                await loop.run_in_executor(None, store.compacting.wait, 5)
+                started = time.perf_counter()
+                await tracker.add_source(source_id="other", name="Other")
+                await tracker.cite_in_file(file_path, "lib", line_start=1)
+                elapsed = time.perf_counter() - started
+                store.release.set()
+                await compaction
+            return tracker, elapsed
+
+        tracker, elapsed = asyncio.run(run())
+        self.assertLess(elapsed, 1)
+        reloaded = CitationTracker(self.project_path)
+        self.assertEqual(sorted(reloaded.citations["sources"]), ["lib", "other"])
+        self.assertEqual(reloaded.citations, tracker.citations)
+
+    def test_recording_while_lock_is_held(self):
+        """Test that recording waits for the tracker lock off the event loop."""
+        tracker = AsyncCitationTracker(self.project_path)
+        holding = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with tracker.tracker._lock:
+                holding.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        holding.wait(5)
+
+        async def run():
+            recording = asyncio.ensure_future(tracker.add_source(source_id="lib", name="Library"))
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - started
+            self.assertFalse(recording.done())
+            release.set()
+            await recording
+            await tracker.close()
+            return elapsed
+
+        try:
+            elapsed = asyncio.run(run())
+        finally:
+            release.set()
+            holder.join()
+        self.assertLess(elapsed, 1)
+        self.assertIn("lib", CitationTracker(self.project_path).citations["sources"])
+
+    def test_sqlite_store(self):
+        """Test recording and querying through a SQLite store."""
+        db_path = os.path.join(self.project_path, "citations.db")
+        file_path = os.path.join(self.project_path, "a.py")
+
+        async def run():
+            tracker = await AsyncCitationTracker.open(self.project_path, store=SqliteStore(db_path))
+            await tracker.add_source(source_id="lib", name="Library", license_type="MIT")
+            await asyncio.gather(*(tracker.cite_in_file(file_path, "lib", line_start=i + 1)
+                                   for i in range(50)))
+            files = await tracker.files_with_license("MIT")
+            await tracker.compact()
+            await tracker.close()
+            return tracker, files
+
+        tracker, files = asyncio.run(run())
+        self.assertEqual(files, {"a.py"})
+        self.assertEqual(tracker.flush_stats()["ops_flushed"], 51)
+        reloaded = CitationTracker(self.project_path, store=SqliteStore(db_path))
+        self.assertEqual(len(reloaded.citations["file_citations"]["a.py"]), 50)
+        reloaded.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
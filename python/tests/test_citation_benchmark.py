@@ -0,0 +1,61 @@
+"""
+Unit tests for the citation_benchmark module.
+"""
+import json
+import os
+import sys
+import threading
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_benchmark import OPERATIONS, compare_results, generate_citations, run_benchmarks
+
+
+class TestCitationBenchmark(unittest.TestCase):
+    """Test cases for the benchmark suite."""
+
+    def test_generate_citations(self):
+        """Test the shape and determinism of generated datasets."""
+        citations = generate_citations(500, files=40, sources=7, range_size=5)
+        self.assertEqual(len(citations["sources"]), 7)
+        self.assertEqual(len(citations["file_citations"]), 40)
+        records = [record for records in citations["file_citations"].values() for record in records]
+        self.assertEqual(len(records), 500)
+        self.assertTrue(all(0 <= record["line_end"] - record["line_start"] <= 10 for record in records))
+        self.assertTrue(all(set(record["source_ids"]) <= set(citations["sources"]) for record in records))
+        self.assertEqual(citations, generate_citations(500, files=40, sources=7, range_size=5))
+
+    def test_run_benchmarks(self):
+        """Test that every operation reports its metrics as JSON."""
+        for store in ("json", "sqlite"):
+            results = run_benchmarks(sizes=[200], store=store, ops=3, label="test")
+            results = json.loads(json.dumps(results))
+            self.assertEqual([result["operation"] for result in results["results"]], list(OPERATIONS))
+            for result in results["results"]:
+                self.assertEqual(result["citations"], 200)
+                self.assertGreater(result["ops_per_sec"], 0)
+                self.assertGreater(result["peak_memory_bytes"], 0)
+                self.assertGreater(result["file_size_bytes"], 0)
+
+    def test_trackers_are_closed(self):
+        """Test that no background writer outlives its operation."""
+        before = threading.active_count()
+        run_benchmarks(sizes=[100, 200], store="sqlite", ops=3, flush_interval_ms=10)
+        self.assertEqual(threading.active_count(), before)
+
+    def test_compare_results(self):
+        """Test that slower and bigger results are reported as regressions."""
+        def document(ops_per_sec, peak):
+            return {"results": [{"operation": "load", "citations": 1000, "ops_per_sec": ops_per_sec,
+                                 "peak_memory_bytes": peak, "file_size_bytes": 100}]}
+
+        self.assertEqual(compare_results(document(100, 1000), document(95, 1050)), [])
+        regressions = compare_results(document(100, 1000), document(50, 2000))
+        self.assertEqual([regression["metric"] for regression in regressions],
+                         ["ops_per_sec", "peak_memory_bytes"])
+        self.assertAlmostEqual(regressions[0]["change"], -0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Unit tests for the citation_compact module.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import citation_compact
+from citation_compact import CompactFileCitations
+from citation_tracker import CitationTracker
+
+
+class TestCompactFileCitations(unittest.TestCase):
+    """Test cases for the columnar file citation storage."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+        
+    def test_records_round_trip(self):
+        """Test that records come back exactly as stored, key order included."""
+        records = {
+            "a.py": [
+                {"source_ids": ["x", "y"], "cited_at": "2024-01-02T03:04:05.123456",
+                 "line_start": 3, "line_end": 9, "comment": "Adapted"},
+                {"source_ids": ["x"], "cited_at": "2024-01-02T03:04:05"},
+                {"cited_at": "2024-01-02T03:04:05", "source_ids": ["x"], "line_start": 1},
+            ],
+            "b.py": [
+                {"source_ids": ["x"], "cited_at": "yesterday"},
+                {"source_ids": ["x"], "line_start": 2 ** 70, "extra": {"k": 1}},
+            ],
+        }
+        compact = CompactFileCitations(records)
+        self.assertEqual(dict(compact.items()), records)
+        self.assertEqual([list(r) for r in compact["a.py"]], [list(r) for r in records["a.py"]])
+        self.assertEqual(compact.citation_count(), 5)
+        
+    def test_returned_lists_are_copies(self):
+        """Test that changes go through the mapping, not the returned lists."""
+        compact = CompactFileCitations({"a.py": [{"source_ids": ["x"]}]})
+        compact["a.py"].append({"source_ids": ["y"]})
+        self.assertEqual(len(compact["a.py"]), 1)
+        compact.append_citation("a.py", {"source_ids": ["y"]})
+        compact.append_citation("b.py", {"source_ids": ["z"]})
+        self.assertEqual([r["source_ids"] for r in compact["a.py"]], [["x"], ["y"]])
+        self.assertEqual(list(compact), ["a.py", "b.py"])
+        
+    def test_replaced_rows_are_reclaimed(self):
+        """Test that rewriting files does not grow the columns without bound."""
+        compact = CompactFileCitations()
+        old_minimum = citation_compact._MIN_REPACK_ROWS
+        citation_compact._MIN_REPACK_ROWS = 10
+        try:
+            for i in range(100):
+                compact["a.py"] = [{"source_ids": ["x"], "line_start": i}] * 3
+                compact[f"f{i % 5}.py"] = [{"source_ids": ["y"], "comment": str(i)}]
+        finally:
+            citation_compact._MIN_REPACK_ROWS = old_minimum
+        self.assertLess(len(compact._layouts), 40)
+        self.assertEqual(compact["a.py"][0]["line_start"], 99)
+        self.assertEqual(compact["f4.py"][0]["comment"], "99")
+        
+    def test_tracker_in_compact_mode(self):
+        """Test that the tracker APIs work on compact storage."""
+        tracker = CitationTracker(self.project_path)
+        tracker.add_source(source_id="a", name="Source A")
+        tracker.cite_in_file(os.path.join(self.project_path, "a.py"), "a", line_start=1, line_end=5)
+        
+        file_path = os.path.join(self.project_path, "a.py")
+        compact = CitationTracker(self.project_path, compact_memory=True)
+        self.assertIsInstance(compact.citations["file_citations"], CompactFileCitations)
+        compact.cite_in_file(file_path, "a", line_start=4, line_end=9)
+        compact.cite_in_file(os.path.join(self.project_path, "b.py"), "a", comment="Note")
+        self.assertEqual(len(compact.citations_overlapping(file_path, 5, 5)), 2)
+        compact.coalesce_citations(file_path)
+        self.assertEqual(compact.coalesced_ranges(file_path), {"a": [(1, 9)]})
+        self.assertIn("- Uses: Source A", compact.generate_citations_markdown())
+        
+        reloaded = CitationTracker(self.project_path)
+        self.assertEqual(reloaded.citations, compact.citations)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+Unit tests for the citation_daemon module.
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_daemon import CitationDaemon, DaemonClient
+from citation_tracker import CitationTracker
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets are not available")
+class TestCitationDaemon(unittest.TestCase):
+    """Test cases for CitationDaemon and DaemonClient."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        self.file_path = os.path.join(self.project_path, "a.py")
+        with open(self.file_path, "w") as f:
+            f.write("print('a')\n")
+        tracker = CitationTracker(self.project_path, journal=True)
+        tracker.add_source(source_id="lib", name="Library", license_type="MIT")
+        tracker.cite_in_file(self.file_path, "lib", line_start=1, line_end=5)
+        self.daemon = CitationDaemon(self.project_path, poll_interval=60, journal=True)
+        self.daemon.start()
+        self.client = DaemonClient(self.daemon.socket_path)
+
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.client.close()
+        self.daemon.stop()
+        self.test_dir.cleanup()
+
+    def test_queries_and_mutations(self):
+        """Test answering queries and writing mutations through the socket."""
+        self.assertEqual(self.client.call("ping"), "pong")
+        self.assertEqual(self.client.call("citations_at", file_path=self.file_path, line=3)[0]["source_ids"],
+                         ["lib"])
+        self.assertEqual(self.client.call("files_with_license", license_type="MIT"), ["a.py"])
+
+        self.client.call("add_source", source_id="other", name="Other", license_type="BSD")
+        self.client.call("cite_in_file", flush=True, file_path="b.py", source_ids=["other"])
+        self.assertEqual(self.client.call("files_citing", source_id="other"), {"b.py": [[None, None]]})
+        self.assertEqual(CitationTracker(self.project_path).citations["file_citations"]["b.py"][0]["source_ids"],
+                         ["other"])
+
+        with self.assertRaisesRegex(RuntimeError, "Unknown method"):
+            self.client.call("delete_everything")
+        with self.assertRaisesRegex(RuntimeError, "Invalid parameters"):
+            self.client.call("citations_at", file="a.py")
+        # A TypeError raised by the method itself is not a parameter error
+        with self.assertRaises(RuntimeError) as raised:
+            self.client.call("citations_at", file_path=self.file_path, line="3")
+        self.assertNotIn("Invalid parameters", str(raised.exception))
+        self.assertEqual(self.client.call("source", source_id="other")["name"], "Other")
+
+    def test_raw_protocol(self):
+        """Test malformed requests and request ids on a raw connection."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as raw:
+            raw.connect(self.daemon.socket_path)
+            raw.sendall(b'not json\n{"id": 7, "method": "ping"}\n')
+            reader = raw.makefile("rb")
+            self.assertIn("Invalid JSON", json.loads(reader.readline())["error"])
+            self.assertEqual(json.loads(reader.readline()), {"id": 7, "result": "pong"})
+            reader.close()
+
+    def test_watch(self):
+        """Test picking up other processes' changes and changed cited files."""
+        other = CitationTracker(self.project_path, journal=True)
+        other.add_source(source_id="lib", name="Library", license_type="Apache-2.0")
+        other.cite_in_file(os.path.join(self.project_path, "c.py"), "lib")
+        self.assertTrue(self.client.call("refresh"))
+        self.assertEqual(self.client.call("files_with_license", license_type="Apache-2.0"),
+                         ["a.py", "c.py"])
+        self.assertFalse(self.client.call("refresh"))
+
+        os.utime(self.file_path, ns=(0, 0))
+        self.client.call("refresh")
+        status = self.client.call("status")
+        self.assertEqual((status["sources"], status["files"]), (1, 2))
+        self.assertEqual(status["modified"], ["a.py"])
+        self.assertEqual(status["missing"], ["c.py"])
+
+        # A replaced snapshot is loaded in full
+        other.compact()
+        other.add_source(source_id="new", name="New")
+        other.compact()
+        self.assertTrue(self.client.call("refresh"))
+        self.assertEqual(self.client.call("source", source_id="new")["name"], "New")
+
+    def test_watch_rotates_through_files(self):
+        """Test that each poll checks a bounded batch of the cited files."""
+        self.daemon.watch_batch = 1
+        other_path = os.path.join(self.project_path, "b.py")
+        with open(other_path, "w") as f:
+            f.write("print('b')\n")
+        self.client.call("cite_in_file", file_path=other_path, source_ids="lib")
+        self.daemon.poll()
+        self.daemon.poll()
+
+        os.utime(self.file_path, ns=(0, 0))
+        os.utime(other_path, ns=(0, 0))
+        self.daemon.poll()
+        self.assertEqual(self.daemon.status()["modified"], ["a.py"])
+        self.daemon.poll()
+        self.assertEqual(self.daemon.status()["modified"], ["a.py", "b.py"])
+
+    def test_single_instance(self):
+        """Test refusing a second daemon while one listens on the socket."""
+        second = CitationDaemon(self.project_path)
+        with self.assertRaisesRegex(RuntimeError, "already listening"):
+            second.start()
+        second.stop()
+
+    def test_shutdown(self):
+        """Test that a shutdown request writes queued mutations and removes the socket."""
+        self.client.call("add_source", source_id="late", name="Late")
+        self.client.call("shutdown")
+        # Waits for the shutdown the request started
+        self.daemon.stop()
+        self.assertFalse(os.path.exists(self.daemon.socket_path))
+        self.assertIn("late", CitationTracker(self.project_path).citations["sources"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Unit tests for the citation_files module.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_files import BINARY_SNIFF_BYTES, pool_batches, read_text_file, use_process_pool
+
+
+class TestCitationFiles(unittest.TestCase):
+    """Test cases for the shared file helpers."""
+
+    def test_read_text_file(self):
+        """Test that binary and missing files are not read as text."""
+        with tempfile.TemporaryDirectory() as test_dir:
+            text_path = os.path.join(test_dir, "a.py")
+            binary_path = os.path.join(test_dir, "a.bin")
+            late_nul_path = os.path.join(test_dir, "b.py")
+            with open(text_path, "wb") as f:
+                f.write(b"print(1)\n")
+            with open(binary_path, "wb") as f:
+                f.write(b"\x7fELF\0\0")
+            with open(late_nul_path, "wb") as f:
+                f.write(b"x" * BINARY_SNIFF_BYTES + b"\0")
+
+            self.assertEqual(read_text_file(text_path), b"print(1)\n")
+            self.assertIsNone(read_text_file(binary_path))
+            self.assertIsNotNone(read_text_file(late_nul_path))
+            self.assertIsNone(read_text_file(os.path.join(test_dir, "missing.py")))
+
+    def test_process_pool_batches(self):
+        """Test when a pool is used and how work is split for it."""
+        self.assertFalse(use_process_pool(10, None, 100))
+        self.assertFalse(use_process_pool(1000, 1, 100))
+        self.assertTrue(use_process_pool(1000, None, 100))
+
+        workers, batches = pool_batches(list(range(1600)), 2, 10)
+        self.assertEqual(workers, 2)
+        self.assertEqual(len(batches), 16)
+        self.assertEqual([item for batch in batches for item in batch], list(range(1600)))
+        self.assertEqual(len(pool_batches(list(range(100)), 4, 64)[1]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Unit tests for the citation_match module.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_match import FINGERPRINT_INDEX_FILE_NAME, FingerprintIndex, fingerprint, main, propose_citations
+from citation_tracker import CitationTracker
+
+
+def _code(prefix, count):
+    return "\n".join(f"{prefix}_{i} = compute_{prefix}(value_{i}, {i * 7})" for i in range(count))
+
+
+SNIPPET = "\n".join([
+    "def merge_sorted(left, right):",
+    "    result = []",
+    "    i = j = 0",
+    "    while i < len(left) and j < len(right):",
+    "        if left[i] <= right[j]:",
+    "            result.append(left[i]); i += 1",
+    "        else:",
+    "            result.append(right[j]); j += 1",
+    "    result.extend(left[i:])",
+    "    result.extend(right[j:])",
+    "    return result",
+])
+
+
+class TestFingerprints(unittest.TestCase):
+    """Test cases for fingerprinting."""
+
+    def test_reformatted_copy_matches(self):
+        """Test that re-indented copies with blank lines share fingerprints."""
+        reformatted = "\n\n".join("  " + line.replace("    ", "\t") for line in SNIPPET.split("\n"))
+        original = {value for value, _, _ in fingerprint(SNIPPET.encode())}
+        copied = fingerprint(reformatted.encode())
+        self.assertTrue(original)
+        self.assertTrue(original & {value for value, _, _ in copied})
+        self.assertTrue(all(first <= last for _, first, last in copied))
+
+    def test_short_input(self):
+        """Test that inputs shorter than a k-gram have no fingerprints."""
+        self.assertEqual(fingerprint(b"x = 1\n}\n"), [])
+        self.assertEqual(len(fingerprint(b"alpha = 1\nbeta = 2\ngamma = 3\n")), 1)
+
+
+class TestFingerprintIndex(unittest.TestCase):
+    """Test cases for FingerprintIndex class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        self.index_path = os.path.join(self.project_path, FINGERPRINT_INDEX_FILE_NAME)
+
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+
+    def _write(self, name, text):
+        path = os.path.join(self.project_path, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_match_line_range(self):
+        """Test that a pasted snippet is found with its line range."""
+        index = FingerprintIndex()
+        index.add_snippet("merge", SNIPPET)
+        for i in range(20):
+            index.add_snippet(f"other-{i}", _code(f"other{i}", 30))
+        data = (_code("before", 20) + "\n" + SNIPPET + "\n" + _code("after", 20)).encode()
+
+        matches = index.match(data)
+        self.assertEqual([match["source_id"] for match in matches], ["merge"])
+        self.assertGreaterEqual(matches[0]["line_start"], 21)
+        self.assertLessEqual(matches[0]["line_end"], 31)
+        self.assertGreaterEqual(matches[0]["line_end"] - matches[0]["line_start"], 5)
+        self.assertEqual(index.match(_code("unrelated", 50).encode()), [])
+
+    def test_save_load_and_replace(self):
+        """Test persistence, unchanged re-adds and replacing a reference."""
+        index = FingerprintIndex(self.index_path)
+        self.assertGreater(index.add_snippet("merge", SNIPPET, origin="merge.py"), 0)
+        self.assertEqual(index.add_snippet("merge", SNIPPET, origin="merge.py"), 0)
+        index.add_snippet("numbers", _code("n", 40))
+        index.save()
+
+        loaded = FingerprintIndex(self.index_path)
+        self.assertEqual(len(loaded), len(index))
+        self.assertEqual(loaded.match(SNIPPET.encode())[0]["origins"], ["merge.py"])
+        loaded.add_snippet("merge", _code("changed", 20), origin="merge.py")
+        self.assertEqual(loaded.match(SNIPPET.encode()), [])
+        loaded.save()
+        self.assertEqual(FingerprintIndex(self.index_path).origins(), loaded.origins())
+
+    def test_propose_citations(self):
+        """Test proposals for matching files, skipping cited and reference files."""
+        reference = self._write("reference.py", SNIPPET)
+        self._write("copied.py", _code("head", 10) + "\n" + SNIPPET)
+        self._write("cited.py", SNIPPET)
+        self._write("plain.py", _code("plain", 40))
+        tracker = CitationTracker(self.project_path)
+        tracker.add_source(source_id="merge", name="Merge recipe")
+        tracker.cite_in_file(os.path.join(self.project_path, "cited.py"), "merge",
+                             line_start=1, line_end=11)
+        index = FingerprintIndex(self.index_path)
+        index.add_file("merge", reference)
+
+        proposals = propose_citations(tracker, index, workers=1)
+        self.assertEqual([proposal["file_path"] for proposal in proposals], ["copied.py"])
+        self.assertEqual(proposals[0]["source_ids"], ["merge"])
+        tracker.cite_many(proposals)
+        self.assertEqual(propose_citations(tracker, index, workers=1), [])
+
+    def test_command_line(self):
+        """Test attaching a reference and applying the proposals."""
+        self._write("copied.py", SNIPPET)
+        reference_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(reference_dir.cleanup)
+        with open(os.path.join(reference_dir.name, "merge.py"), "w") as f:
+            f.write(SNIPPET)
+        CitationTracker(self.project_path).add_source(source_id="merge", name="Merge recipe")
+
+        self.assertEqual(main(["attach", "merge", reference_dir.name, "--project", self.project_path]), 0)
+        self.assertEqual(main(["scan", self.project_path, "-j", "1"]), 1)
+        self.assertEqual(main(["scan", self.project_path, "-j", "1", "--apply"]), 0)
+        self.assertIn("copied.py", CitationTracker(self.project_path).citations["file_citations"])
+        self.assertEqual(main(["scan", self.project_path, "-j", "1"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Unit tests for the citation_metrics module.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_metrics import HISTOGRAM_BOUNDS_MS, TrackerMetrics
+from citation_tracker import CitationTracker
+
+
+class TestTrackerMetrics(unittest.TestCase):
+    """Test cases for TrackerMetrics class."""
+
+    def test_record(self):
+        """Test counters, histogram buckets and byte totals."""
+        metrics = TrackerMetrics()
+        metrics.record("save", 0.002, bytes_written=100)
+        metrics.record("save", 0.0000001, bytes_written=50)
+        metrics.record("load", 10.0, bytes_read=7)
+
+        stats = metrics.stats()
+        save = stats["operations"]["save"]
+        self.assertEqual(save["count"], 2)
+        self.assertAlmostEqual(save["max_ms"], 2.0)
+        self.assertAlmostEqual(save["mean_ms"], (2.0 + 0.0001) / 2)
+        self.assertEqual(save["bytes_written"], 150)
+        self.assertEqual(save["histogram"][0], 1)
+        self.assertEqual(save["histogram"][HISTOGRAM_BOUNDS_MS.index(5.0)], 1)
+        self.assertEqual(stats["operations"]["load"]["histogram"][-1], 1)
+        self.assertEqual((stats["bytes_read"], stats["bytes_written"]), (7, 150))
+
+        metrics.reset()
+        self.assertEqual(metrics.stats()["operations"], {})
+
+    def test_observers(self):
+        """Test that observers see every event and cannot break recording."""
+        events = []
+
+        def failing(event):
+            raise RuntimeError("observer failure")
+
+        metrics = TrackerMetrics(observers=[failing])
+        metrics.add_observer(events.append)
+        metrics.record("add_source", 0.001)
+        metrics.remove_observer(events.append)
+        metrics.record("add_source", 0.001)
+
+        self.assertEqual(events, [{"operation": "add_source", "seconds": 0.001,
+                                   "bytes_read": 0, "bytes_written": 0}])
+        self.assertEqual(metrics.stats()["operations"]["add_source"]["count"], 2)
+
+
+class TestTrackerInstrumentation(unittest.TestCase):
+    """Test cases for the metrics collected by CitationTracker."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        self.file_path = os.path.join(self.project_path, "a.py")
+
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+
+    def _exercise(self, tracker):
+        tracker.add_source(source_id="lib", name="Library", license_type="MIT")
+        tracker.cite_in_file(self.file_path, "lib", line_start=1, line_end=3)
+        tracker.insert_attribution_header(self.file_path)
+        tracker.export_citations_markdown()
+
+    def test_operations_recorded(self):
+        """Test that tracker and store operations are timed and bytes counted."""
+        CitationTracker(self.project_path).add_source(source_id="old", name="Old")
+        size = os.path.getsize(os.path.join(self.project_path, "citations.json"))
+        tracker = CitationTracker(self.project_path, metrics=True)
+        self._exercise(tracker)
+
+        stats = tracker.stats()
+        operations = stats["operations"]
+        for operation in ("load", "read", "parse", "add_source", "cite_in_file", "relative_path",
+                          "save", "serialize", "write", "attribution_header", "markdown",
+                          "export_markdown"):
+            self.assertIn(operation, operations)
+        self.assertEqual(operations["save"]["count"], 2)
+        self.assertEqual(stats["bytes_read"], size)
+        self.assertEqual(stats["bytes_written"], operations["write"]["bytes_written"])
+        self.assertGreater(stats["bytes_written"], size)
+        self.assertEqual(sum(operations["save"]["histogram"]), 2)
+
+    def test_journal_bytes(self):
+        """Test that journal appends count the bytes written."""
+        tracker = CitationTracker(self.project_path, journal=True, metrics=True)
+        self._exercise(tracker)
+        operations = tracker.stats()["operations"]
+        self.assertEqual(operations["append_journal"]["count"], 1)
+        self.assertEqual(operations["append_journal"]["bytes_written"],
+                         os.path.getsize(os.path.join(self.project_path, "citations.journal")))
+
+    def test_shared_and_disabled_metrics(self):
+        """Test sharing metrics between trackers and the disabled default."""
+        metrics = TrackerMetrics()
+        first = CitationTracker(self.project_path, metrics=metrics)
+        first.add_source(source_id="lib", name="Library")
+        CitationTracker(self.project_path, metrics=metrics)
+        self.assertEqual(metrics.stats()["operations"]["load"]["count"], 2)
+
+        tracker = CitationTracker(self.project_path)
+        self._exercise(tracker)
+        self.assertIsNone(tracker.metrics)
+        self.assertEqual(tracker.stats()["operations"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
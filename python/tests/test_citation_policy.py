@@ -0,0 +1,175 @@
+"""
+Unit tests for the citation_policy module.
+"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_policy import (COMPATIBILITY, LICENSES, LicensePolicy, main, normalize_license,
+                             parse_license)
+from citation_tracker import CitationTracker
+
+
+class TestLicenseNormalization(unittest.TestCase):
+    """Test cases for SPDX normalization."""
+
+    def test_normalize_license(self):
+        """Test common spellings, expressions and unknown licenses."""
+        cases = {
+            "MIT License": "MIT",
+            "The MIT License": "MIT",
+            "Apache 2.0": "Apache-2.0",
+            "Apache License, Version 2.0": "Apache-2.0",
+            "apache-2.0": "Apache-2.0",
+            "GPLv3": "GPL-3.0-only",
+            "GPLv2+": "GPL-2.0-or-later",
+            "GNU General Public License v3.0 or later": "GPL-3.0-or-later",
+            "LGPL v2.1": "LGPL-2.1-only",
+            "CC BY-SA 4.0": "CC-BY-SA-4.0",
+            "BSD 3-Clause": "BSD-3-Clause",
+            "BSD (3-clause)": "BSD-3-Clause",
+            "MIT OR Apache 2.0": "MIT OR Apache-2.0",
+            "(MIT OR Apache-2.0) AND BSD-2-Clause": "(MIT OR Apache-2.0) AND BSD-2-Clause",
+            "GPL-2.0+ WITH Classpath-exception-2.0": "GPL-2.0-or-later WITH Classpath-exception-2.0",
+            "Proprietary, internal use": "LicenseRef-Proprietary-internal-use",
+            "MIT AND": "LicenseRef-MIT-AND",
+        }
+        for text, expected in cases.items():
+            self.assertEqual(normalize_license(text), expected, text)
+        self.assertIsNone(normalize_license(None))
+        self.assertIsNone(normalize_license("  "))
+        for spdx_id in LICENSES:
+            self.assertEqual(normalize_license(spdx_id), spdx_id)
+        self.assertEqual(parse_license("MIT OR ISC AND Zlib"), ("OR", ("MIT", ("AND", ("ISC", "Zlib")))))
+
+    def test_compatibility(self):
+        """Test the precomputed compatibility matrix."""
+        self.assertIn("GPL-3.0-only", COMPATIBILITY["GPL-3.0-or-later"])
+        self.assertIn("Apache-2.0", COMPATIBILITY["GPL-3.0-only"])
+        self.assertNotIn("Apache-2.0", COMPATIBILITY["GPL-2.0-only"])
+        self.assertNotIn("GPL-2.0-only", COMPATIBILITY["GPL-3.0-only"])
+        self.assertIn("GPL-2.0-or-later", COMPATIBILITY["GPL-3.0-only"])
+        self.assertNotIn("GPL-3.0-only", COMPATIBILITY["MIT"])
+        self.assertIn("CC-BY-SA-4.0", COMPATIBILITY["GPL-3.0-only"])
+        for project_license in LICENSES:
+            self.assertIn("MIT", COMPATIBILITY[project_license])
+
+
+class TestLicensePolicy(unittest.TestCase):
+    """Test cases for LicensePolicy verdicts."""
+
+    def test_verdicts(self):
+        """Test deny and allow rules, categories, compatibility and unknowns."""
+        policy = LicensePolicy(deny=["strong-copyleft", "WTFPL"], project_license="MIT")
+        self.assertEqual(policy.verdict("MIT License")[0], "allow")
+        self.assertEqual(policy.verdict("GPLv3"), ("deny", "GPL-3.0-only is denied"))
+        self.assertEqual(policy.verdict("WTFPL")[0], "deny")
+        self.assertEqual(policy.verdict("AGPL-3.0")[0], "deny")
+        self.assertEqual(policy.verdict("Proprietary")[0], "review")
+        self.assertEqual(policy.verdict(None), ("review", "no license recorded"))
+        self.assertEqual(policy.verdict("MIT OR GPL-3.0-only")[0], "allow")
+        self.assertEqual(policy.verdict("MIT AND GPL-3.0-only")[0], "deny")
+
+        policy = LicensePolicy(allow=["permissive"], unknown="deny")
+        self.assertEqual(policy.verdict("Apache 2.0")[0], "allow")
+        self.assertEqual(policy.verdict("MPL-2.0"), ("deny", "MPL-2.0 is not allowed"))
+        self.assertEqual(policy.verdict(None)[0], "deny")
+
+        policy = LicensePolicy(project_license="GPLv2")
+        self.assertEqual(policy.verdict("Apache-2.0"),
+                         ("deny", "Apache-2.0 is incompatible with GPL-2.0-only"))
+
+        with self.assertRaises(ValueError):
+            LicensePolicy(project_license="Proprietary")
+        with self.assertRaises(ValueError):
+            LicensePolicy(unknown="maybe")
+
+
+class TestPolicyEvaluation(unittest.TestCase):
+    """Test cases for evaluating a policy over a tracker's citations."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        self.tracker = CitationTracker(self.project_path)
+        self.tracker.add_source(source_id="mit", name="MIT lib", license_type="MIT License")
+        self.tracker.add_source(source_id="gpl", name="GPL lib", license_type="GPLv3")
+        self.tracker.add_source(source_id="odd", name="Odd lib", license_type="Custom terms")
+        self.tracker.cite_in_file(self._path("src/a.py"), "mit")
+        self.tracker.cite_in_file(self._path("src/b.py"), ["mit", "gpl"])
+        self.tracker.cite_in_file(self._path("src/util/c.py"), "odd")
+        self.tracker.cite_in_file(self._path("README.md"), "mit")
+
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+
+    def _path(self, relative_path):
+        return os.path.join(self.project_path, *relative_path.split("/"))
+
+    def test_file_and_directory_results(self):
+        """Test per-file verdicts, directory rollups and the report."""
+        evaluation = self.tracker.evaluate_license_policy(LicensePolicy(project_license="MIT"))
+        self.assertEqual(evaluation.file_statuses(), {"src/a.py": "allow", "src/b.py": "deny",
+                                                      "src/util/c.py": "review", "README.md": "allow"})
+        directories = evaluation.directories()
+        self.assertEqual(directories["."], {"allow": 2, "review": 1, "deny": 1, "status": "deny"})
+        self.assertEqual(directories["src/util"], {"allow": 0, "review": 1, "deny": 0, "status": "review"})
+        self.assertFalse(evaluation.passed)
+        self.assertEqual(evaluation.violations(),
+                         {"src/b.py": ["gpl: GPL-3.0-only is incompatible with MIT"]})
+        self.assertEqual(evaluation.explain("src/b.py")["mit"],
+                         {"license": "MIT", "status": "allow", "reason": "MIT"})
+        report = json.loads(json.dumps(evaluation.report()))
+        self.assertEqual(sorted(report["violations"]), ["src/b.py", "src/util/c.py"])
+
+    def test_incremental_updates(self):
+        """Test that only the files citing a changed source are re-evaluated."""
+        evaluation = self.tracker.evaluate_license_policy(LicensePolicy(deny=["strong-copyleft"]))
+        evaluated = evaluation.files_evaluated
+
+        self.tracker.add_source(source_id="gpl", name="GPL lib", license_type="LGPL-3.0")
+        self.assertEqual(evaluation.files_evaluated - evaluated, 1)
+        self.assertTrue(evaluation.passed)
+
+        # Same verdict: nothing to re-evaluate
+        evaluated = evaluation.files_evaluated
+        self.tracker.add_source(source_id="mit", name="MIT lib", license_type="ISC")
+        self.assertEqual(evaluation.files_evaluated, evaluated)
+
+        self.tracker.cite_in_file(self._path("src/util/c.py"), "gpl")
+        self.tracker.add_source(source_id="gpl", name="GPL lib", license_type="GPL-2.0")
+        self.assertEqual(evaluation.files_evaluated - evaluated, 3)
+        self.assertEqual(evaluation.file_status("src/util/c.py"), "deny")
+        self.assertEqual(evaluation.directories()["src"]["deny"], 2)
+
+        self.tracker.rebase_citations("--- a/src/b.py\n+++ /dev/null\n@@ -1,2 +0,0 @@\n-x\n-y\n")
+        self.assertIsNone(evaluation.file_status("src/b.py"))
+        self.assertEqual(evaluation.directories()["src"]["deny"], 1)
+
+        # A rolled back batch restores the previous verdicts
+        with self.assertRaises(RuntimeError):
+            with self.tracker.batch():
+                self.tracker.add_source(source_id="odd", name="Odd lib", license_type="GPL-3.0")
+                raise RuntimeError("abort")
+        self.assertEqual(evaluation.file_statuses(), {"src/a.py": "allow", "src/util/c.py": "deny",
+                                                      "README.md": "allow"})
+
+    def test_main(self):
+        """Test the command line exit status."""
+        with redirect_stdout(StringIO()) as output:
+            self.assertEqual(main([self.project_path, "--project-license", "MIT"]), 1)
+        self.assertIn("src/b.py: deny", output.getvalue())
+        with redirect_stdout(StringIO()):
+            self.assertEqual(main([self.project_path, "--deny", "network-copyleft"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
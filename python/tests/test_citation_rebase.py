@@ -0,0 +1,190 @@
+"""
+Unit tests for the citation_rebase module.
+"""
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_rebase import LineMapper, parse_unified_diff
+from citation_tracker import CitationTracker
+
+
+DIFF = """diff --git a/a.py b/a.py
+index 1111111..2222222 100644
+--- a/a.py
++++ b/a.py
+@@ -2,0 +3,2 @@ def f():
++    inserted = 1
++    inserted = 2
+@@ -10,3 +12 @@ def g():
+-    removed = 1
+-    removed = 2
+-    removed = 3
++    replaced = 1
+diff --git a/old.py b/new.py
+similarity index 100%
+rename from old.py
+rename to new.py
+diff --git a/gone.py b/gone.py
+deleted file mode 100644
+index 3333333..0000000
+--- a/gone.py
++++ /dev/null
+@@ -1,2 +0,0 @@
+-line 1
+-line 2
+"""
+
+# git quotes non-ASCII names as octal escapes of their UTF-8 bytes
+QUOTED_DIFF = r"""diff --git "a/caf\303\251.py" "b/caf\303\251.py"
+--- "a/caf\303\251.py"
++++ "b/caf\303\251.py"
+@@ -0,0 +1 @@
++inserted
+diff --git "a/\303\274ber.py" "b/na\303\257ve.py"
+similarity index 100%
+rename from "\303\274ber.py"
+rename to "na\303\257ve.py"
+"""
+
+
+class TestDiffParsing(unittest.TestCase):
+    """Test cases for diff parsing and line mapping."""
+
+    def test_parse_unified_diff(self):
+        """Test that files, renames and deletions are recognised."""
+        files = parse_unified_diff(DIFF)
+        self.assertEqual([(f.old_path, f.new_path) for f in files],
+                         [("a.py", "a.py"), ("old.py", "new.py"), ("gone.py", None)])
+        self.assertEqual(len(files[0].hunks), 2)
+        self.assertEqual([(f.old_path, f.new_path) for f in parse_unified_diff(QUOTED_DIFF)],
+                         [("caf\u00e9.py", "caf\u00e9.py"), ("\u00fcber.py", "na\u00efve.py")])
+        
+    def test_line_mapper(self):
+        """Test mapping old line numbers through insertions and replacements."""
+        mapper = LineMapper(parse_unified_diff(DIFF)[0].hunks)
+        self.assertEqual(mapper.map_line(1), 1)
+        self.assertEqual(mapper.map_line(2), 2)
+        self.assertEqual(mapper.map_line(3), 5)
+        self.assertIsNone(mapper.map_line(11))
+        self.assertEqual(mapper.map_line(13), 13)
+        self.assertEqual(mapper.map_range(1, 20), (1, 20))
+        self.assertEqual(mapper.map_range(8, 11), (10, 11))
+        self.assertIsNone(mapper.map_range(10, 12))
+
+
+class TestRebaseCitations(unittest.TestCase):
+    """Test cases for rebasing tracker citations."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        self.tracker = CitationTracker(self.project_path)
+        
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+        
+    def _cite(self, name, line_start=None, line_end=None):
+        self.tracker.cite_in_file(os.path.join(self.project_path, name), "src",
+                                  line_start=line_start, line_end=line_end)
+        
+    def test_rebase_citations(self):
+        """Test shifting, shrinking, dropping, renaming and deleting."""
+        self._cite("a.py", 3, 5)
+        self._cite("a.py", 9, 11)
+        self._cite("a.py", 10, 12)
+        self._cite("a.py")
+        self._cite("old.py", 1, 2)
+        self._cite("gone.py", 1, 2)
+        self._cite("untouched.py", 1, 2)
+        
+        stats = self.tracker.rebase_citations(DIFF)
+        
+        file_citations = self.tracker.citations["file_citations"]
+        self.assertEqual([(c.get("line_start"), c.get("line_end")) for c in file_citations["a.py"]],
+                         [(5, 7), (11, 11), (None, None)])
+        self.assertNotIn("old.py", file_citations)
+        self.assertEqual(file_citations["new.py"][0]["line_start"], 1)
+        self.assertNotIn("gone.py", file_citations)
+        self.assertEqual(file_citations["untouched.py"][0]["line_end"], 2)
+        self.assertEqual(stats, {"files": 3, "shifted": 1, "shrunk": 1, "dropped": 2})
+        
+    def test_rebase_non_ascii_paths(self):
+        """Test that quoted non-ASCII paths match the stored keys."""
+        self._cite("caf\u00e9.py", 1, 2)
+        self._cite("\u00fcber.py", 3, 4)
+        
+        stats = self.tracker.rebase_citations(QUOTED_DIFF)
+        
+        file_citations = self.tracker.citations["file_citations"]
+        self.assertEqual(file_citations["caf\u00e9.py"][0]["line_start"], 2)
+        self.assertEqual(file_citations["na\u00efve.py"][0]["line_start"], 3)
+        self.assertNotIn("\u00fcber.py", file_citations)
+        self.assertEqual(stats["files"], 2)
+        
+    def test_rebase_open_ended_at_end_of_file(self):
+        """Test that an open-ended citation of deleted trailing lines is dropped."""
+        self._cite("a.py", 8)
+        self._cite("a.py", 5)
+
+        stats = self.tracker.rebase_citations(
+            "--- a/a.py\n+++ b/a.py\n@@ -8,3 +7,0 @@\n-x = 8\n-x = 9\n-x = 10\n")
+
+        self.assertEqual([c["line_start"] for c in self.tracker.citations["file_citations"]["a.py"]],
+                         [5])
+        self.assertEqual(stats["dropped"], 1)
+
+    def test_rebase_recorded_before(self):
+        """Test that citations recorded after the cutoff keep their lines."""
+        self._cite("a.py", 3, 5)
+        time.sleep(0.01)
+        cutoff = datetime.now().isoformat()
+        time.sleep(0.01)
+        self._cite("a.py", 5, 7)
+        
+        stats = self.tracker.rebase_citations(DIFF, recorded_before=cutoff)
+        
+        self.assertEqual([(c["line_start"], c["line_end"]) for c in self.tracker.citations["file_citations"]["a.py"]],
+                         [(5, 7), (5, 7)])
+        self.assertEqual(stats["shifted"], 1)
+        
+    @unittest.skipUnless(shutil.which("git"), "git is not installed")
+    def test_rebase_citations_from_git(self):
+        """Test rebasing against the changes between two commits."""
+        def git(*args, date=None):
+            env = dict(os.environ, GIT_COMMITTER_DATE=date) if date else None
+            subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com",
+                            *args], cwd=self.project_path, check=True, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            
+        file_path = os.path.join(self.project_path, "a.py")
+        with open(file_path, "w") as f:
+            f.write("".join(f"line {i}\n" for i in range(1, 11)))
+        git("init")
+        git("add", "a.py")
+        git("commit", "-m", "first", date="2000-01-01T00:00:00")
+        with open(file_path, "w") as f:
+            f.write("header\n" + "".join(f"line {i}\n" for i in range(1, 11)))
+        git("commit", "-am", "second")
+        
+        self._cite("a.py", 4, 6)
+        self.tracker.rebase_citations_from_git("HEAD~1")
+        citation = self.tracker.citations["file_citations"]["a.py"][0]
+        self.assertEqual((citation["line_start"], citation["line_end"]), (5, 7))
+        
+        # Recorded after HEAD~1 was committed, so it already matches HEAD
+        stats = self.tracker.rebase_citations_from_git("HEAD~1", only_older=True)
+        self.assertEqual(stats["shifted"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
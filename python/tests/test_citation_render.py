@@ -0,0 +1,78 @@
+"""
+Unit tests for the citation_render module.
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_tracker import CitationTracker
+
+
+class TestRenderCache(unittest.TestCase):
+    """Test cases for cached Markdown rendering."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        self.tracker = CitationTracker(self.project_path, render_cache=True)
+        self.tracker.add_source(source_id="a", name="Source A")
+        self.tracker.add_source(source_id="b", name="Source B")
+        self.tracker.cite_in_file("a.py", "a")
+        self.tracker.cite_in_file("b.py", "b")
+        
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+        
+    def _export(self):
+        cache = self.tracker._fragment_cache
+        hits, misses = cache.hits, cache.misses
+        content = self.tracker.generate_citations_markdown()
+        self.assertEqual(content, CitationTracker(self.project_path).generate_citations_markdown())
+        return content, (cache.hits - hits, cache.misses - misses)
+        
+    def test_rerun_only_renders_changed_entries(self):
+        """Test that later exports reuse the fragments of unchanged entries."""
+        self.assertEqual(self._export()[1], (0, 4))
+        self.assertEqual(self._export()[1], (4, 0))
+        
+        self.tracker.cite_in_file("a.py", "b", line_start=3, line_end=4)
+        self.assertEqual(self._export()[1], (3, 1))
+        
+        # Renaming a source dirties it and every file fragment
+        self.tracker.add_source(source_id="b", name="Source B, renamed")
+        content, counts = self._export()
+        self.assertEqual(counts, (1, 3))
+        self.assertIn("- Uses: Source B, renamed", content)
+        self.assertFalse([name for name in os.listdir(self.project_path) if "render" in name])
+        
+    def test_warm_cache_is_faster(self):
+        """Test that a warm cache beats rendering everything."""
+        with self.tracker.batch():
+            for i in range(300):
+                self.tracker.add_source(source_id=f"s{i}", name=f"Source {i}", author="Author",
+                                        url=f"https://example.com/{i}", license_type="MIT")
+            for i in range(6000):
+                self.tracker.cite_in_file(f"src/f{i // 3}.py", [f"s{i % 300}", "a"],
+                                          line_start=i, line_end=i + 2, comment="adapted")
+        uncached = CitationTracker(self.project_path)
+        self.tracker.generate_citations_markdown()
+        
+        def best_time(tracker):
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                tracker.generate_citations_markdown()
+                timings.append(time.perf_counter() - started)
+            return min(timings)
+            
+        self.assertLess(best_time(self.tracker), best_time(uncached) / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
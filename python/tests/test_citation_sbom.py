@@ -0,0 +1,136 @@
+"""
+Unit tests for the citation_sbom module.
+"""
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_sbom import write_sbom
+from citation_tracker import CitationTracker
+
+
+class TestCitationSbom(unittest.TestCase):
+    """Test cases for the SPDX and CycloneDX exporters."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        self.file_path = os.path.join(self.project_path, "src", "a.py")
+        os.makedirs(os.path.dirname(self.file_path))
+        with open(self.file_path, "w") as f:
+            f.write("one\ntwo\nthree\n")
+
+        self.tracker = CitationTracker(self.project_path)
+        with self.tracker.batch():
+            self.tracker.add_source(source_id="requests", name="Requests", url="https://example.com/requests",
+                                    author="Kenneth Reitz", license_type="Apache License, Version 2.0",
+                                    description="HTTP library")
+            self.tracker.add_source(source_id="snippet", name="Forum answer", license_type="Custom terms")
+            self.tracker.cite_in_file(self.file_path, "requests", line_start=2, line_end=3, comment="session")
+            self.tracker.cite_in_file(self.file_path, ["requests", "snippet"])
+        self.checkpoint = self.tracker.citations["sources"]["snippet"]["added_at"]
+        with self.tracker.batch():
+            self.tracker.add_source(source_id="later", name="Later", license_type="MIT")
+            self.tracker.cite_in_file(os.path.join(self.project_path, "b.py"), ["later", "snippet"])
+
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+
+    def _export(self, sbom_format, since=None):
+        output = io.StringIO()
+        self.tracker.write_sbom(output, sbom_format, since=since)
+        return output.getvalue()
+
+    def test_spdx_json(self):
+        """Test packages, files, snippets and relationships of the SPDX JSON document."""
+        document = json.loads(self._export("spdx-json"))
+        self.assertEqual(document["spdxVersion"], "SPDX-2.3")
+        packages = {package["name"]: package for package in document["packages"]}
+        self.assertEqual(packages["Requests"]["licenseDeclared"], "Apache-2.0")
+        self.assertEqual(packages["Requests"]["downloadLocation"], "https://example.com/requests")
+        self.assertEqual(packages["Forum answer"]["licenseDeclared"], "LicenseRef-Custom-terms")
+        self.assertEqual(document["hasExtractedLicensingInfos"][0]["extractedText"], "Custom terms")
+
+        files = {spdx_file["fileName"]: spdx_file for spdx_file in document["files"]}
+        self.assertEqual(set(files), {"./src/a.py", "./b.py"})
+        self.assertEqual(files["./src/a.py"]["checksums"][0],
+                         {"algorithm": "SHA1", "checksumValue": hashlib.sha1(b"one\ntwo\nthree\n").hexdigest()})
+        # b.py does not exist on disk
+        self.assertEqual(files["./b.py"]["checksums"], [])
+        self.assertIn("not found", files["./b.py"]["comment"])
+
+        snippet, = document["snippets"]
+        self.assertEqual(snippet["ranges"][0]["startPointer"]["offset"], 5)
+        self.assertEqual(snippet["ranges"][0]["endPointer"]["offset"], 14)
+        self.assertEqual(snippet["ranges"][1]["endPointer"]["lineNumber"], 3)
+
+        relationships = {(r["spdxElementId"], r["relationshipType"], r["relatedSpdxElement"])
+                         for r in document["relationships"]}
+        requests_id = packages["Requests"]["SPDXID"]
+        self.assertIn((snippet["SPDXID"], "GENERATED_FROM", requests_id), relationships)
+        self.assertIn((files["./src/a.py"]["SPDXID"], "GENERATED_FROM", requests_id), relationships)
+        self.assertIn(("SPDXRef-DOCUMENT", "DESCRIBES", files["./b.py"]["SPDXID"]), relationships)
+
+    def test_spdx_tag_value(self):
+        """Test that files precede packages in the tag-value document."""
+        document = self._export("spdx")
+        self.assertTrue(document.startswith("SPDXVersion: SPDX-2.3\n"))
+        self.assertLess(document.index("FileName: ./src/a.py"), document.index("PackageName: Requests"))
+        self.assertIn("SnippetByteRange: 5:14\n", document)
+        self.assertIn("SnippetLineRange: 2:3\n", document)
+        self.assertIn("PackageLicenseDeclared: Apache-2.0\n", document)
+        self.assertIn("LicenseID: LicenseRef-Custom-terms\n", document)
+
+    def test_cyclonedx_json(self):
+        """Test the components and dependencies of the CycloneDX document."""
+        document = json.loads(self._export("cyclonedx-json"))
+        self.assertEqual((document["bomFormat"], document["specVersion"]), ("CycloneDX", "1.5"))
+        components = {component["bom-ref"]: component for component in document["components"]}
+        self.assertEqual(components["source:requests"]["licenses"], [{"license": {"id": "Apache-2.0"}}])
+        self.assertEqual(components["source:snippet"]["licenses"], [{"license": {"name": "Custom terms"}}])
+        self.assertEqual(components["file:src/a.py"]["hashes"][0]["alg"], "SHA-1")
+        self.assertIn({"name": "citation-tracker:citation", "value": "requests: lines 2-3 (session)"},
+                      components["file:src/a.py"]["properties"])
+        dependencies = {dependency["ref"]: dependency["dependsOn"] for dependency in document["dependencies"]}
+        self.assertEqual(dependencies["file:src/a.py"], ["source:requests", "source:snippet"])
+
+    def test_delta_export(self):
+        """Test exporting only what changed after a timestamp."""
+        document = json.loads(self._export("spdx-json", since=self.checkpoint))
+        self.assertEqual([spdx_file["fileName"] for spdx_file in document["files"]], ["./b.py"])
+        # The cited, unchanged source is included so relationships resolve
+        self.assertEqual(sorted(package["name"] for package in document["packages"]),
+                         ["Forum answer", "Later"])
+        self.assertEqual(document["snippets"], [])
+
+        document = json.loads(self._export("cyclonedx-json", since="2999-01-01T00:00:00"))
+        self.assertEqual((document["components"], document["dependencies"]), ([], []))
+
+        with self.assertRaises(ValueError):
+            self._export("spdx-json", since="yesterday")
+        with self.assertRaises(ValueError):
+            self._export("swid")
+
+    def test_export_sbom(self):
+        """Test writing an SBOM file without a project path for checksums."""
+        output_path = os.path.join(self.project_path, "sbom.cdx.json")
+        self.assertEqual(self.tracker.export_sbom(output_path, "cyclonedx-json"), output_path)
+        with open(output_path) as f:
+            self.assertEqual(len(json.load(f)["components"]), 5)
+
+        output = io.StringIO()
+        write_sbom(self.tracker.citations, output, "spdx-json")
+        self.assertEqual([spdx_file["checksums"] for spdx_file in json.loads(output.getvalue())["files"]],
+                         [[], []])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Unit tests for the citation_scan module.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_scan import SCAN_CACHE_FILE_NAME, ScanCache, list_project_files, parse_markers, scan_project
+from citation_tracker import CitationTracker
+
+
+class TestCitationScan(unittest.TestCase):
+    """Test cases for scanning attribution markers."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        self.tracker = CitationTracker(self.project_path)
+        self.tracker.add_source(source_id="a", name="Source A", url="https://a.example",
+                                author="Author A", license_type="MIT")
+        self.tracker.add_source(source_id="b", name="Source B")
+        
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+        
+    def _write(self, name, content, mode="w"):
+        path = os.path.join(self.project_path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, mode) as f:
+            f.write(content)
+        return path
+        
+    def test_parse_generated_markers(self):
+        """Test that the tracker's own comments and headers are recognised."""
+        path = self._write("a.py", "")
+        self.tracker.cite_in_file(path, ["a", "b"])
+        content = (self.tracker.insert_attribution_header(path) + "\n\nimport os\n\n"
+                   + self.tracker.generate_attribution_comment("a") + "\n")
+        markers = parse_markers(content.encode("utf-8"))
+        
+        self.assertEqual([(m["kind"], m["name"], m["url"]) for m in markers if m["kind"] == "comment"],
+                         [("comment", "Source A, by Author A", "https://a.example")])
+        self.assertEqual(sorted(m["name"] for m in markers if m["kind"] == "header"),
+                         ["Source A", "Source B"])
+        
+    def test_reports_drift_both_ways(self):
+        """Test detecting markers without records and records without markers."""
+        marked = self._write("src/marked.py", self.tracker.generate_attribution_comment("a") + "\n")
+        self.tracker.cite_in_file(marked, "a")
+        self._write("src/stray.py", "x = 1\n# Attribution: Source B\n")
+        unmarked = self._write("src/unmarked.py", "x = 1\n")
+        self.tracker.cite_in_file(unmarked, "b")
+        self.tracker.cite_in_file(os.path.join(self.project_path, "deleted.py"), "b")
+        self._write("blob.bin", b"\0\0# Attribution: Source B\n", mode="wb")
+        
+        report = scan_project(self.tracker, workers=1)
+        
+        self.assertFalse(report.ok)
+        self.assertEqual([(m["file"], m["line"], m["source_ids"]) for m in report.unrecorded],
+                         [("src/stray.py", 2, ["b"])])
+        self.assertEqual(report.unmarked, [{"file": "src/unmarked.py", "source_id": "b"}])
+        self.assertEqual(report.missing_files, ["deleted.py"])
+        self.assertEqual(report.skipped, ["blob.bin"])
+        
+    def test_clean_tree(self):
+        """Test that a tree whose markers match its records passes."""
+        path = self._write("a.py", "")
+        self.tracker.cite_in_file(path, "a")
+        self._write("a.py", self.tracker.insert_attribution_header(path) + "\n")
+        self._write("node_modules/dep/index.js", "// Attribution: Source B\n")
+        
+        self.assertNotIn("node_modules/dep/index.js", list_project_files(self.project_path))
+        self.assertTrue(scan_project(self.tracker, workers=1).ok)
+
+    def test_scan_cache_reads_only_changed_files(self):
+        """Test that a cached rescan skips unchanged files and spots edited ranges."""
+        path = self._write("a.py", "line 1\nline 2\nline 3\n")
+        self._write("b.py", "x = 1\n")
+        self.tracker.cite_in_file(path, "a", line_start=2, line_end=3)
+        cache_path = os.path.join(self.project_path, SCAN_CACHE_FILE_NAME)
+        
+        # Age the files so their mtimes are trusted by the cache
+        for name in ("a.py", "b.py"):
+            os.utime(os.path.join(self.project_path, name), (1000000000, 1000000000))
+        first = scan_project(self.tracker, workers=1, cache=ScanCache(cache_path))
+        self.assertEqual((first.files_scanned, first.files_cached), (2, 0))
+        
+        second = scan_project(self.tracker, workers=1, cache=ScanCache(cache_path))
+        self.assertEqual((second.files_scanned, second.files_cached), (0, 2))
+        self.assertEqual(second.unmarked, first.unmarked)
+        
+        self._write("a.py", "line 1\nline 2 edited\nline 3\n")
+        third = scan_project(self.tracker, workers=1, cache=ScanCache(cache_path))
+        self.assertEqual((third.files_scanned, third.files_cached), (1, 1))
+        self.assertEqual(third.changed_ranges, [{"file": "a.py", "line_start": 2, "line_end": 3}])
+        
+    def test_stale_headers(self):
+        """Test that headers are only regenerated when a file's citation set changes."""
+        a_path = self._write("a.py", "")
+        b_path = self._write("b.py", "")
+        self.tracker.cite_in_file(a_path, "a")
+        self.tracker.cite_in_file(b_path, "b")
+        cache = ScanCache()
+        
+        self.assertEqual(set(cache.stale_headers(self.tracker)), {"a.py", "b.py"})
+        self.assertEqual(cache.stale_headers(self.tracker), {})
+        
+        # Another citation of an already cited source changes nothing
+        self.tracker.cite_in_file(a_path, "a", line_start=5, line_end=6)
+        self.assertEqual(cache.stale_headers(self.tracker), {})
+        
+        self.tracker.cite_in_file(a_path, "b")
+        stale = cache.stale_headers(self.tracker)
+        self.assertEqual(list(stale), ["a.py"])
+        self.assertIn("Source B", stale["a.py"])
+
+
+if __name__ == "__main__":
+    unittest.main()
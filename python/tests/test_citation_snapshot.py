@@ -0,0 +1,107 @@
+"""
+Unit tests for the citation_snapshot module.
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_snapshot import SnapshotReader, SnapshotStore, main, read_snapshot, write_snapshot
+from citation_store import LazyMapping
+from citation_tracker import CitationTracker
+
+
+class TestCitationSnapshot(unittest.TestCase):
+    """Test cases for the compact snapshot format."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        self.snapshot_path = os.path.join(self.project_path, "citations.snap")
+        self.tracker = CitationTracker(self.project_path)
+        with self.tracker.batch():
+            for i in range(30):
+                self.tracker.add_source(source_id=f"s{i}", name=f"Source {i}",
+                                        license_type="MIT" if i % 2 else None)
+            for i in range(200):
+                self.tracker.cite_in_file(os.path.join(self.project_path, f"pkg/f{i % 40}.py"),
+                                          [f"s{i % 30}", f"s{(i + 7) % 30}"],
+                                          line_start=i, line_end=i + 9,
+                                          comment="Adapted é" if i % 5 == 0 else None)
+        
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+        
+    def test_round_trip(self):
+        """Test that a snapshot reads back exactly what was written."""
+        self.tracker.export_snapshot(self.snapshot_path)
+        restored = read_snapshot(self.snapshot_path)
+        self.assertEqual(restored, self.tracker.citations)
+        self.assertEqual(json.dumps(restored, indent=2),
+                         json.dumps(self.tracker.citations, indent=2))
+        self.assertLess(os.path.getsize(self.snapshot_path),
+                        os.path.getsize(self.tracker.citations_file) / 3)
+        
+    def test_unusual_values_round_trip(self):
+        """Test values that do not fit the compact encodings."""
+        citations = {
+            "project_info": {"name": "p", "created_at": "2024-01-02T03:04:05",
+                             "odd_time": "2024-01-02T03:04:05.000000",
+                             "zone": "2024-01-02T03:04:05+02:00", "big": 2 ** 70, "neg": -5,
+                             "ratio": 0.25, "flags": [True, False, None], "empty": {}},
+            "file_citations": {"a.py": [{"source_ids": ["missing"], "cited_at": "1969-12-31T23:59:59.5"}]},
+            "extra": "kept",
+        }
+        write_snapshot(citations, self.snapshot_path)
+        restored = read_snapshot(self.snapshot_path)
+        self.assertEqual(restored, citations)
+        self.assertEqual(list(restored), list(citations))
+        
+    def test_reader_decodes_on_demand(self):
+        """Test that the reader only decodes the entries that are used."""
+        self.tracker.export_snapshot(self.snapshot_path)
+        with SnapshotReader(self.snapshot_path) as reader:
+            self.assertEqual(len(reader.file_citations), 40)
+            self.assertEqual(reader.file_citations["pkg/f3.py"],
+                             self.tracker.citations["file_citations"]["pkg/f3.py"])
+            self.assertEqual(reader.file_citations.loaded_count, 1)
+            self.assertEqual(reader.citations["project_info"],
+                             self.tracker.citations["project_info"])
+        
+    def test_not_a_snapshot(self):
+        """Test that other files are rejected."""
+        with self.assertRaises(ValueError):
+            SnapshotReader(self.tracker.citations_file)
+        
+    def test_snapshot_store(self):
+        """Test using a snapshot as the tracker's store."""
+        tracker = CitationTracker(self.project_path, store=SnapshotStore(self.snapshot_path))
+        tracker.import_json(self.tracker.citations_file)
+        tracker.close()
+        
+        lazy = CitationTracker(self.project_path, store=SnapshotStore(self.snapshot_path), lazy=True)
+        self.assertIsInstance(lazy.citations["file_citations"], LazyMapping)
+        lazy.cite_in_file(os.path.join(self.project_path, "new.py"), "s1")
+        lazy.close()
+        
+        reloaded = CitationTracker(self.project_path, store=SnapshotStore(self.snapshot_path))
+        self.assertEqual(reloaded.citations["file_citations"]["pkg/f0.py"],
+                         self.tracker.citations["file_citations"]["pkg/f0.py"])
+        self.assertIn("new.py", reloaded.citations["file_citations"])
+        
+    def test_command_line_conversion(self):
+        """Test converting to a snapshot and back from the command line."""
+        json_path = os.path.join(self.project_path, "restored.json")
+        self.assertEqual(main([self.tracker.citations_file, self.snapshot_path]), 0)
+        self.assertEqual(main([self.snapshot_path, json_path]), 0)
+        with open(self.tracker.citations_file, "rb") as original, open(json_path, "rb") as restored:
+            self.assertEqual(restored.read(), original.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,342 @@
+"""
+Unit tests for the citation_store module.
+"""
+import os
+import stat
+import sys
+import json
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+# Add parent directory to python path to import the module under test
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from citation_store import CitationStore, FileLock, JsonStore, LazyMapping, SqliteStore
+from citation_tracker import CitationTracker
+
+
+class TestCitationStore(unittest.TestCase):
+    """Test cases for the storage backend interface."""
+
+    def test_incomplete_store_cannot_be_created(self):
+        """Test that a backend missing a required method fails on construction."""
+        class NoSaveStore(CitationStore):
+            def exists(self):
+                return False
+
+            def load(self):
+                return None
+
+        with self.assertRaises(TypeError):
+            NoSaveStore()
+
+
+class TestSqliteStore(unittest.TestCase):
+    """Test cases for the SQLite storage backend."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        self.db_path = os.path.join(self.project_path, "citations.db")
+        
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+        
+    def _tracker(self):
+        return CitationTracker(self.project_path, store=SqliteStore(self.db_path))
+        
+    def test_round_trip_through_tracker(self):
+        """Test that sources and citations survive a reload from SQLite."""
+        tracker = self._tracker()
+        tracker.add_source(source_id="a", name="Source A", license_type="MIT")
+        tracker.add_source(source_id="b", name="Source B")
+        tracker.cite_in_file(os.path.join(self.project_path, "a.py"), ["a", "b"],
+                             line_start=1, line_end=4, comment="Adapted")
+        tracker.add_source(source_id="a", name="Source A v2", license_type="MIT")
+        tracker.close()
+        
+        reloaded = self._tracker()
+        self.assertEqual(reloaded.citations, tracker.citations)
+        self.assertEqual(list(reloaded.citations["sources"]), ["a", "b"])
+        reloaded.close()
+        
+    def test_background_writer_thread(self):
+        """Test that a tracker's background writer can use the connection."""
+        tracker = CitationTracker(self.project_path, store=SqliteStore(self.db_path),
+                                  flush_interval_ms=10)
+        tracker.add_source(source_id="a", name="Source A")
+        for i in range(20):
+            tracker.cite_in_file(os.path.join(self.project_path, "a.py"), "a", line_start=i + 1)
+        deadline = time.monotonic() + 10
+        while tracker.flush_stats()["ops_flushed"] < 21 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        
+        reader = SqliteStore(self.db_path)
+        self.assertEqual(len(reader.load()["file_citations"]["a.py"]), 20)
+        reader.close()
+        tracker.close()
+        
+    def test_replaced_file_citations(self):
+        """Test that rewriting a file's citations replaces its rows."""
+        tracker = self._tracker()
+        file_path = os.path.join(self.project_path, "a.py")
+        tracker.cite_in_file(file_path, "a", line_start=1, line_end=5)
+        tracker.cite_in_file(file_path, "a", line_start=4, line_end=9)
+        tracker.coalesce_citations(file_path)
+        tracker.close()
+        
+        reloaded = self._tracker()
+        citations = reloaded.citations["file_citations"]["a.py"]
+        self.assertEqual([(c["line_start"], c["line_end"]) for c in citations], [(1, 9)])
+        count = reloaded.store._conn.execute("SELECT COUNT(*) FROM citation_sources").fetchone()
+        self.assertEqual(count, (1,))
+        reloaded.close()
+        
+    def test_indexed_rows(self):
+        """Test that citations are linked to each cited source."""
+        tracker = self._tracker()
+        tracker.add_source(source_id="a", name="Source A", license_type="MIT")
+        tracker.cite_in_file(os.path.join(self.project_path, "a.py"), ["a"])
+        tracker.cite_in_file(os.path.join(self.project_path, "b.py"), ["a"])
+        
+        conn = tracker.store._conn
+        files = conn.execute(
+            "SELECT c.file_path FROM citations c JOIN citation_sources s "
+            "ON s.citation_id = c.id WHERE s.source_id = ? ORDER BY c.id", ("a",)).fetchall()
+        self.assertEqual([row[0] for row in files], ["a.py", "b.py"])
+        licensed = conn.execute(
+            "SELECT source_id FROM sources WHERE license_type = ?", ("MIT",)).fetchall()
+        self.assertEqual(licensed, [("a",)])
+        tracker.close()
+        
+    def test_json_import_export(self):
+        """Test moving citations between the JSON format and SQLite."""
+        json_tracker = CitationTracker(self.project_path)
+        json_tracker.add_source(source_id="a", name="Source A")
+        json_tracker.cite_in_file(os.path.join(self.project_path, "a.py"), "a")
+        
+        tracker = self._tracker()
+        tracker.import_json(json_tracker.citations_file)
+        self.assertEqual(tracker.citations, json_tracker.citations)
+        
+        export_path = tracker.export_json(os.path.join(self.project_path, "export.json"))
+        with open(export_path, "r") as f:
+            self.assertEqual(json.load(f), json_tracker.citations)
+        tracker.close()
+
+        
+    def test_lazy_load(self):
+        """Test that a lazy load reads entries on demand."""
+        tracker = self._tracker()
+        tracker.add_source(source_id="a", name="Source A")
+        tracker.cite_in_file(os.path.join(self.project_path, "a.py"), "a", line_start=2)
+        tracker.cite_in_file(os.path.join(self.project_path, "b.py"), "a")
+        tracker.close()
+        
+        lazy = CitationTracker(self.project_path, store=SqliteStore(self.db_path), lazy=True)
+        file_citations = lazy.citations["file_citations"]
+        self.assertIsInstance(file_citations, LazyMapping)
+        self.assertEqual(list(file_citations), ["a.py", "b.py"])
+        self.assertEqual(file_citations.loaded_count, 0)
+        self.assertEqual(file_citations["a.py"][0]["line_start"], 2)
+        self.assertEqual(file_citations.loaded_count, 1)
+        self.assertEqual(lazy.citations, tracker.citations)
+        lazy.close()
+
+
+class TestLazyJsonStore(unittest.TestCase):
+    """Test cases for lazy loading of citations.json."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        tracker = CitationTracker(self.project_path)
+        with tracker.batch():
+            for i in range(20):
+                tracker.add_source(source_id=f"s{i}", name=f"Source \u00e9 {i}")
+                tracker.cite_in_file(os.path.join(self.project_path, f"f{i}.py"), f"s{i}",
+                                     line_start=i + 1, line_end=i + 3, comment="Multi\nline")
+        self.tracker = tracker
+        
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+        
+    def test_file_format_unchanged(self):
+        """Test that citations.json is still written as indented JSON."""
+        with open(self.tracker.citations_file, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), json.dumps(self.tracker.citations, indent=2))
+        
+    def test_lazy_load_matches_eager_load(self):
+        """Test that lazily loaded entries equal the eagerly loaded ones."""
+        index_path = os.path.join(self.project_path, "citations.index.json")
+        self.assertFalse(os.path.exists(index_path))
+        lazy = CitationTracker(self.project_path, lazy=True)
+        self.assertTrue(os.path.exists(index_path))
+        sources = lazy.citations["sources"]
+        self.assertIsInstance(sources, LazyMapping)
+        self.assertIn("s7", sources)
+        self.assertEqual(sources.loaded_count, 0)
+        self.assertEqual(sources["s7"]["name"], "Source \u00e9 7")
+        self.assertEqual(lazy.citations, self.tracker.citations)
+        lazy.close()
+        
+    def test_lazy_tracker_mutations(self):
+        """Test that a lazily opened tracker can be modified and saved."""
+        lazy = CitationTracker(self.project_path, lazy=True)
+        lazy.cite_in_file(os.path.join(self.project_path, "f3.py"), "s1")
+        lazy.cite_in_file(os.path.join(self.project_path, "new.py"), "s2")
+        self.assertEqual(sorted(lazy.files_citing("s2")), ["f2.py", "new.py"])
+        lazy.close()
+        
+        reloaded = CitationTracker(self.project_path)
+        self.assertEqual(len(reloaded.citations["file_citations"]["f3.py"]), 2)
+        self.assertEqual(reloaded.citations, lazy.citations)
+        
+    def test_stale_index_falls_back_to_full_load(self):
+        """Test that an index no longer matching the file is not used."""
+        with open(self.tracker.citations_file, "r", encoding="utf-8") as f:
+            citations = json.load(f)
+        del citations["sources"]["s0"]
+        with open(self.tracker.citations_file, "w", encoding="utf-8") as f:
+            json.dump(citations, f, indent=4)
+        
+        loaded = JsonStore(self.tracker.citations_file).load_lazy()
+        self.assertEqual(loaded, citations)
+        self.assertNotIsInstance(loaded["sources"], LazyMapping)
+        
+    def test_journal_replayed_over_lazy_load(self):
+        """Test that journaled records are applied on top of a lazy load."""
+        journaled = CitationTracker(self.project_path, journal=True)
+        journaled.add_source(source_id="j", name="Journaled")
+        
+        lazy = CitationTracker(self.project_path, lazy=True)
+        self.assertEqual(lazy.citations["sources"]["j"]["name"], "Journaled")
+        self.assertEqual(len(lazy.citations["sources"]), 21)
+        lazy.close()
+
+
+
+# Records citations from a separate process; argv: project, worker, count, journal
+_WRITER_SCRIPT = """
+import os, sys
+sys.path.insert(0, %r)
+from citation_tracker import CitationTracker
+project, worker, count, journal = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4] == "1"
+tracker = CitationTracker(project, journal=journal, journal_compact_threshold=4096)
+tracker.add_source(source_id="w" + worker, name="Writer " + worker)
+for i in range(count):
+    tracker.cite_in_file(os.path.join(project, "shared.py"), "w" + worker, line_start=i + 1)
+    tracker.cite_in_file(os.path.join(project, "w%%s.py" %% worker), "w" + worker, line_start=i + 1)
+""" % os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestConcurrentWriters(unittest.TestCase):
+    """Test cases for several processes writing one project."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+        
+    def _run_writers(self, workers, count, journal):
+        processes = [subprocess.Popen([sys.executable, "-c", _WRITER_SCRIPT, self.project_path,
+                                       str(worker), str(count), "1" if journal else "0"])
+                     for worker in range(workers)]
+        for process in processes:
+            self.assertEqual(process.wait(timeout=120), 0)
+        
+        citations = CitationTracker(self.project_path).citations
+        self.assertEqual(len(citations["sources"]), workers)
+        shared = citations["file_citations"]["shared.py"]
+        self.assertEqual(len(shared), workers * count)
+        for worker in range(workers):
+            lines = [c["line_start"] for c in shared if c["source_ids"] == [f"w{worker}"]]
+            self.assertEqual(lines, list(range(1, count + 1)))
+            self.assertEqual(len(citations["file_citations"][f"w{worker}.py"]), count)
+        
+    def test_concurrent_json_writers(self):
+        """Test that concurrent writers of the JSON file lose nothing."""
+        self._run_writers(4, 15, journal=False)
+        
+    def test_concurrent_journal_writers(self):
+        """Test that concurrent journal writers lose nothing, across compactions."""
+        self._run_writers(4, 40, journal=True)
+        
+    def test_tracker_picks_up_journal_records_of_other_writers(self):
+        """Test that a write merges records another tracker appended meanwhile."""
+        first = CitationTracker(self.project_path, journal=True)
+        second = CitationTracker(self.project_path, journal=True)
+        file_path = os.path.join(self.project_path, "a.py")
+        first.cite_in_file(file_path, "x", line_start=1)
+        second.cite_in_file(file_path, "y", line_start=2)
+        first.cite_in_file(file_path, "x", line_start=3)
+        
+        self.assertEqual(first.citations, CitationTracker(self.project_path).citations)
+        self.assertEqual(sorted(c["line_start"] for c in first.citations["file_citations"]["a.py"]),
+                         [1, 2, 3])
+        
+    @unittest.skipIf(os.name == "nt", "POSIX permissions")
+    def test_replaced_files_keep_permissions(self):
+        """Test that new files follow the umask and replaced ones keep their mode."""
+        plain_file = os.path.join(self.project_path, "plain")
+        with open(plain_file, "w"):
+            pass
+        tracker = CitationTracker(self.project_path)
+        tracker.add_source(source_id="a", name="Source A")
+        self.assertEqual(stat.S_IMODE(os.stat(tracker.citations_file).st_mode),
+                         stat.S_IMODE(os.stat(plain_file).st_mode))
+        
+        os.chmod(tracker.citations_file, 0o640)
+        tracker.add_source(source_id="b", name="Source B")
+        self.assertEqual(stat.S_IMODE(os.stat(tracker.citations_file).st_mode), 0o640)
+        self.assertFalse([name for name in os.listdir(self.project_path) if name.endswith(".tmp")])
+        
+    def test_lock_shared_between_threads(self):
+        """Test that threads sharing a lock wait for each other."""
+        lock = FileLock(os.path.join(self.project_path, "citations.lock"))
+        errors = []
+        
+        def bump():
+            try:
+                for _ in range(200):
+                    with lock.hold():
+                        with lock.hold(shared=True):
+                            generation = lock.generation()
+                        time.sleep(0)
+                        self.assertEqual(lock.bump_generation(), generation + 1)
+            except Exception as error:
+                errors.append(error)
+                
+        threads = [threading.Thread(target=bump) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        with lock.hold():
+            self.assertEqual(lock.generation(), 400)
+        
+    def test_unreadable_file_is_preserved(self):
+        """Test that a corrupt citations file is kept before being replaced."""
+        citations_file = os.path.join(self.project_path, "citations.json")
+        with open(citations_file, "w") as f:
+            f.write('{"sources": {"a": ')
+        tracker = CitationTracker(self.project_path)
+        tracker.add_source(source_id="b", name="Source B")
+        with open(citations_file + ".corrupt") as f:
+            self.assertEqual(f.read(), '{"sources": {"a": ')
+        self.assertIn("b", CitationTracker(self.project_path).citations["sources"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,12 +5,14 @@ import os
 import sys
 import json
 import tempfile
+import threading
 import unittest
 from datetime import datetime
 
 # Add parent directory to python path to import the module under test
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from citation_tracker import CitationTracker
+from citation_store import SqliteStore
+from citation_tracker import CitationTracker, canonical_file_key
 
 
 class TestCitationTracker(unittest.TestCase):
@@ -123,6 +125,425 @@ class TestCitationTracker(unittest.TestCase):
             self.assertIn("Test Source", content)
             self.assertIn("test_file.py", content)
 
+    def test_journal_mode_appends_and_replays(self):
+        """Test that journaled mutations survive a reload without a snapshot rewrite."""
+        tracker = CitationTracker(self.project_path, journal=True)
+        tracker.add_source(source_id="test-source", name="Test Source")
+        tracker.cite_in_file(
+            file_path=os.path.join(self.project_path, "test_file.py"),
+            source_ids="test-source",
+            line_start=1,
+            line_end=10
+        )
+        
+        # The citation went to the journal, not the snapshot
+        self.assertTrue(os.path.exists(tracker.journal_file))
+        with open(tracker.citations_file, "r") as f:
+            self.assertEqual(json.load(f)["file_citations"], {})
+        
+        reloaded = CitationTracker(self.project_path, journal=True)
+        self.assertEqual(reloaded.citations, tracker.citations)
+        
+        # A tracker without journaling still sees journaled records
+        self.assertEqual(CitationTracker(self.project_path).citations, tracker.citations)
+        
+    def test_journal_compaction(self):
+        """Test that compaction folds the journal into citations.json."""
+        tracker = CitationTracker(self.project_path, journal=True)
+        tracker.add_source(source_id="first-source", name="First Source")
+        tracker.add_source(source_id="test-source", name="Test Source")
+        self.assertTrue(os.path.exists(tracker.journal_file))
+        tracker.compact()
+        
+        self.assertFalse(os.path.exists(tracker.journal_file))
+        with open(tracker.citations_file, "r") as f:
+            self.assertIn("test-source", json.load(f)["sources"])
+            
+    def test_journal_compacts_past_threshold(self):
+        """Test that the journal is compacted automatically once it grows too large."""
+        tracker = CitationTracker(self.project_path, journal=True,
+                                  journal_compact_threshold=1)
+        tracker.add_source(source_id="first-source", name="First Source")
+        tracker.add_source(source_id="test-source", name="Test Source")
+        
+        self.assertFalse(os.path.exists(tracker.journal_file))
+        self.assertTrue(os.path.exists(tracker.citations_file))
+
+    def test_batch_defers_writes(self):
+        """Test that a batch writes the citations file once, on exit."""
+        with self.tracker.batch():
+            self.tracker.add_source(source_id="a", name="Source A")
+            self.tracker.add_source(source_id="b", name="Source B")
+            self.assertFalse(os.path.exists(self.tracker.citations_file))
+            
+        with open(self.tracker.citations_file, "r") as f:
+            self.assertEqual(set(json.load(f)["sources"]), {"a", "b"})
+        self.assertEqual(self.tracker.citations["sources"]["a"]["added_at"],
+                         self.tracker.citations["sources"]["b"]["added_at"])
+                         
+    def test_batch_rolls_back_on_error(self):
+        """Test that a failed batch leaves no trace in memory or on disk."""
+        self.tracker.add_source(source_id="a", name="Source A")
+        with self.assertRaises(RuntimeError):
+            with self.tracker.batch():
+                self.tracker.add_source(source_id="b", name="Source B")
+                raise RuntimeError("import failed")
+                
+        self.assertEqual(set(self.tracker.citations["sources"]), {"a"})
+        
+    def test_batch_rollback_restores_replaced_entries(self):
+        """Test that a failed batch restores changed sources and files."""
+        file_path = os.path.join(self.project_path, "a.py")
+        self.tracker.add_source(source_id="a", name="Source A")
+        self.tracker.cite_in_file(file_path, "a", line_start=1, line_end=5)
+        self.tracker.cite_in_file(file_path, "a", line_start=3, line_end=9)
+        before = json.loads(json.dumps(self.tracker.citations))
+        with self.assertRaises(RuntimeError):
+            with self.tracker.batch():
+                self.tracker.add_source(source_id="a", name="Renamed")
+                self.tracker.coalesce_citations(file_path)
+                self.tracker.cite_in_file(file_path, "a", line_start=20)
+                self.tracker.cite_in_file(os.path.join(self.project_path, "b.py"), "a")
+                raise RuntimeError("import failed")
+                
+        self.assertEqual(self.tracker.citations, before)
+        self.assertEqual(len(self.tracker.citations_at(file_path, 4)), 2)
+        
+    def test_bulk_methods_validate_before_applying(self):
+        """Test that bulk ingestion rejects the whole batch on a bad entry."""
+        with self.assertRaises(ValueError):
+            self.tracker.add_sources([
+                {"source_id": "a", "name": "Source A"},
+                {"source_id": "b"}
+            ])
+        self.assertEqual(self.tracker.citations["sources"], {})
+        
+        with self.assertRaises(ValueError):
+            self.tracker.cite_many([
+                {"file_path": "a.py", "source_ids": "a", "line_start": 5, "line_end": 1}
+            ])
+        self.assertEqual(self.tracker.citations["file_citations"], {})
+        
+    def test_bulk_methods(self):
+        """Test adding sources and citations in bulk."""
+        self.tracker.add_sources([
+            {"source_id": "a", "name": "Source A", "license_type": "MIT"},
+            {"source_id": "b", "name": "Source B"}
+        ])
+        self.tracker.cite_many([
+            {"file_path": os.path.join(self.project_path, "a.py"), "source_ids": "a"},
+            {"file_path": os.path.join(self.project_path, "a.py"), "source_ids": ["a", "b"],
+             "line_start": 1, "line_end": 3}
+        ])
+        
+        reloaded = CitationTracker(self.project_path)
+        self.assertEqual(reloaded.citations["sources"]["a"]["license_type"], "MIT")
+        self.assertEqual(len(reloaded.citations["file_citations"]["a.py"]), 2)
+
+    def test_files_citing(self):
+        """Test the reverse lookup from a source to the files that cite it."""
+        self.tracker.add_source(source_id="a", name="Source A")
+        self.tracker.cite_in_file(os.path.join(self.project_path, "a.py"), "a",
+                                  line_start=1, line_end=5)
+        self.assertEqual(self.tracker.files_citing("a"), {"a.py": [(1, 5)]})
+        
+        # Citations recorded after the index is built are picked up too
+        self.tracker.cite_in_file(os.path.join(self.project_path, "b.py"), ["a"])
+        self.assertEqual(self.tracker.files_citing("a"),
+                         {"a.py": [(1, 5)], "b.py": [(None, None)]})
+        self.assertEqual(self.tracker.files_citing("missing"), {})
+        
+    def test_files_with_license(self):
+        """Test finding the files affected by a license, including license changes."""
+        self.tracker.add_source(source_id="a", name="Source A", license_type="GPL-3.0")
+        self.tracker.add_source(source_id="b", name="Source B", license_type="MIT")
+        self.tracker.cite_in_file(os.path.join(self.project_path, "a.py"), ["a", "b"])
+        self.tracker.cite_in_file(os.path.join(self.project_path, "b.py"), "b")
+        self.assertEqual(self.tracker.files_with_license("GPL-3.0"), {"a.py"})
+        self.assertEqual(self.tracker.files_with_license("MIT"), {"a.py", "b.py"})
+        
+        self.tracker.add_source(source_id="b", name="Source B", license_type="Apache-2.0")
+        self.assertEqual(self.tracker.files_with_license("MIT"), set())
+        self.assertEqual(self.tracker.files_with_license("Apache-2.0"), {"a.py", "b.py"})
+
+    def test_citations_at_line(self):
+        """Test looking up the citations that cover a line."""
+        file_path = os.path.join(self.project_path, "a.py")
+        self.tracker.cite_in_file(file_path, "a", line_start=1, line_end=10)
+        self.tracker.cite_in_file(file_path, "b", line_start=5, line_end=20)
+        self.tracker.cite_in_file(file_path, "c", line_start=30)
+        
+        self.assertEqual([c["source_ids"] for c in self.tracker.citations_at(file_path, 7)],
+                         [["a"], ["b"]])
+        self.assertEqual(self.tracker.citations_at(file_path, 25), [])
+        self.assertEqual([c["source_ids"] for c in self.tracker.citations_at(file_path, 500)],
+                         [["c"]])
+        self.assertEqual(
+            [c["source_ids"] for c in self.tracker.citations_overlapping(file_path, 15, 40)],
+            [["b"], ["c"]])
+        
+        # The per-file index is refreshed after new citations
+        self.tracker.cite_in_file(file_path, "d", line_start=24, line_end=26)
+        self.assertEqual([c["source_ids"] for c in self.tracker.citations_at(file_path, 25)],
+                         [["d"]])
+        
+    def test_coalesce_citations(self):
+        """Test merging overlapping citations of the same source."""
+        file_path = os.path.join(self.project_path, "a.py")
+        self.tracker.cite_in_file(file_path, "a", line_start=1, line_end=10, comment="first")
+        self.tracker.cite_in_file(file_path, "a", line_start=11, line_end=15, comment="second")
+        self.tracker.cite_in_file(file_path, "a", line_start=40, line_end=50)
+        self.tracker.cite_in_file(file_path, "b", line_start=5, line_end=8)
+        self.assertEqual(self.tracker.coalesced_ranges(file_path),
+                         {"a": [(1, 15), (40, 50)], "b": [(5, 8)]})
+        
+        self.assertEqual(self.tracker.coalesce_citations(file_path), 1)
+        citations = self.tracker.citations["file_citations"]["a.py"]
+        self.assertEqual(len(citations), 3)
+        self.assertEqual(citations[0]["line_end"], 15)
+        self.assertEqual(citations[0]["comment"], "first; second")
+        self.assertEqual(len(self.tracker.citations_at(file_path, 12)), 1)
+        
+        reloaded = CitationTracker(self.project_path)
+        self.assertEqual(reloaded.citations["file_citations"]["a.py"], citations)
+
+    def test_iter_citations_markdown(self):
+        """Test that streamed chunks add up to the full document."""
+        self.tracker.add_source(source_id="a", name="Source A", url="https://example.com")
+        for i in range(50):
+            self.tracker.cite_in_file(os.path.join(self.project_path, f"f{i}.py"), ["a", "missing"],
+                                      line_start=i, line_end=i + 1, comment="Note")
+            
+        chunks = list(self.tracker.iter_citations_markdown(chunk_size=100))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), self.tracker.generate_citations_markdown())
+        self.assertIn("- Uses: Source A, Unknown (missing) (lines 3-4)", "".join(chunks))
+        
+    def test_export_citations_markdown_by_directory(self):
+        """Test writing one citations document per top-level directory."""
+        self.tracker.add_source(source_id="a", name="Source A")
+        self.tracker.add_source(source_id="b", name="Source B")
+        self.tracker.cite_in_file(os.path.join(self.project_path, "pkg", "mod", "a.py"), "a")
+        self.tracker.cite_in_file(os.path.join(self.project_path, "top.py"), "b")
+        
+        paths = self.tracker.export_citations_markdown_by_directory()
+        self.assertEqual(sorted(paths), sorted([
+            os.path.join(self.project_path, "pkg", "CITATIONS.md"),
+            os.path.join(self.project_path, "CITATIONS.md")
+        ]))
+        with open(os.path.join(self.project_path, "pkg", "CITATIONS.md"), "r") as f:
+            content = f.read()
+        self.assertIn("Source A", content)
+        self.assertNotIn("Source B", content)
+        
+    def test_export_by_directory_stays_in_output_dir(self):
+        """Test that no document is written outside the output directory."""
+        output_dir = os.path.join(self.project_path, "docs")
+        os.makedirs(output_dir)
+        self.tracker.add_source(source_id="a", name="Source A")
+        self.tracker.cite_in_file(os.path.join(os.path.dirname(self.project_path), "outside.py"), "a")
+        
+        paths = self.tracker.export_citations_markdown_by_directory(output_dir)
+        self.assertEqual(paths, [os.path.join(output_dir, "_external", "CITATIONS.md")])
+        self.assertFalse(os.path.exists(os.path.join(self.project_path, "CITATIONS.md")))
+        
+        elsewhere = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, elsewhere)
+        os.symlink(elsewhere, os.path.join(output_dir, "pkg"))
+        self.tracker.cite_in_file(os.path.join(self.project_path, "pkg", "a.py"), "a")
+        with self.assertRaises(ValueError):
+            self.tracker.export_citations_markdown_by_directory(output_dir)
+        self.assertEqual(os.listdir(elsewhere), [])
+        
+    def test_canonical_file_keys(self):
+        """Test that different spellings of a path give the same key."""
+        os.makedirs(os.path.join(self.project_path, "pkg"))
+        linked_root = os.path.join(self.test_dir.name + "-link")
+        os.symlink(self.project_path, linked_root)
+        self.addCleanup(os.remove, linked_root)
+        
+        spellings = [
+            os.path.join(self.project_path, "pkg", "a.py"),
+            os.path.join(linked_root, "pkg", "a.py"),
+            "./pkg/a.py",
+            "pkg\\a.py",
+            os.path.join(self.project_path, "pkg", "..", "pkg", "a.py"),
+        ]
+        self.assertEqual({canonical_file_key(path, self.project_path) for path in spellings},
+                         {"pkg/a.py"})
+        self.assertEqual(canonical_file_key("pkg/a.py", linked_root), "pkg/a.py")
+        
+    def test_migrate_file_keys(self):
+        """Test merging citations stored under duplicate keys."""
+        self.tracker.add_source(source_id="a", name="Source A")
+        with open(self.tracker.citations_file) as f:
+            data = json.load(f)
+        data["file_citations"] = {
+            "./a.py": [{"source_ids": ["a"], "line_start": 1}],
+            "b.py": [{"source_ids": ["a"], "line_start": 5}],
+            "a.py": [{"source_ids": ["a"], "line_start": 2}],
+            "sub\\..\\a.py": [{"source_ids": ["a"], "line_start": 3}],
+        }
+        with open(self.tracker.citations_file, "w") as f:
+            json.dump(data, f)
+        
+        tracker = CitationTracker(self.project_path)
+        self.assertEqual(tracker.migrate_file_keys(), {"a.py": ["./a.py", "sub\\..\\a.py"]})
+        file_citations = CitationTracker(self.project_path).citations["file_citations"]
+        self.assertEqual(sorted(file_citations), ["a.py", "b.py"])
+        self.assertEqual([citation["line_start"] for citation in file_citations["a.py"]], [1, 2, 3])
+        self.assertEqual(tracker.migrate_file_keys(), {})
+
+
+
+class TestThreadedTracker(unittest.TestCase):
+    """Test cases for sharing a tracker between threads."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.test_dir.name
+        
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.test_dir.cleanup()
+        
+    def _cite_from_threads(self, tracker, threads=8, count=50):
+        def work(worker):
+            for i in range(count):
+                tracker.cite_in_file(os.path.join(self.project_path, f"w{worker % 3}.py"),
+                                     f"s{worker}", line_start=i + 1)
+                tracker.files_citing(f"s{worker}")
+                tracker.generate_citations_markdown()
+                
+        workers = [threading.Thread(target=work, args=(worker,)) for worker in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        
+    def test_background_flush(self):
+        """Test that queued mutations from many threads all reach the store."""
+        tracker = CitationTracker(self.project_path, journal=True, flush_interval_ms=5)
+        tracker.add_source(source_id="s0", name="Source 0")
+        self._cite_from_threads(tracker)
+        tracker.close()
+        
+        stats = tracker.flush_stats()
+        self.assertEqual(stats["ops_flushed"], 401)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertLess(stats["flushes"], 401)
+        reloaded = CitationTracker(self.project_path)
+        self.assertEqual(sum(len(records) for records in
+                             reloaded.citations["file_citations"].values()), 400)
+        self.assertEqual(reloaded.citations, tracker.citations)
+        
+    def test_flush_writes_queued_mutations(self):
+        """Test that flush() writes without waiting for the interval."""
+        tracker = CitationTracker(self.project_path, flush_interval_ms=60000)
+        tracker.add_source(source_id="a", name="Source A")
+        tracker.flush()
+        self.assertIn("a", CitationTracker(self.project_path).citations["sources"])
+        tracker.close()
+        
+    def test_background_flush_merges_other_writers(self):
+        """Test that a flush picks up records another process appended."""
+        tracker = CitationTracker(self.project_path, journal=True, flush_interval_ms=60000)
+        tracker.add_source(source_id="a", name="Source A")
+        tracker.flush()
+        CitationTracker(self.project_path, journal=True).add_source(source_id="b", name="Source B")
+        tracker.add_source(source_id="c", name="Source C")
+        tracker.flush()
+        tracker.close()
+        
+        self.assertEqual(sorted(tracker.citations["sources"]), ["a", "b", "c"])
+        self.assertEqual(CitationTracker(self.project_path).citations, tracker.citations)
+        
+    def test_refresh_during_synchronous_writes(self):
+        """Test refreshing from one thread while another writes without a background writer."""
+        tracker = CitationTracker(self.project_path, journal=True)
+        file_path = os.path.join(self.project_path, "a.py")
+        done = threading.Event()
+        errors = []
+        
+        def write():
+            try:
+                for i in range(300):
+                    tracker.cite_in_file(file_path, "src", line_start=i + 1)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                done.set()
+                
+        def refresh():
+            try:
+                while not done.is_set():
+                    tracker.refresh()
+            except Exception as error:
+                errors.append(error)
+                
+        threads = [threading.Thread(target=write), threading.Thread(target=refresh)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(tracker.citations["file_citations"]["a.py"]), 300)
+        self.assertEqual(CitationTracker(self.project_path).citations, tracker.citations)
+        
+    def test_synchronous_writes_from_threads(self):
+        """Test sharing a tracker without a background writer."""
+        tracker = CitationTracker(self.project_path)
+        self._cite_from_threads(tracker, threads=4, count=20)
+        self.assertEqual(tracker.flush_stats()["ops_flushed"], 80)
+        self.assertEqual(CitationTracker(self.project_path).citations, tracker.citations)
+        
+    def test_export_reads_one_state(self):
+        """Test that an export in progress does not see later mutations."""
+        for compact_memory in (False, True):
+            tracker = CitationTracker(tempfile.mkdtemp(dir=self.project_path),
+                                      compact_memory=compact_memory)
+            tracker.add_source(source_id="a", name="Source A")
+            tracker.add_source(source_id="b", name="Source B")
+            tracker.cite_in_file("a.py", "a", line_start=1, line_end=2)
+            tracker.cite_in_file("b.py", "b")
+            expected = tracker.generate_citations_markdown()
+            
+            chunks = tracker.iter_citations_markdown(chunk_size=1)
+            first = next(chunks)
+            tracker.add_source(source_id="b", name="Source B, renamed")
+            tracker.add_source(source_id="c", name="Source C")
+            tracker.cite_in_file("a.py", "c")
+            tracker.cite_in_file("c.py", "c")
+            tracker.coalesce_citations("b.py")
+            tracker.rebase_citations("--- a/b.py\n+++ /dev/null\n@@ -1 +0,0 @@\n-x\n")
+            self.assertEqual(first + "".join(chunks), expected)
+            self.assertNotEqual(tracker.generate_citations_markdown(), expected)
+            # Finished views stop collecting the entries that change
+            self.assertEqual(len(tracker._views), 0)
+            
+    def test_refresh(self):
+        """Test picking up changes written by another tracker."""
+        tracker = CitationTracker(self.project_path)
+        tracker.add_source(source_id="a", name="Source A")
+        other = CitationTracker(self.project_path)
+        other.cite_in_file(os.path.join(self.project_path, "a.py"), "a")
+        self.assertEqual(tracker.files_citing("a"), {})
+        self.assertTrue(tracker.refresh())
+        self.assertEqual(tracker.files_citing("a"), {"a.py": [(None, None)]})
+        self.assertFalse(tracker.refresh())
+        
+        db_path = os.path.join(self.project_path, "citations.db")
+        tracker = CitationTracker(self.project_path, store=SqliteStore(db_path))
+        tracker.add_source(source_id="b", name="Source B")
+        other = CitationTracker(self.project_path, store=SqliteStore(db_path))
+        other.add_source(source_id="c", name="Source C")
+        self.assertTrue(tracker.refresh())
+        self.assertIn("c", tracker.citations["sources"])
+        self.assertFalse(tracker.refresh())
+        tracker.close()
+        other.close()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Git hook for the Citation Tracker.
+
+Install as ``.git/hooks/pre-commit`` to regenerate CITATIONS.md before each
+commit, and as ``.git/hooks/post-commit`` to move recorded citation line
+ranges along with the edits made by the commit that was just created. The
+hook picks its mode from the name it is installed under; use ``--mode`` to
+override it.
+
+The ``citation_tracker`` module must be importable, either because it is
+installed or because ``CITATION_TRACKER_PATH`` points at its directory.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+if os.environ.get("CITATION_TRACKER_PATH"):
+    sys.path.insert(0, os.environ["CITATION_TRACKER_PATH"])
+
+from citation_tracker import CitationTracker
+
+
+def git(*args: str) -> str:
+    """Run a git command and return its output."""
+    return subprocess.run(["git", *args], check=True, stdout=subprocess.PIPE,
+                          encoding="utf-8").stdout.strip()
+
+
+def pre_commit(tracker: CitationTracker) -> None:
+    """Regenerate CITATIONS.md and stage it with the commit."""
+    if not os.path.exists(tracker.citations_file):
+        return
+    output_path = tracker.export_citations_markdown()
+    git("add", output_path)
+
+
+def post_commit(tracker: CitationTracker) -> None:
+    """Rebase citation line ranges over the commit that was just made."""
+    if not os.path.exists(tracker.citations_file):
+        return
+    try:
+        git("rev-parse", "--verify", "--quiet", "HEAD~1")
+    except subprocess.CalledProcessError:
+        # The first commit has nothing to rebase against
+        return
+    # Citations recorded while the commit was being prepared already match it
+    stats = tracker.rebase_citations_from_git("HEAD~1", "HEAD", only_older=True)
+    if stats["files"]:
+        print(f"Citations: rebased {stats['files']} file(s), "
+              f"{stats['shifted']} shifted, {stats['shrunk']} shrunk, "
+              f"{stats['dropped']} dropped")
+
+
+def main() -> int:
+    hook_name = os.path.basename(sys.argv[0])
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["pre-commit", "post-commit"],
+                        default="post-commit" if hook_name == "post-commit" else "pre-commit",
+                        help="Hook behaviour (defaults to the installed hook name)")
+    args = parser.parse_args()
+
+    tracker = CitationTracker(git("rev-parse", "--show-toplevel"))
+    if args.mode == "post-commit":
+        post_commit(tracker)
+    else:
+        pre_commit(tracker)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())